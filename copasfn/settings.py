@@ -145,6 +145,10 @@ INSTALLED_APPS = APPS_BEFORE + INSTALLED_APPS + APPS_AFTER
 # add whitenoise just after SecurityMiddleware
 sm_index = MIDDLEWARE.index("django.middleware.security.SecurityMiddleware")
 MIDDLEWARE.insert(sm_index + 1, "whitenoise.middleware.WhiteNoiseMiddleware")
+# share one snapshot of the global preferences per request
+MIDDLEWARE.append("costos.middleware.ParametrosGlobalesMiddleware")
+# per view latency and query metrics, first so it measures all the others
+MIDDLEWARE.insert(0, "costos.middleware.InstrumentationMiddleware")
 
 # Templates
 
@@ -168,10 +172,17 @@ LOGIN_REDIRECT_URL = "index"
 # Redirect to "login" URL after logout (Default redirects to /accounts/logout/)
 LOGOUT_REDIRECT_URL = "login"
 
-# Mail sending / default value is smtp
-EMAIL_BACKEND = "anymail.backends.sendgrid.EmailBackend"
-# EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-# EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# Mail sending: messages are queued in the database (costos.outbox) and
+# delivered by "manage.py enviar_correos" through OUTBOX_EMAIL_BACKEND
+EMAIL_BACKEND = "costos.outbox.OutboxBackend"
+OUTBOX_EMAIL_BACKEND = os.environ.get("OUTBOX_EMAIL_BACKEND", "anymail.backends.sendgrid.EmailBackend")
+# OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# Retries: OUTBOX_RETRY_DELAY seconds, doubled on every failure, up to OUTBOX_MAX_ATTEMPTS attempts
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_MAX_ATTEMPTS = 8
+# Seconds a worker holds the messages it claimed before another one may retry them
+OUTBOX_LEASE = 15 * 60
 
 # Anymail [sendgrid]
 ANYMAIL = {
@@ -210,6 +221,11 @@ RECAPTCHA_PUBLIC_KEY = os.environ.get("RECAPTCHA_PUBLIC_KEY", "6LdB_wAaAAAAAErHB
 RECAPTCHA_PRIVATE_KEY = os.environ.get("RECAPTCHA_PRIVATE_KEY", "")
 RECAPTCHA_REQUIRED_SCORE = os.environ.get("RECAPTCHA_REQUIRED_SCORE", 0.75)
 
+# REST Framework: read-only API of the user's Empresa (costos.api)
+REST_FRAMEWORK = {
+    "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
+}
+
 # Dynamic Preferences
 TEMPLATES[0]["OPTIONS"]["context_processors"].append("dynamic_preferences.processors.global_preferences")
 DYNAMIC_PREFERENCES = {
@@ -233,7 +249,14 @@ LOGGING = {
     "loggers": {
         "django": {
             "handlers": ["console"],
-            "level": os.getenv("DJANGO_LOG_LEVEL", "DEBUG"),
+            "level": os.getenv("DJANGO_LOG_LEVEL", "INFO"),
+        },
+        # one JSON line per request, see costos.middleware.InstrumentationMiddleware;
+        # COSTOS_REQUESTS_LOG_LEVEL=INFO turns them on
+        "costos.requests": {
+            "handlers": ["console"],
+            "level": os.getenv("COSTOS_REQUESTS_LOG_LEVEL", "WARNING"),
+            "propagate": False,
         },
     },
 }
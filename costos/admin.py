@@ -1,8 +1,12 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Case, Count, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.utils import timezone
 
 from .models import (
     Actuantes,
+    Correo,
     Empresa,
     GastoEmpresa,
     GastoPersonal,
@@ -13,11 +17,52 @@ from .models import (
     TipoGasto,
     Trabajo,
     Vehiculo,
+    Vigencia,
 )
+from .preferences import get_parametros
 
 admin.site.register(TipoGasto)
 
 
+# Sortable computed columns
+# -------------------------
+# Columns are displayed with the model properties (fed by prefetches and
+# with_costs()), and sorted by SQL annotations. Aggregates are correlated
+# subqueries, so several of them don't multiply the changelist rows.
+
+
+def _float(field):
+    return Cast(field, FloatField())
+
+
+def subquery_count(queryset, outer="pk"):
+    """Rows of ``queryset`` related to the outer row (through its ``outer`` field)."""
+    return Coalesce(
+        Subquery(queryset.order_by().values(outer).annotate(n=Count("*")).values("n"), output_field=FloatField()),
+        Value(0.0),
+    )
+
+
+def gastos_semanales(model, outer):
+    """Approximate sum (no intermediate rounding) of the weekly gastos related to the outer row."""
+    gastos = model.objects.filter(**{outer: OuterRef("pk")}).order_by().values(outer)
+    semanal = Sum(_float("monto") * 7 / _float("periodo"))
+    return Coalesce(Subquery(gastos.annotate(s=semanal).values("s"), output_field=FloatField()), Value(0.0))
+
+
+class EmpresaListFilter(admin.SimpleListFilter):
+    """Trabajos of an Empresa, with the same EXISTS filter as the views (no DISTINCT)."""
+
+    title = "empresa"
+    parameter_name = "empresa"
+
+    def lookups(self, request, model_admin):
+        return [(str(e.pk), e.nombre) for e in Empresa.objects.all()]
+
+    def queryset(self, request, queryset):
+        return queryset.de_empresa(self.value()) if self.value() else queryset
+
+
 class ProfesionalInline(admin.StackedInline):
     model = Profesional
     extra = 0
@@ -95,6 +140,42 @@ class EmpresaAdmin(admin.ModelAdmin):
     ]
     inlines = [ProfesionalInline, VehiculoInline, InstrumentoInline, GastoEmpresaInline]
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .prefetch_related("gastos")
+            .annotate(
+                num_profesionales=subquery_count(Profesional.objects.filter(empresa=OuterRef("pk")), "empresa"),
+                num_vehiculos=subquery_count(Vehiculo.objects.filter(empresa=OuterRef("pk")), "empresa"),
+                num_instrumentos=subquery_count(Instrumento.objects.filter(empresa=OuterRef("pk")), "empresa"),
+                orden_gastos_por_hora=gastos_semanales(GastoEmpresa, "empresa") / _float("horas_semanales"),
+            )
+        )
+
+    def cantidad_de_profesionales(self, obj):
+        return int(obj.num_profesionales)
+
+    cantidad_de_profesionales.short_description = "# profesionales"
+    cantidad_de_profesionales.admin_order_field = "num_profesionales"
+
+    def cantidad_de_vehiculos(self, obj):
+        return int(obj.num_vehiculos)
+
+    cantidad_de_vehiculos.short_description = "# vehículos"
+    cantidad_de_vehiculos.admin_order_field = "num_vehiculos"
+
+    def cantidad_de_instrumentos(self, obj):
+        return int(obj.num_instrumentos)
+
+    cantidad_de_instrumentos.short_description = "# instrumentos"
+    cantidad_de_instrumentos.admin_order_field = "num_instrumentos"
+
+    def gastos_por_hora(self, obj):
+        return obj.gastos_por_hora
+
+    gastos_por_hora.admin_order_field = "orden_gastos_por_hora"
+
 
 @admin.register(Profesional)
 class ProfesionalAdmin(UserAdmin):
@@ -106,6 +187,23 @@ class ProfesionalAdmin(UserAdmin):
     add_fieldsets = UserAdmin.add_fieldsets + custom_fields
     readonly_fields = ["costo_por_hora"]
     inlines = [GastoPersonalInline]
+    list_select_related = ["empresa"]
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .prefetch_related("gastos")
+            .annotate(
+                orden_costo_por_hora=gastos_semanales(GastoPersonal, "profesional")
+                / NullIf(_float("empresa__horas_semanales"), Value(0.0))
+            )
+        )
+
+    def costo_por_hora(self, obj):
+        return obj.costo_por_hora
+
+    costo_por_hora.admin_order_field = "orden_costo_por_hora"
 
 
 @admin.register(Vehiculo)
@@ -130,6 +228,44 @@ class VehiculoAdmin(admin.ModelAdmin):
         "costo_km",
     ]
 
+    list_select_related = ["empresa"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_costs().annotate(orden_costo_km=self.costo_km_expression())
+
+    @staticmethod
+    def costo_km_expression():
+        """Vehiculo.costo_km in SQL, without the intermediate rounding (only for sorting)."""
+        parametros = get_parametros()
+        km = NullIf(_float("kilometraje_anual"), Value(0.0))
+        km_mensual = km / 12
+        precio = Case(
+            *[
+                When(tipo_combustible=codigo, then=Value(float(parametros.valor_litro(nombre))))
+                for codigo, nombre in Vehiculo.TIPO_COMBUSTIBLE
+            ],
+            output_field=FloatField(),
+        )
+        return (
+            _float("valor") / 2 / (5 * km)
+            + _float("costo_seguro") / km_mensual
+            + _float("costo_patente") / 2 / km_mensual
+            + _float("costo_cochera") / km_mensual
+            + precio / NullIf(_float("rendimiento"), Value(0.0))
+            + _float("costo_lubricante") * 2 / km
+            + _float("costo_lavado") / km_mensual
+            + _float("costo_anual_reparaciones") / km
+            + _float("valor") * 0.02 / km
+            + _float("costo_neumatico") * 4 / 40000
+            + _float("costo_service") / 10000
+            + _float("costo_rto") / (2 * km)
+        )
+
+    def costo_km(self, obj):
+        return obj.costo_km
+
+    costo_km.admin_order_field = "orden_costo_km"
+
 
 @admin.register(Instrumento)
 class InstrumentoAdmin(admin.ModelAdmin):
@@ -140,6 +276,26 @@ class InstrumentoAdmin(admin.ModelAdmin):
         "valor_ARS",
         "costo_jornada",
     ]
+    list_select_related = ["empresa"]
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(orden_costo_jornada=_float("valor_USD") / NullIf(_float("vida_util"), Value(0.0)))
+        )
+
+    def valor_ARS(self, obj):
+        return obj.valor_ARS
+
+    valor_ARS.short_description = "valor ARS"
+    # valor_ARS is valor_USD times the same quotation
+    valor_ARS.admin_order_field = "valor_USD"
+
+    def costo_jornada(self, obj):
+        return obj.costo_jornada
+
+    costo_jornada.admin_order_field = "orden_costo_jornada"
 
 
 @admin.register(Trabajo)
@@ -154,15 +310,9 @@ class TrabajoAdmin(admin.ModelAdmin):
         "cantidad_de_instrumentos",
         "costo_total",
     ]
-    list_filter = ["profesionales__empresa__nombre"]
-    search_fields = [
-        "expediente",
-        "comitente",
-        "profesionales__matricula",
-        "profesionales__first_name",
-        "profesionales__last_name",
-        "profesionales__empresa__nombre",
-    ]
+    list_filter = [EmpresaListFilter, "cerrado"]
+    # expediente, comitente and actuantes, see get_search_results
+    search_fields = ["busqueda"]
     date_hierarchy = "fecha"
     inlines = [ActuantesInline, MovilidadInline, InstrumentalInline]
     readonly_fields = [
@@ -181,3 +331,71 @@ class TrabajoAdmin(admin.ModelAdmin):
         "gastos_especificos",
         "costo_total",
     ]
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .with_costs()
+            .annotate(
+                num_profesionales=subquery_count(Actuantes.objects.filter(trabajo=OuterRef("pk")), "trabajo"),
+                num_vehiculos=subquery_count(Movilidad.objects.filter(trabajo=OuterRef("pk")), "trabajo"),
+                num_instrumentos=subquery_count(Instrumental.objects.filter(trabajo=OuterRef("pk")), "trabajo"),
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        return queryset.buscar(search_term), False
+
+    def empresa(self, obj):
+        return obj.empresa
+
+    empresa.admin_order_field = "costo__empresa__nombre"
+
+    def cantidad_de_profesionales(self, obj):
+        return obj.cantidad_de_profesionales
+
+    cantidad_de_profesionales.short_description = "# profesionales"
+    cantidad_de_profesionales.admin_order_field = "num_profesionales"
+
+    def cantidad_de_vehiculos(self, obj):
+        return obj.cantidad_de_vehiculos
+
+    cantidad_de_vehiculos.short_description = "# vehículos"
+    cantidad_de_vehiculos.admin_order_field = "num_vehiculos"
+
+    def cantidad_de_instrumentos(self, obj):
+        return obj.cantidad_de_instrumentos
+
+    cantidad_de_instrumentos.short_description = "# instrumentos"
+    cantidad_de_instrumentos.admin_order_field = "num_instrumentos"
+
+    def costo_total(self, obj):
+        return obj.costo_total
+
+    costo_total.admin_order_field = "costo__costo_total"
+
+
+@admin.register(Correo)
+class CorreoAdmin(admin.ModelAdmin):
+    list_display = ["asunto", "destinatarios", "estado", "intentos", "creado", "enviado"]
+    list_filter = ["estado"]
+    search_fields = ["asunto", "destinatarios"]
+    readonly_fields = ["asunto", "destinatarios", "mensaje", "intentos", "creado", "enviado", "error"]
+    actions = ["reintentar"]
+
+    def reintentar(self, request, queryset):
+        enviados = queryset.filter(estado=Correo.ENVIADO).count()
+        n = queryset.exclude(estado=Correo.ENVIADO).update(
+            estado=Correo.PENDIENTE, intentos=0, proximo_intento=timezone.now(), error=""
+        )
+        self.message_user(request, f"{n} correos vuelven a estar pendientes ({enviados} ya enviados no se reenvían).")
+
+    reintentar.short_description = "Reintentar el envío"
+
+
+@admin.register(Vigencia)
+class VigenciaAdmin(admin.ModelAdmin):
+    list_display = ["parametro", "valor", "desde", "hasta"]
+    list_filter = ["parametro"]
+    date_hierarchy = "desde"
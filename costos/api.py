@@ -0,0 +1,159 @@
+"""
+REST API.
+
+Read-only endpoints over the objects of the user's Empresa, for tools that
+poll the data. Lists are paginated with a cursor (see costos.pagination), and
+``fields`` (comma separated) limits the fields returned: the queryset only
+joins, prefetches and computes what the requested fields need, so
+integrations that skip the cost columns don't pay for them.
+"""
+from django.utils.functional import cached_property
+from rest_framework import pagination, viewsets
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from . import models, serializers
+from .costs import Tarificador, costos_prefetch
+from .pagination import KeysetPaginator
+from .preferences import get_parametros
+from .views import TRABAJO_SORT_FIELDS, EmpresaFilterMixin, SearchMixin, SortMixin
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Pages of ``page_size`` rows (up to max_page_size), read from the position in ``cursor``."""
+
+    page_size = 50
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = KeysetPaginator(queryset, self.get_page_size(request)).page(request.query_params.get("cursor"))
+        return self.page.object_list
+
+    def get_link(self, cursor):
+        return replace_query_param(self.request.build_absolute_uri(), "cursor", cursor) if cursor else None
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_link(self.page.next_cursor),
+                "previous": self.get_link(self.page.previous_cursor),
+                "results": data,
+            }
+        )
+
+
+class ApiViewSet(EmpresaFilterMixin, viewsets.ReadOnlyModelViewSet):
+    pagination_class = KeysetPagination
+    # Fields whose value comes from the rate cards of the Empresas
+    tarifas = ()
+    # Lookups to prefetch when a field is requested
+    prefetch = {}
+
+    @cached_property
+    def campos(self):
+        """Requested fields, or None for all of them."""
+        fields = self.request.query_params.get("fields")
+        return {campo.strip() for campo in fields.split(",")} if fields else None
+
+    def pide(self, *campos):
+        return self.campos is None or not self.campos.isdisjoint(campos)
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        for campo, lookups in self.prefetch.items():
+            if self.pide(campo):
+                qs = qs.prefetch_related(*lookups)
+        return qs
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["campos"] = self.campos
+        return context
+
+    def empresa_de(self, obj):
+        return obj.empresa_id
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if args and self.tarifas and self.pide(*self.tarifas):
+            # The rate cards of the whole page, at once
+            objs = args[0] if kwargs.get("many") else [args[0]]
+            tarifas = Tarificador(get_parametros())
+            tarifas.cargar_empresas(self.empresa_de(obj) for obj in objs)
+            serializer.context["tarifas"] = tarifas
+        return serializer
+
+
+class EmpresaViewSet(ApiViewSet):
+    model = models.Empresa
+    serializer_class = serializers.EmpresaSerializer
+    tarifas = ("gastos_por_hora",)
+
+    def empresa_de(self, obj):
+        return obj.pk
+
+
+class ProfesionalViewSet(ApiViewSet):
+    model = models.Profesional
+    serializer_class = serializers.ProfesionalSerializer
+    tarifas = ("costo_por_hora",)
+
+    def get_queryset(self):
+        # Not the rest of the user (password, permissions...)
+        return super().get_queryset().only(*[f for f in self.serializer_class.Meta.fields if f not in self.tarifas])
+
+
+class VehiculoViewSet(ApiViewSet):
+    model = models.Vehiculo
+    serializer_class = serializers.VehiculoSerializer
+    tarifas = ("costo_km",)
+
+
+class InstrumentoViewSet(ApiViewSet):
+    model = models.Instrumento
+    serializer_class = serializers.InstrumentoSerializer
+    tarifas = ("costo_jornada",)
+
+
+class TrabajoViewSet(SearchMixin, SortMixin, ApiViewSet):
+    """Trabajos of the Empresa; ``search`` and ``order`` work as in the Trabajo list."""
+
+    model = models.Trabajo
+    serializer_class = serializers.TrabajoSerializer
+    sort_fields = TRABAJO_SORT_FIELDS
+    # Objects are returned by id, so they are not fetched; rows keep the order of costos_prefetch()
+    prefetch_ids = {"actuantes": ["actuantes"], "movilidad": ["movilidad"], "instrumental": ["instrumental"]}
+    costos = (
+        "empresa",
+        "horas_total",
+        "cantidad_de_km",
+        "cantidad_de_jornadas",
+        "aportes",
+        "sellado_fiscal",
+        "informe_catastral",
+        "gastos_especificos",
+        "gastos_de_empresa",
+        "costo_actuantes",
+        "costo_movilidad",
+        "costo_instrumental",
+        "costo_total",
+    )
+
+    @property
+    def prefetch(self):
+        if self.pide(*self.costos):
+            # Costs not saved yet are computed from these same rows, which need their objects
+            return {lookup.prefetch_to: [lookup] for lookup in costos_prefetch()}
+        return self.prefetch_ids
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        return qs.with_costs() if self.pide(*self.costos) else qs
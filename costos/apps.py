@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CostosConfig(AppConfig):
     name = 'costos'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,271 @@
+"""
+Benchmark of the cost-heavy pages.
+
+Generates synthetic firms and measures wall time, SQL queries and peak
+memory of each page, to be compared against the budgets recorded in
+``benchmark_baseline.json``. Run it with ``manage.py benchmark_costos``.
+Query counts are the same on every machine and always checked; time and
+memory only with ``--strict``, against budgets recorded on that machine.
+"""
+import datetime
+import decimal
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import models
+from .costs import update_snapshots
+from .importacion import bulk_create
+from .search import actualizar_busqueda
+
+BASELINE = Path(__file__).with_name("benchmark_baseline.json")
+
+DATASET = {
+    "empresas": 2,
+    "profesionales": 8,
+    "vehiculos": 4,
+    "instrumentos": 4,
+    "trabajos": 200,
+}
+
+TIPOS_GASTO = ["Alquiler", "Luz", "Teléfono", "Internet", "Contador", "Seguro", "Obra social", "Jubilación"]
+COMITENTES = ["Pérez Juan", "García SA", "Gómez María", "Municipalidad", "Cooperativa", "Fernández Hnos."]
+
+
+def _monto(rnd, desde, hasta):
+    return decimal.Decimal(rnd.randint(desde * 100, hasta * 100)) / 100
+
+
+def generate(empresas, profesionales, vehiculos, instrumentos, trabajos, seed=0):
+    """
+    Creates ``empresas`` firms, each with the given number of profesionales,
+    vehículos, instrumentos and trabajos, with realistic gastos.
+    Returns the firms.
+    """
+    rnd = random.Random(seed)
+    tipos = bulk_create(models.TipoGasto, [models.TipoGasto(detalle=d) for d in TIPOS_GASTO])
+    periodos = [p for p, _ in models.Gasto.PERIODO]
+    firmas = bulk_create(
+        models.Empresa,
+        [models.Empresa(nombre=f"Empresa {e}", horas_semanales=rnd.choice([30, 40, 45])) for e in range(empresas)],
+    )
+    for e, empresa in enumerate(firmas):
+        models.GastoEmpresa.objects.bulk_create(
+            [
+                models.GastoEmpresa(
+                    empresa=empresa, tipo=tipo, monto=_monto(rnd, 500, 80000), periodo=rnd.choice(periodos)
+                )
+                for tipo in rnd.sample(tipos, k=5)
+            ],
+        )
+        socios = bulk_create(
+            models.Profesional,
+            [
+                models.Profesional(
+                    username=f"bench-{e}-{p}",
+                    password="!",
+                    first_name=f"Nombre{p}",
+                    last_name=f"Apellido{p}",
+                    matricula=f"{e:02}{p:05}",
+                    empresa=empresa,
+                )
+                for p in range(profesionales)
+            ],
+        )
+        models.GastoPersonal.objects.bulk_create(
+            [
+                models.GastoPersonal(
+                    profesional=socio, tipo=tipo, monto=_monto(rnd, 500, 60000), periodo=rnd.choice(periodos)
+                )
+                for socio in socios
+                for tipo in rnd.sample(tipos, k=rnd.randint(2, 5))
+            ],
+        )
+        flota = bulk_create(
+            models.Vehiculo,
+            [
+                models.Vehiculo(
+                    empresa=empresa,
+                    nombre=f"Vehículo {v}",
+                    valor=_monto(rnd, 800000, 6000000),
+                    kilometraje_anual=rnd.choice([10000, 20000, 35000]),
+                    tipo_combustible=rnd.choice(models.Vehiculo.TIPO_COMBUSTIBLE)[0],
+                    rendimiento=rnd.randint(6, 14),
+                    costo_patente=_monto(rnd, 2000, 15000),
+                    costo_seguro=_monto(rnd, 3000, 12000),
+                    costo_cochera=rnd.choice([0, _monto(rnd, 2000, 6000)]),
+                    costo_lubricante=_monto(rnd, 2000, 8000),
+                    costo_lavado=_monto(rnd, 0, 2000),
+                    costo_neumatico=_monto(rnd, 10000, 40000),
+                    costo_service=_monto(rnd, 5000, 30000),
+                    costo_anual_reparaciones=_monto(rnd, 10000, 90000),
+                    costo_rto=_monto(rnd, 1000, 5000),
+                )
+                for v in range(vehiculos)
+            ],
+        )
+        equipo = bulk_create(
+            models.Instrumento,
+            [
+                models.Instrumento(
+                    empresa=empresa,
+                    nombre=f"Instrumento {i}",
+                    valor_USD=_monto(rnd, 500, 30000),
+                    vida_util=rnd.choice([100, 200, 400]),
+                )
+                for i in range(instrumentos)
+            ],
+        )
+        nuevos = bulk_create(
+            models.Trabajo,
+            [
+                models.Trabajo(
+                    fecha=datetime.date(2020, 1, 1) + datetime.timedelta(days=rnd.randint(0, 1500)),
+                    expediente=rnd.choice([None, rnd.randint(1000, 99999)]),
+                    comitente=f"{rnd.choice(COMITENTES)} {t}",
+                    aporte_copa=_monto(rnd, 1000, 5000),
+                    aporte_caja=_monto(rnd, 1000, 5000),
+                    partidas=rnd.randint(0, 4),
+                    lotes_finales=rnd.randint(0, 9),
+                    escrituras=rnd.choice([0, _monto(rnd, 500, 3000)]),
+                    visados=rnd.choice([0, _monto(rnd, 500, 3000)]),
+                    viaticos=rnd.choice([0, _monto(rnd, 500, 8000)]),
+                    mojones=rnd.choice([0, _monto(rnd, 500, 5000)]),
+                )
+                for t in range(trabajos)
+            ],
+        )
+        actuantes, movilidad, instrumental = [], [], []
+        for trabajo in nuevos:
+            for socio in rnd.sample(socios, k=min(len(socios), rnd.randint(1, 3))):
+                actuantes.append(models.Actuantes(trabajo=trabajo, profesional=socio, horas=rnd.randint(2, 80)))
+            for vehiculo in rnd.sample(flota, k=min(len(flota), rnd.randint(0, 2))):
+                movilidad.append(models.Movilidad(trabajo=trabajo, vehiculo=vehiculo, km=rnd.randint(10, 900)))
+            for instrumento in rnd.sample(equipo, k=min(len(equipo), rnd.randint(0, 2))):
+                instrumental.append(
+                    models.Instrumental(trabajo=trabajo, instrumento=instrumento, jornadas=_monto(rnd, 0, 5))
+                )
+        models.Actuantes.objects.bulk_create(actuantes)
+        models.Movilidad.objects.bulk_create(movilidad)
+        models.Instrumental.objects.bulk_create(instrumental)
+    actualizar_busqueda(models.Trabajo.objects.values_list("pk", flat=True))
+    return firmas
+
+
+def pages(empresa):
+    """Name and url of every benchmarked page, as seen by a member of ``empresa``."""
+    trabajo = models.Trabajo.objects.de_empresa(empresa).order_by("pk").first()
+    return {
+        "index": reverse("index"),
+        "trabajo_list": reverse("trabajo_list"),
+        "trabajo_list_100": reverse("trabajo_list") + "?paginate_by=100",
+        "trabajo_search": reverse("trabajo_list") + "?search=apellido1",
+        "trabajo_list_costo": reverse("trabajo_list") + "?order=-costo_total",
+        "trabajo_detail": reverse("trabajo_detail", kwargs={"pk": trabajo.pk}),
+        "trabajo_csv": reverse("trabajo_csv", kwargs={"pk": trabajo.pk}),
+        "trabajo_update": reverse("trabajo_update", kwargs={"pk": trabajo.pk}),
+        "trabajo_create": reverse("trabajo_create"),
+        "trabajo_export": reverse("trabajo_export"),
+        "empresa_detail": reverse("empresa_detail", kwargs={"pk": empresa.pk}),
+        "api_trabajos": reverse("api-trabajo-list") + "?format=json&page_size=100",
+        "api_trabajos_fields": reverse("api-trabajo-list") + "?format=json&page_size=100&fields=id,fecha,expediente",
+        "api_profesionales": reverse("api-profesional-list") + "?format=json",
+        "admin_trabajo": reverse("admin:costos_trabajo_changelist"),
+        "admin_empresa": reverse("admin:costos_empresa_changelist"),
+        "admin_profesional": reverse("admin:costos_profesional_changelist"),
+        "admin_vehiculo": reverse("admin:costos_vehiculo_changelist"),
+        "admin_instrumento": reverse("admin:costos_instrumento_changelist"),
+    }
+
+
+@dataclass
+class Measure:
+    queries: int
+    time_ms: float
+    memory_kb: int
+
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+    if response.streaming:
+        b"".join(response.streaming_content)
+    return response
+
+
+def measure(client, url, repeat=5):
+    """
+    Measures one page: SQL queries of a single request, median wall time of
+    ``repeat`` requests and peak memory allocated while serving it.
+    """
+    _get(client, url)  # warm up caches and lazy imports
+    with CaptureQueriesContext(connection) as queries:
+        _get(client, url)
+    consultas = len(queries)  # the log is reset by the next request
+    tiempos = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _get(client, url)
+        tiempos.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        _get(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measure(queries=consultas, time_ms=round(statistics.median(tiempos), 1), memory_kb=peak // 1024)
+
+
+def run(dataset, repeat=5, snapshots=True, seed=0):
+    """Generates ``dataset`` and returns the measures of every page."""
+    empresa = generate(**dataset, seed=seed)[0]
+    if snapshots:
+        update_snapshots(models.Trabajo.objects.values_list("pk", flat=True))
+    usuario = models.Profesional.objects.create_superuser("bench-admin", password=None, empresa=empresa)
+    client = Client()
+    client.force_login(usuario)
+    return {name: measure(client, url, repeat) for name, url in pages(empresa).items()}
+
+
+def load_baseline(path=BASELINE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(dataset, results, path=BASELINE):
+    with open(path, "w") as f:
+        json.dump({"dataset": dataset, "pages": {k: asdict(v) for k, v in results.items()}}, f, indent=2)
+        f.write("\n")
+
+
+def regressions(results, budgets, tolerance=2.0, strict=False):
+    """
+    Compares the measures against the baseline budgets. Query counts must not
+    grow at all. Wall time and memory depend on the machine, so they are only
+    checked with ``strict`` (against budgets recorded on the same machine),
+    and may grow up to ``tolerance`` times. Returns a list of messages.
+    """
+    errors = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            continue
+        if result.queries > budget["queries"]:
+            errors.append(f"{name}: {result.queries} queries (budget {budget['queries']})")
+        if not strict:
+            continue
+        if result.time_ms > budget["time_ms"] * tolerance:
+            errors.append(f"{name}: {result.time_ms} ms (budget {budget['time_ms']} ms x {tolerance})")
+        if result.memory_kb > budget["memory_kb"] * tolerance:
+            errors.append(f"{name}: {result.memory_kb} KB (budget {budget['memory_kb']} KB x {tolerance})")
+    return errors
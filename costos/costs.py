@@ -0,0 +1,617 @@
+"""
+Cost engine for Trabajo.
+
+Loads the actuantes, movilidad and instrumental of one or many Trabajos (with
+their related rows) once, and computes every figure in a single pass. The
+result is an immutable ``CostosTrabajo`` breakdown that views, exports and
+the admin read from, so the number of queries does not depend on how many
+fields are displayed.
+"""
+import decimal
+from collections import defaultdict
+from dataclasses import dataclass, fields
+
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
+
+from . import models, resumenes
+from .money import a_decimal, como_decimal, redondear
+from .pendientes import Pendientes
+from .preferences import get_parametros, get_vigencias, parametros_globales
+from .tarifas import cargar as cargar_tarifas
+
+# Fields of Trabajo summed as "gastos específicos" (besides Sellado Fiscal and Informe Catastral).
+GASTOS_ESPECIFICOS = (
+    "escrituras",
+    "visados",
+    "ccu",
+    "estudio_titulos",
+    "georreferenciacion",
+    "citaciones",
+    "viaticos",
+    "ayudante",
+    "dibujante",
+    "impresiones",
+    "mojones",
+    "gestor",
+    "seguros_especiales",
+    "alquiler_instrumentos",
+    "otros_gastos",
+)
+
+
+def costos_prefetch():
+    """Lookups needed to compute the costs of a Trabajo without further queries."""
+    return (
+        Prefetch("actuantes", queryset=models.Actuantes.objects.select_related("profesional__empresa")),
+        Prefetch("movilidad", queryset=models.Movilidad.objects.select_related("vehiculo")),
+        Prefetch("instrumental", queryset=models.Instrumental.objects.select_related("instrumento")),
+    )
+
+
+@dataclass(frozen=True)
+class ActuanteCosto:
+    profesional: models.Profesional
+    horas: int
+    costo: decimal.Decimal
+    gasto_empresa: decimal.Decimal
+
+
+@dataclass(frozen=True)
+class MovilidadCosto:
+    vehiculo: models.Vehiculo
+    km: int
+    costo: decimal.Decimal
+
+
+@dataclass(frozen=True)
+class InstrumentalCosto:
+    instrumento: models.Instrumento
+    jornadas: decimal.Decimal
+    costo: decimal.Decimal
+
+
+@dataclass(frozen=True)
+class CostosTrabajo:
+    """Immutable cost breakdown of a Trabajo."""
+
+    empresa: models.Empresa
+    actuantes: tuple
+    movilidad: tuple
+    instrumental: tuple
+    horas_total: int
+    cantidad_de_km: int
+    cantidad_de_jornadas: decimal.Decimal
+    aportes: decimal.Decimal
+    sellado_fiscal: decimal.Decimal
+    informe_catastral: decimal.Decimal
+    gastos_especificos: decimal.Decimal
+    gastos_de_empresa: decimal.Decimal
+    costo_actuantes: decimal.Decimal
+    costo_movilidad: decimal.Decimal
+    costo_instrumental: decimal.Decimal
+    costo_total: decimal.Decimal
+
+    @property
+    def cantidad_de_profesionales(self):
+        return len(self.actuantes)
+
+    @property
+    def cantidad_de_vehiculos(self):
+        return len(self.movilidad)
+
+    @property
+    def cantidad_de_instrumentos(self):
+        return len(self.instrumental)
+
+    def proporcion(self, monto):
+        return round(monto / self.costo_total * 100, 1) if self.costo_total else 0
+
+    @property
+    def proporcion_empresa(self):
+        return self.proporcion(self.gastos_de_empresa)
+
+    @property
+    def proporcion_actuantes(self):
+        return self.proporcion(self.costo_actuantes)
+
+    @property
+    def proporcion_movilidad(self):
+        return self.proporcion(self.costo_movilidad)
+
+    @property
+    def proporcion_instrumental(self):
+        return self.proporcion(self.costo_instrumental)
+
+    @property
+    def proporcion_aportes(self):
+        return self.proporcion(self.aportes)
+
+    @property
+    def proporcion_especificos(self):
+        return self.proporcion(self.gastos_especificos)
+
+    def as_dict(self):
+        """JSON-serializable version of the breakdown, with exact amounts."""
+        detalle = {}
+        for field in fields(self):
+            if field.name == "empresa":
+                continue
+            value = getattr(self, field.name)
+            if isinstance(value, tuple):
+                # Not asdict(): it would deep-copy the model instances only to name them
+                detalle[field.name] = [
+                    {f.name: _serialize(getattr(item, f.name)) for f in fields(item)} for item in value
+                ]
+            else:
+                detalle[field.name] = _serialize(value)
+        return detalle
+
+    @classmethod
+    def from_dict(cls, detalle, empresa=None):
+        """Rebuilds a breakdown saved with ``as_dict()``. Line items name their objects instead of holding them."""
+        items = {"actuantes": ActuanteCosto, "movilidad": MovilidadCosto, "instrumental": InstrumentalCosto}
+        kwargs = {"empresa": empresa}
+        for field in fields(cls):
+            if field.name in items:
+                item_cls = items[field.name]
+                kwargs[field.name] = tuple(
+                    item_cls(**{k: _deserialize(k, v) for k, v in item.items()})
+                    for item in detalle[field.name]
+                )
+            elif field.name != "empresa":
+                kwargs[field.name] = _deserialize(field.name, detalle[field.name])
+        return cls(**kwargs)
+
+
+def _serialize(value):
+    # Amounts are kept as strings so they round-trip exactly; objects are kept by name
+    return value if isinstance(value, int) else str(value)
+
+
+def _deserialize(name, value):
+    if name in ("profesional", "vehiculo", "instrumento") or not isinstance(value, str):
+        return value
+    return decimal.Decimal(value)
+
+
+# Vehículos
+# ---------
+# Share of the vehicle value spent yearly on spare parts. It has always been
+# the float 0.02 (not exactly 2/100), so its exact binary ratio is kept.
+REPUESTOS = (0.02).as_integer_ratio()
+
+COSTO_KM_FIELDS = (
+    "amortizacion_valor",
+    "amortizacion_seguro",
+    "amortizacion_patente",
+    "amortizacion_cochera",
+    "combustible",
+    "lubricacion",
+    "amortizacion_lavado",
+    "reparaciones",
+    "repuestos_por_km",
+    "amortizacion_neumaticos",
+    "service",
+    "rto",
+)
+
+
+@dataclass(frozen=True)
+class CostoKm:
+    """Cost per km breakdown of a Vehiculo."""
+
+    combustible_valor: decimal.Decimal
+    combustible: decimal.Decimal
+    valor_residual: decimal.Decimal
+    amortizacion_valor: decimal.Decimal
+    kilometraje_mensual: decimal.Decimal
+    amortizacion_seguro: decimal.Decimal
+    amortizacion_patente: decimal.Decimal
+    amortizacion_cochera: decimal.Decimal
+    amortizacion_lavado: decimal.Decimal
+    amortizacion_neumaticos: decimal.Decimal
+    reparaciones: decimal.Decimal
+    repuestos: decimal.Decimal
+    repuestos_por_km: decimal.Decimal
+    service: decimal.Decimal
+    lubricacion: decimal.Decimal
+    rto: decimal.Decimal
+    costo_km: decimal.Decimal
+
+
+def _dividido(ratio, centavos):
+    """``ratio`` divided by an amount in ``centavos``, rounded like a Decimal division."""
+    n, d = ratio
+    return como_decimal(n * 100, d * centavos)
+
+
+def compute_costos_km(vehiculos, parametros=None):
+    """
+    Computes the cost per km breakdown of many vehicles in one columnar pass
+    and caches it on each of them (``Vehiculo.costos_km``).
+
+    Amounts are handled as integer ratios, rounded like each operation of the
+    original Decimal properties (to the context precision, then to centavos
+    where they round), so results are identical. Each distinct vehicle is
+    computed once, with a single fuel price snapshot.
+    """
+    parametros = parametros or get_parametros()
+    vehiculos = list(vehiculos)
+    unicos = list({v.pk if v.pk is not None else id(v): v for v in vehiculos}.values())
+    # Columns of exact (numerator, denominator) inputs
+    combustible_valor = [parametros.valor_litro(v.get_tipo_combustible_display()) for v in unicos]
+    precio = [c.as_integer_ratio() for c in combustible_valor]
+    valor = [v.valor.as_integer_ratio() for v in unicos]
+    km = [v.kilometraje_anual for v in unicos]
+    rendimiento = [v.rendimiento for v in unicos]
+    seguro = [v.costo_seguro.as_integer_ratio() for v in unicos]
+    patente = [v.costo_patente.as_integer_ratio() for v in unicos]
+    cochera = [v.costo_cochera.as_integer_ratio() for v in unicos]
+    lavado = [v.costo_lavado.as_integer_ratio() for v in unicos]
+    neumatico = [v.costo_neumatico.as_integer_ratio() for v in unicos]
+    reparaciones = [v.costo_anual_reparaciones.as_integer_ratio() for v in unicos]
+    service = [v.costo_service.as_integer_ratio() for v in unicos]
+    lubricante = [v.costo_lubricante.as_integer_ratio() for v in unicos]
+    rto = [v.costo_rto.as_integer_ratio() for v in unicos]
+
+    # Columns of results, in centavos (None where the original property returns a plain 0). Each
+    # Decimal operation of the original properties rounds its result to the context precision,
+    # so every quotient and product goes through como_decimal() before being rounded to centavos.
+    col = {}
+    col["combustible"] = [redondear(*como_decimal(n, d * r)) for (n, d), r in zip(precio, rendimiento)]
+    col["valor_residual"] = [redondear(*como_decimal(n, d * 2)) if n else None for n, d in valor]
+    col["amortizacion_valor"] = [
+        redondear(*como_decimal(n * 100 - vr * d, d * 100 * 5 * k)) if n else None
+        for (n, d), vr, k in zip(valor, col["valor_residual"], km)
+    ]
+    col["kilometraje_mensual"] = [redondear(*como_decimal(k, 12)) if k else None for k in km]
+    km_mensual = [c if c is not None else 100 for c in col["kilometraje_mensual"]]
+    for name, costo, divisor in (
+        ("amortizacion_seguro", seguro, 1),
+        ("amortizacion_patente", patente, 2),
+        ("amortizacion_cochera", cochera, 1),
+        ("amortizacion_lavado", lavado, 1),
+    ):
+        col[name] = [
+            redondear(*_dividido(como_decimal(n, d * divisor), m)) if n else None
+            for (n, d), m in zip(costo, km_mensual)
+        ]
+    col["amortizacion_neumaticos"] = [redondear(*como_decimal(n * 4, d * 40000)) if n else None for n, d in neumatico]
+    col["reparaciones"] = [redondear(*como_decimal(n, d * k)) if n else None for (n, d), k in zip(reparaciones, km)]
+    col["repuestos"] = [
+        redondear(*como_decimal(n * REPUESTOS[0], d * REPUESTOS[1])) if n else None for n, d in valor
+    ]
+    col["repuestos_por_km"] = [
+        redondear(*como_decimal(rep, 100 * k)) if n else None for (n, d), rep, k in zip(valor, col["repuestos"], km)
+    ]
+    col["service"] = [redondear(*como_decimal(n, d * 10000)) if n else None for n, d in service]
+    col["lubricacion"] = [redondear(*como_decimal(n * 2, d * k)) if n else None for (n, d), k in zip(lubricante, km)]
+    col["rto"] = [redondear(*como_decimal(n, d * 2 * k)) if n else None for (n, d), k in zip(rto, km)]
+    col["costo_km"] = [sum(c or 0 for c in fila) for fila in zip(*[col[name] for name in COSTO_KM_FIELDS])]
+
+    resultados = {}
+    for i, v in enumerate(unicos):
+        valores = {name: a_decimal(c[i]) if c[i] is not None else 0 for name, c in col.items()}
+        if col["kilometraje_mensual"][i] is None:
+            valores["kilometraje_mensual"] = 1
+        resultados[v.pk if v.pk is not None else id(v)] = CostoKm(combustible_valor=combustible_valor[i], **valores)
+    for v in vehiculos:
+        v.costos_km = resultados[v.pk if v.pk is not None else id(v)]
+    return [v.costos_km for v in vehiculos]
+
+
+def sellado_fiscal(partidas, lotes_finales, modulo_tributario):
+    if partidas and lotes_finales:
+        MT = modulo_tributario
+        _91011 = 6 * 2 * MT
+        _91066 = 300 * MT
+        _95013 = 300 * MT
+        _95068 = 300 * MT
+        _95077 = 500 * MT
+        return _91011 + _91066 + _95013 * partidas + _95068 * lotes_finales + _95077
+    else:
+        return 0
+
+
+def informe_catastral(partidas, modulo_tributario):
+    INFORME_CATASTRAL = 400 * modulo_tributario
+    return INFORME_CATASTRAL * partidas
+
+
+def empresa_de(profesionales):
+    """
+    Empresa of the first Profesional ordered by matrícula (NULLs last, as
+    PostgreSQL does), which is how ``Trabajo.empresa`` has always been resolved.
+    """
+    profesionales = sorted(profesionales, key=lambda p: (p.matricula is None, p.matricula or "", p.pk))
+    return profesionales[0].empresa if profesionales else None
+
+
+class Tarificador:
+    """
+    Rates of the Trabajos being priced, read from the rate cards of their
+    Empresas (see costos.tarifas), loaded once per batch. Cards built for
+    them are saved unless ``guardar`` is False.
+    """
+
+    def __init__(self, parametros, guardar=True, filas=None):
+        self.parametros = parametros
+        self.guardar = guardar
+        self._empresas = {}
+        self._otros = {}
+        # Empresas read to build cards, shared with the rates of other parameters
+        self._filas = {} if filas is None else filas
+
+    def con(self, parametros):
+        """
+        The rates priced with other ``parametros`` (those in force at an earlier
+        date), kept for the whole batch. Their cards are not saved: an Empresa
+        keeps the card of the current parameters.
+        """
+        if parametros == self.parametros:
+            return self
+        if parametros not in self._otros:
+            self._otros[parametros] = Tarificador(parametros, guardar=False, filas=self._filas)
+        return self._otros[parametros]
+
+    def cargar(self, trabajos):
+        """Loads at once the rate cards needed by ``trabajos`` (with their rows prefetched)."""
+        empresa_ids = set()
+        for trabajo in trabajos:
+            empresa_ids.update(a.profesional.empresa_id for a in trabajo.actuantes.all())
+            empresa_ids.update(m.vehiculo.empresa_id for m in trabajo.movilidad.all())
+            empresa_ids.update(i.instrumento.empresa_id for i in trabajo.instrumental.all())
+        self.cargar_empresas(empresa_ids)
+
+    def cargar_empresas(self, empresa_ids):
+        """Loads at once the rate cards of the given Empresas."""
+        empresa_ids = set(empresa_ids) - {None, *self._empresas}
+        if empresa_ids:
+            self._empresas.update(
+                cargar_tarifas(empresa_ids, self.parametros, guardar=self.guardar, empresas=self._filas)
+            )
+
+    def tarifa(self, empresa_id, tarifa, pk):
+        """Rate ``tarifa`` ("costo_por_hora", "costo_km" or "costo_jornada") of object ``pk`` of an Empresa."""
+        if empresa_id not in self._empresas:
+            self.cargar_empresas([empresa_id])
+        try:
+            return getattr(self._empresas[empresa_id], tarifa)[pk]
+        except KeyError:
+            # Created after the card was built
+            tarifas = cargar_tarifas(
+                [empresa_id], self.parametros, reconstruir=True, guardar=self.guardar, empresas=self._filas
+            )
+            self._empresas.update(tarifas)
+            return getattr(self._empresas[empresa_id], tarifa)[pk]
+
+    def gastos_por_hora(self, empresa):
+        if empresa.pk not in self._empresas:
+            self.cargar_empresas([empresa.pk])
+        return self._empresas[empresa.pk].gastos_por_hora
+
+    def costo_por_hora(self, profesional):
+        # Profesionales without an Empresa have no hourly cost
+        return self.tarifa(profesional.empresa_id, "costo_por_hora", profesional.pk) if profesional.empresa_id else 0
+
+    def costo_km(self, vehiculo):
+        return self.tarifa(vehiculo.empresa_id, "costo_km", vehiculo.pk)
+
+    def costo_jornada(self, instrumento):
+        return self.tarifa(instrumento.empresa_id, "costo_jornada", instrumento.pk)
+
+
+def _costos(trabajo, tarifas, modulo_tributario):
+    actuantes = []
+    for a in trabajo.actuantes.all():
+        costo = tarifas.costo_por_hora(a.profesional) * a.horas
+        gasto_empresa = tarifas.gastos_por_hora(a.profesional.empresa) * a.horas if a.profesional.empresa else 0
+        actuantes.append(ActuanteCosto(a.profesional, a.horas, costo, gasto_empresa))
+    movilidad = [MovilidadCosto(m.vehiculo, m.km, tarifas.costo_km(m.vehiculo) * m.km) for m in trabajo.movilidad.all()]
+    instrumental = [
+        InstrumentalCosto(i.instrumento, i.jornadas, tarifas.costo_jornada(i.instrumento) * i.jornadas)
+        for i in trabajo.instrumental.all()
+    ]
+
+    empresa = empresa_de([a.profesional for a in actuantes])
+    horas_total = sum([a.horas for a in actuantes])
+    sellado = sellado_fiscal(trabajo.partidas, trabajo.lotes_finales, modulo_tributario)
+    informe = informe_catastral(trabajo.partidas, modulo_tributario)
+    aportes = trabajo.aporte_copa + trabajo.aporte_caja
+    gastos_especificos = sum([getattr(trabajo, campo) for campo in GASTOS_ESPECIFICOS]) + sellado + informe
+    gastos_de_empresa = horas_total * tarifas.gastos_por_hora(empresa) if empresa else 0
+    costo_actuantes = round(decimal.Decimal(sum([a.costo for a in actuantes])), 2)
+    costo_movilidad = round(decimal.Decimal(sum([m.costo for m in movilidad])), 2)
+    costo_instrumental = round(decimal.Decimal(sum([i.costo for i in instrumental])), 2)
+    return CostosTrabajo(
+        empresa=empresa,
+        actuantes=tuple(actuantes),
+        movilidad=tuple(movilidad),
+        instrumental=tuple(instrumental),
+        horas_total=horas_total,
+        cantidad_de_km=sum([m.km for m in movilidad]),
+        cantidad_de_jornadas=sum([i.jornadas for i in instrumental]),
+        aportes=aportes,
+        sellado_fiscal=sellado,
+        informe_catastral=informe,
+        gastos_especificos=gastos_especificos,
+        gastos_de_empresa=gastos_de_empresa,
+        costo_actuantes=costo_actuantes,
+        costo_movilidad=costo_movilidad,
+        costo_instrumental=costo_instrumental,
+        costo_total=(
+            aportes + gastos_especificos + gastos_de_empresa + costo_actuantes + costo_movilidad + costo_instrumental
+        ),
+    )
+
+
+def por_vigencia(trabajos, tarifas):
+    """
+    Groups ``trabajos`` by the global parameters in force at their fecha (see
+    costos.vigencias): yields the ``Tarificador`` priced with them (``tarifas``
+    itself, or one derived from it) and the Trabajos of each group.
+    """
+    vigencias = get_vigencias()
+    grupos = defaultdict(list)
+    for trabajo in trabajos:
+        grupos[vigencias.periodo(trabajo.fecha)].append(trabajo)
+    for periodo, grupo in grupos.items():
+        yield tarifas.con(vigencias.aplicar(tarifas.parametros, periodo)), grupo
+
+
+def compute_costs(trabajo, parametros=None):
+    """
+    Returns the ``CostosTrabajo`` breakdown of a single Trabajo, priced with
+    the given ParametrosGlobales snapshot (or the active one), with the
+    values in force at its fecha.
+    """
+    prefetch_related_objects([trabajo], *costos_prefetch())
+    with parametros_globales(parametros or get_parametros()) as parametros:
+        ((tarifas, _),) = por_vigencia([trabajo], Tarificador(parametros))
+        tarifas.cargar([trabajo])
+        return _costos(trabajo, tarifas, tarifas.parametros.modulo_tributario)
+
+
+def compute_costs_bulk(trabajos, parametros=None, tarifas=None):
+    """
+    Computes the breakdown of many Trabajos at once and caches it on each
+    instance (``Trabajo.costos``). Related rows are prefetched in batch, rates
+    are read from the rate cards of the Empresas involved (``tarifas``, a
+    ``Tarificador`` priced with ``parametros`` that several calls can share)
+    and every Trabajo uses the same ParametrosGlobales snapshot, with the
+    values in force at its fecha.
+    """
+    trabajos = [t for t in trabajos if isinstance(t, models.Trabajo)]
+    prefetch_related_objects(trabajos, *costos_prefetch())
+    with parametros_globales(parametros or get_parametros()) as parametros:
+        for tarifas_grupo, grupo in por_vigencia(trabajos, tarifas or Tarificador(parametros)):
+            tarifas_grupo.cargar(grupo)
+            for trabajo in grupo:
+                trabajo.costos = _costos(trabajo, tarifas_grupo, tarifas_grupo.parametros.modulo_tributario)
+    return trabajos
+
+
+def attach_costs(trabajos, parametros=None):
+    """
+    Sets ``Trabajo.costos`` on each Trabajo: from its saved CostoTrabajo when
+    there is one and it is not stale (fetch them with
+    ``select_related("costo__empresa")``), the rest computed in batch with
+    ``compute_costs_bulk()``.
+    """
+    pending = []
+    for trabajo in trabajos:
+        if not isinstance(trabajo, models.Trabajo):
+            continue
+        try:
+            if not trabajo.costo.desactualizado:
+                trabajo.costos = trabajo.costo.as_costos()
+                continue
+        except models.CostoTrabajo.DoesNotExist:
+            pass
+        pending.append(trabajo)
+    compute_costs_bulk(pending, parametros)
+    return trabajos
+
+
+SNAPSHOT_FIELDS = [
+    "empresa",
+    "horas_total",
+    "cantidad_de_km",
+    "cantidad_de_jornadas",
+    "aportes",
+    "gastos_especificos",
+    "gastos_de_empresa",
+    "costo_actuantes",
+    "costo_movilidad",
+    "costo_instrumental",
+    "costo_total",
+    "detalle",
+    "fecha",
+    "actualizado",
+]
+
+
+def update_snapshots(trabajo_ids, parametros=None, chunk_size=500):
+    """
+    Recomputes and saves the CostoTrabajo of the given Trabajos, in chunks,
+    and then the monthly rollups they were and are summed in. Returns how
+    many snapshots were written.
+
+    Snapshots marked stale before their chunk was read are no longer stale;
+    those marked meanwhile stay so.
+    """
+    trabajo_ids = sorted(set(trabajo_ids))
+    written = 0
+    claves = set()
+    with parametros_globales(parametros or get_parametros()) as parametros:
+        for i in range(0, len(trabajo_ids), chunk_size):
+            leido = timezone.now()
+            trabajos = list(models.Trabajo.objects.filter(pk__in=trabajo_ids[i : i + chunk_size]))
+            compute_costs_bulk(trabajos, parametros)
+            snapshots = [models.CostoTrabajo.from_costos(t, t.costos) for t in trabajos]
+            with transaction.atomic():
+                existing = {
+                    pk: (empresa, fecha)
+                    for pk, empresa, fecha in models.CostoTrabajo.objects.filter(
+                        pk__in=[t.pk for t in trabajos]
+                    ).values_list("pk", "empresa", "fecha")
+                }
+                models.CostoTrabajo.objects.bulk_create([s for s in snapshots if s.pk not in existing])
+                models.CostoTrabajo.objects.bulk_update(
+                    [s for s in snapshots if s.pk in existing], SNAPSHOT_FIELDS, batch_size=chunk_size
+                )
+                models.CostoTrabajo.objects.filter(pk__in=existing, desactualizado__lte=leido).update(
+                    desactualizado=None
+                )
+            claves.update(existing.values())
+            claves.update((s.empresa_id, s.fecha) for s in snapshots)
+            written += len(snapshots)
+    resumenes.actualizar(claves)
+    return written
+
+
+def schedule_update(trabajos, cerrados=False, diferido=False):
+    """
+    Recomputes the snapshots of ``trabajos`` (a Trabajo queryset) once the
+    current transaction commits. Several calls in the same transaction are
+    merged into a single recomputation. Closed Trabajos (``cerrado``) are left
+    untouched unless ``cerrados`` is set or they have no snapshot yet.
+
+    With ``diferido`` (for changes that may reach many Trabajos, like a global
+    preference or a gasto of an Empresa) their snapshots are only marked
+    stale, with one UPDATE, and
+    priced again by ``rebuild_costos --stale`` (the ``costos`` process of the
+    Procfile). Meanwhile their costs are computed on read; lists sort by the
+    stale values and rollups keep them.
+    """
+    if not cerrados:
+        trabajos = trabajos.filter(Q(cerrado=False) | Q(costo__isnull=True))
+    _pendientes.add([(trabajos, diferido)])
+
+
+def marcar_desactualizados(trabajos):
+    """Marks the snapshots of ``trabajos`` (a Trabajo queryset) stale. Returns how many were marked."""
+    costos = models.CostoTrabajo.objects.filter(trabajo__in=trabajos.values("pk"))
+    return costos.update(desactualizado=timezone.now())
+
+
+def update_stale(limite=None, chunk_size=500):
+    """Prices again the stale snapshots (up to ``limite``), oldest marks first. Returns how many were written."""
+    costos = models.CostoTrabajo.objects.filter(desactualizado__isnull=False).order_by("desactualizado")
+    return update_snapshots(costos.values_list("trabajo", flat=True)[:limite], chunk_size=chunk_size)
+
+
+def _flush_pending(pendientes):
+    trabajo_ids = set()
+    for qs, diferido in pendientes:
+        if diferido:
+            marcar_desactualizados(qs)
+        else:
+            trabajo_ids.update(qs.values_list("pk", flat=True))
+    if trabajo_ids:
+        update_snapshots(trabajo_ids)
+
+
+_pendientes = Pendientes(_flush_pending)
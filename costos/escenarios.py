@@ -0,0 +1,207 @@
+"""
+What-if repricing.
+
+``simular()`` prices Trabajos with hypothetical global preferences and
+compares them with what they cost now, without writing anything.
+
+Only part of a cost depends on global preferences: movilidad and
+instrumental (through the costo por km of vehículos, which follows fuel
+prices, and the costo por jornada of instrumentos, which follows the dollar
+rate) and sellado fiscal and informe catastral (módulo tributario). The
+CoPA and Caja aportes are only the defaults of new Trabajos; existing ones
+keep theirs. So breakdowns are not rebuilt: that part is computed in
+columns, from the flat rows of movilidad and instrumental and the rate
+cards priced with each set of parameters, and its difference is added to
+the exact current cost (from the snapshot, or computed for the Trabajos
+without one).
+
+Preferences only price the dates outside the recorded periods of each
+parameter (see costos.vigencias), so a Trabajo dated within a period keeps
+its value in both scenarios. Closed Trabajos keep their snapshot when
+preferences change, so they are left out unless ``cerrados`` is given; then
+they are priced as if reopened: their current cost is computed from their
+rows and the current rates, like that of the Trabajos without a snapshot,
+since their frozen snapshot may predate changes to those rates.
+"""
+import decimal
+from collections import defaultdict
+from dataclasses import dataclass, fields
+
+from django.db.models.fields.json import KeyTextTransform
+
+from . import models
+from .costs import Tarificador, compute_costs_bulk, informe_catastral, por_vigencia, sellado_fiscal
+from .metrics import percentile
+from .preferences import ParametrosGlobales, get_parametros
+
+PARAMETROS = [f.name for f in fields(ParametrosGlobales)]
+
+
+def escenario(cambios, parametros=None):
+    """The current (or given) ParametrosGlobales with ``cambios`` ({name: value}) applied."""
+    desconocidos = set(cambios) - set(PARAMETROS)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(sorted(desconocidos))}.")
+    parametros = parametros or get_parametros()
+    valores = {nombre: getattr(parametros, nombre) for nombre in PARAMETROS}
+    for nombre, valor in cambios.items():
+        try:
+            valores[nombre] = decimal.Decimal(str(valor))
+        except decimal.InvalidOperation:
+            raise ValueError(f"{nombre}: «{valor}» no es un número.")
+    return ParametrosGlobales(**valores)
+
+
+@dataclass(frozen=True)
+class Impacto:
+    trabajo: int
+    empresa: int
+    costo_actual: decimal.Decimal
+    costo_nuevo: decimal.Decimal
+
+    @property
+    def diferencia(self):
+        return self.costo_nuevo - self.costo_actual
+
+
+def resumen(impactos):
+    """Aggregate statistics of a list of ``Impacto``."""
+    diferencias = sorted(i.diferencia for i in impactos)
+    actual = sum(i.costo_actual for i in impactos)
+    nuevo = sum(i.costo_nuevo for i in impactos)
+    return {
+        "trabajos": len(impactos),
+        "modificados": sum(1 for d in diferencias if d),
+        "costo_actual": actual,
+        "costo_nuevo": nuevo,
+        "diferencia": nuevo - actual,
+        "variacion": round((nuevo - actual) / actual * 100, 2) if actual else 0,
+        "diferencia_media": round((nuevo - actual) / len(impactos), 2) if impactos else 0,
+        "diferencia_mediana": percentile(diferencias, 50) if impactos else 0,
+        "diferencia_minima": diferencias[0] if impactos else 0,
+        "diferencia_maxima": diferencias[-1] if impactos else 0,
+    }
+
+
+@dataclass
+class Resultado:
+    parametros: ParametrosGlobales
+    escenario: ParametrosGlobales
+    impactos: list
+
+    @property
+    def cambios(self):
+        """Parameters that differ from the current ones: {name: (current, hypothetical)}."""
+        return {
+            nombre: (getattr(self.parametros, nombre), getattr(self.escenario, nombre))
+            for nombre in PARAMETROS
+            if getattr(self.parametros, nombre) != getattr(self.escenario, nombre)
+        }
+
+    def resumen(self):
+        return resumen(self.impactos)
+
+    def por_empresa(self):
+        """Aggregate statistics per Empresa id."""
+        grupos = defaultdict(list)
+        for impacto in self.impactos:
+            grupos[impacto.empresa].append(impacto)
+        return {empresa: resumen(impactos) for empresa, impactos in grupos.items()}
+
+
+def _por_trabajo(filas, tarifas, tarifa):
+    """Sum of cantidad × rate of (trabajo, objeto, empresa, cantidad) rows, rounded as Trabajo costs are."""
+    montos = defaultdict(int)
+    for trabajo, pk, empresa, cantidad in filas:
+        montos[trabajo] += tarifas[trabajo].tarifa(empresa, tarifa, pk) * cantidad
+    return {trabajo: round(decimal.Decimal(monto), 2) for trabajo, monto in montos.items()}
+
+
+def _variable(trabajos, movilidad, instrumental, tarifas):
+    """
+    Part of the cost of each Trabajo that depends on global parameters, priced
+    with ``tarifas`` ({Trabajo id: ``Tarificador`` of the parameters in force}).
+    """
+    costo_movilidad = _por_trabajo(movilidad, tarifas, "costo_km")
+    costo_instrumental = _por_trabajo(instrumental, tarifas, "costo_jornada")
+    return {
+        t.pk: costo_movilidad.get(t.pk, 0)
+        + costo_instrumental.get(t.pk, 0)
+        + sellado_fiscal(t.partidas, t.lotes_finales, tarifas[t.pk].parametros.modulo_tributario)
+        + informe_catastral(t.partidas, tarifas[t.pk].parametros.modulo_tributario)
+        for t in trabajos
+    }
+
+
+def _tarifas(trabajos, tarifas, empresas):
+    """{Trabajo id: ``Tarificador`` in force at its fecha}, derived from ``tarifas`` with their cards loaded."""
+    por_trabajo = {}
+    for tarifas_grupo, grupo in por_vigencia(trabajos, tarifas):
+        tarifas_grupo.cargar_empresas(empresas)
+        por_trabajo.update((t.pk, tarifas_grupo) for t in grupo)
+    return por_trabajo
+
+
+def simular(cambios, empresa=None, cerrados=False, chunk_size=2000):
+    """
+    Prices the Trabajos of ``empresa`` (or of every Empresa) with the current
+    global preferences changed by ``cambios`` ({name: value}, see
+    ``escenario()``) and returns a ``Resultado`` with the current and new
+    cost of each one. Nothing is saved.
+    """
+    parametros = get_parametros()
+    hipoteticos = escenario(cambios, parametros)
+    trabajos = models.Trabajo.objects.order_by("pk")
+    if empresa is not None:
+        trabajos = trabajos.de_empresa(empresa)
+    if not cerrados:
+        trabajos = trabajos.filter(cerrado=False)
+
+    filas = list(
+        trabajos.annotate(total=KeyTextTransform("costo_total", "costo__detalle")).values_list(
+            "pk",
+            "fecha",
+            "partidas",
+            "lotes_finales",
+            "cerrado",
+            "costo__empresa",
+            "costo__desactualizado",
+            "total",
+            named=True,
+        )
+    )
+    movilidad = list(
+        models.Movilidad.objects.filter(trabajo__in=trabajos.values("pk")).values_list(
+            "trabajo", "vehiculo", "vehiculo__empresa", "km"
+        )
+    )
+    instrumental = list(
+        models.Instrumental.objects.filter(trabajo__in=trabajos.values("pk")).values_list(
+            "trabajo", "instrumento", "instrumento__empresa", "jornadas"
+        )
+    )
+    empresas = {e for _, _, e, _ in movilidad} | {e for _, _, e, _ in instrumental}
+    actuales = Tarificador(parametros, guardar=False)
+    tarifas_actuales = _tarifas(filas, actuales, empresas)
+    tarifas_nuevas = _tarifas(filas, actuales.con(hipoteticos), empresas)
+
+    # Exact current costs: from the snapshots, computed for the Trabajos
+    # without one, with a stale one, and for the closed ones (whose snapshot is frozen)
+    costos = {
+        t.pk: (t.costo__empresa, decimal.Decimal(t.total))
+        for t in filas
+        if t.total is not None and not t.cerrado and not t.costo__desactualizado
+    }
+    faltantes = [t.pk for t in filas if t.pk not in costos]
+    for i in range(0, len(faltantes), chunk_size):
+        chunk = list(models.Trabajo.objects.filter(pk__in=faltantes[i : i + chunk_size]))
+        for trabajo in compute_costs_bulk(chunk, parametros, actuales):
+            costos[trabajo.pk] = (trabajo.costos.empresa and trabajo.costos.empresa.pk, trabajo.costos.costo_total)
+
+    antes = _variable(filas, movilidad, instrumental, tarifas_actuales)
+    despues = _variable(filas, movilidad, instrumental, tarifas_nuevas)
+    impactos = []
+    for t in filas:
+        empresa_id, total = costos[t.pk]
+        impactos.append(Impacto(t.pk, empresa_id, round(total, 2), round(total - antes[t.pk] + despues[t.pk], 2)))
+    return Resultado(parametros=parametros, escenario=hipoteticos, impactos=impactos)
@@ -1,9 +1,12 @@
+from functools import partial
+
 from crispy_forms.bootstrap import Alert, AppendedText, FormActions, PrependedText, Tab, TabHolder
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Button, Div, Field, Fieldset, Layout, Row, Submit
 from django import forms
 from django.contrib.auth.forms import UserChangeForm
 from django.urls import reverse_lazy
+from django.utils.functional import cached_property
 from dynamic_preferences.users.forms import user_preference_form_builder
 
 from . import models
@@ -33,6 +36,31 @@ class ContactForm(forms.Form):
         )
 
 
+class TrabajoImportForm(forms.Form):
+    archivo = forms.FileField(help_text="CSV (separado por comas o punto y coma) o JSON, un trabajo por fila.")
+    simular = forms.BooleanField(
+        label="Sólo validar", required=False, initial=True, help_text="Revisar el archivo sin importar nada."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.layout = Layout(
+            Field("archivo"),
+            Field("simular"),
+            FormActions(
+                Button(
+                    "cancel",
+                    "Cancelar",
+                    css_class="btn-dark",
+                    onclick=f"window.location.href = '{reverse_lazy('trabajo_list')}';",
+                ),
+                Submit("save", "Importar"),
+                style="text-align: right;",
+            ),
+        )
+
+
 class EmpresaForm(forms.ModelForm):
     class Meta:
         model = models.Empresa
@@ -297,8 +325,76 @@ class VehiculoForm(forms.ModelForm):
         )
 
 
+class SharedChoices:
+    """
+    Objects of ``queryset``, fetched once and shared by a choice field of many
+    forms (every row of a formset), so neither rendering nor validating the
+    rows queries them again.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @cached_property
+    def objects(self):
+        return {obj.pk: obj for obj in self.queryset}
+
+    def choices(self, field):
+        """Choices of ``field``: its empty label and one per object, built once for all the forms."""
+        if not hasattr(self, "_choices"):
+            empty = [("", field.empty_label)] if field.empty_label is not None else []
+            self._choices = empty + [(pk, field.label_from_instance(obj)) for pk, obj in self.objects.items()]
+        return self._choices
+
+
+class SharedModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField that renders and validates with SharedChoices instead of its queryset, once shared."""
+
+    shared = None
+
+    def share(self, shared):
+        self.shared = shared
+        # Callable: hidden fields never build their choices
+        self.choices = partial(shared.choices, self)
+
+    def to_python(self, value):
+        if self.shared is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.shared.objects[int(getattr(value, "pk", value))]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice", params={"value": value}
+            )
+
+
+class SharedChoicesInlineFormSet(forms.BaseInlineFormSet):
+    """
+    Inline formset whose forms share ``choices`` ({field name: SharedChoices}),
+    the empty form included. The ids posted back are checked against the rows
+    the formset already loaded.
+    """
+
+    def __init__(self, *args, choices=None, **kwargs):
+        self.shared_choices = choices or {}
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def existing(self):
+        return SharedChoices(self.get_queryset())
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        for name, shared in self.shared_choices.items():
+            form.fields[name].share(shared)
+        name = self._pk_field.name
+        pk = form.fields[name]
+        form.fields[name] = SharedModelChoiceField(pk.queryset, initial=pk.initial, required=False, widget=pk.widget)
+        form.fields[name].share(self.existing)
+
+
 class ActuantesForm(forms.ModelForm):
-    profesional = forms.ModelChoiceField(models.Profesional.objects.none())
+    profesional = SharedModelChoiceField(models.Profesional.objects.none())
 
     class Meta:
         model = models.Actuantes
@@ -309,6 +405,7 @@ ActuantesInlineFormSet = forms.inlineformset_factory(
     models.Trabajo,
     models.Actuantes,
     form=ActuantesForm,
+    formset=SharedChoicesInlineFormSet,
     fields=("profesional", "horas"),
     extra=1,
     min_num=1,
@@ -317,7 +414,7 @@ ActuantesInlineFormSet = forms.inlineformset_factory(
 
 
 class MovilidadForm(forms.ModelForm):
-    vehiculo = forms.ModelChoiceField(models.Vehiculo.objects.none())
+    vehiculo = SharedModelChoiceField(models.Vehiculo.objects.none())
 
     class Meta:
         model = models.Movilidad
@@ -328,13 +425,14 @@ MovilidadInlineFormSet = forms.inlineformset_factory(
     models.Trabajo,
     models.Movilidad,
     form=MovilidadForm,
+    formset=SharedChoicesInlineFormSet,
     fields=("vehiculo", "km"),
     extra=1,
 )
 
 
 class InstrumentalForm(forms.ModelForm):
-    instrumento = forms.ModelChoiceField(models.Instrumento.objects.none())
+    instrumento = SharedModelChoiceField(models.Instrumento.objects.none())
 
     class Meta:
         model = models.Instrumental
@@ -345,6 +443,7 @@ InstrumentalInlineFormSet = forms.inlineformset_factory(
     models.Trabajo,
     models.Instrumental,
     form=InstrumentalForm,
+    formset=SharedChoicesInlineFormSet,
     fields=("instrumento", "jornadas"),
     extra=1,
 )
@@ -376,6 +475,7 @@ class TrabajoForm(forms.ModelForm):
             "seguros_especiales",
             "alquiler_instrumentos",
             "otros_gastos",
+            "cerrado",
         ]
 
     def __init__(self, *args, **kwargs):
@@ -454,6 +554,9 @@ class TrabajoForm(forms.ModelForm):
                         Row(
                             Div(PrependedText("otros_gastos", "$"), css_class="col-lg-12"),
                         ),
+                        Row(
+                            Div("cerrado", css_class="col-lg-12"),
+                        ),
                     ),
                 ),
                 Tab(
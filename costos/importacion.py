@@ -0,0 +1,266 @@
+"""
+Bulk import of Trabajos from CSV or JSON, for firms coming from spreadsheets.
+
+Every row is one Trabajo. Its columns are Trabajo fields (see CAMPOS; missing
+ones take their default) plus:
+
+- ``actuantes``: ``matrícula:horas`` pairs separated by ";" (at least one;
+  a missing quantity takes its default),
+- ``movilidad``: ``vehículo:km`` pairs,
+- ``instrumental``: ``instrumento:jornadas`` pairs,
+
+where profesionales are named by matrícula (or username) and vehículos and
+instrumentos by nombre, among those of the Empresa; any of them can also be
+given by id, as ``#id`` (needed when two vehículos share a nombre). In JSON the three of
+them can also be lists of ``[nombre, cantidad]``.
+
+All rows are validated in memory first, against lookups of the Empresa's
+objects loaded once; if any row fails nothing is imported. Then everything is
+inserted with bulk_create in chunks, in one transaction, and the search text
+and cost snapshots of the new Trabajos are computed in batch.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import models
+from .costs import update_snapshots
+from .preferences import parametros_globales
+from .search import actualizar_busqueda
+
+CAMPOS = [
+    "fecha",
+    "expediente",
+    "comitente",
+    "aporte_copa",
+    "aporte_caja",
+    "partidas",
+    "lotes_finales",
+    "escrituras",
+    "visados",
+    "ccu",
+    "estudio_titulos",
+    "georreferenciacion",
+    "citaciones",
+    "viaticos",
+    "ayudante",
+    "dibujante",
+    "impresiones",
+    "mojones",
+    "gestor",
+    "seguros_especiales",
+    "alquiler_instrumentos",
+    "otros_gastos",
+    "cerrado",
+]
+RELACIONES = {
+    # column: (model, object field, quantity field)
+    "actuantes": (models.Actuantes, "profesional", "horas"),
+    "movilidad": (models.Movilidad, "vehiculo", "km"),
+    "instrumental": (models.Instrumental, "instrumento", "jornadas"),
+}
+MAX_ERRORES = 1000
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+@dataclass
+class Resultado:
+    filas: int = 0
+    trabajos: int = 0
+    actuantes: int = 0
+    movilidad: int = 0
+    instrumental: int = 0
+    simulacion: bool = False
+    errores: list = field(default_factory=list)
+
+    def __str__(self):
+        verbo = "se importarían" if self.simulacion else "importados"
+        return (
+            f"{self.filas} filas: {self.trabajos} trabajos {verbo}, con {self.actuantes} actuantes, "
+            f"{self.movilidad} vehículos y {self.instrumental} instrumentos."
+        )
+
+
+def leer(archivo, formato=None):
+    """
+    Rows (dicts) of an uploaded or opened file, CSV (comma or semicolon
+    separated) or JSON (a list of objects). The format is taken from the file
+    name unless given.
+    """
+    formato = formato or ("json" if getattr(archivo, "name", "").lower().endswith(".json") else "csv")
+    contenido = archivo.read()
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode("utf-8-sig")
+    if formato == "json":
+        try:
+            filas = json.loads(contenido)
+        except ValueError as e:
+            raise ErrorImportacion(f"JSON inválido: {e}")
+        if not isinstance(filas, list) or not all(isinstance(fila, dict) for fila in filas):
+            raise ErrorImportacion("El JSON debe ser una lista de objetos, uno por trabajo.")
+        return filas
+    try:
+        dialecto = csv.Sniffer().sniff(contenido.partition("\n")[0], delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(io.StringIO(contenido), dialect=dialecto)
+    if lector.fieldnames:
+        lector.fieldnames = [nombre.strip().lower() for nombre in lector.fieldnames]
+    return list(lector)
+
+
+class _Validador:
+    """Turns rows into unsaved Trabajos and their relations, with lookups of the Empresa loaded once."""
+
+    def __init__(self, empresa):
+        self.campos = forms.models.fields_for_model(models.Trabajo, fields=CAMPOS)
+        self.defaults = {
+            nombre: campo.to_python(models.Trabajo._meta.get_field(nombre).get_default())
+            for nombre, campo in self.campos.items()
+        }
+        self.cantidades = {
+            columna: (
+                forms.models.fields_for_model(model, fields=[cantidad])[cantidad],
+                model._meta.get_field(cantidad).get_default(),
+            )
+            for columna, (model, _, cantidad) in RELACIONES.items()
+        }
+        profesionales = models.Profesional.objects.filter(empresa=empresa)
+        self.objetos = {
+            "actuantes": self._lookup(
+                profesionales.values_list("pk", "username"),
+                profesionales.exclude(matricula=None).values_list("pk", "matricula"),
+            ),
+            "movilidad": self._lookup(models.Vehiculo.objects.filter(empresa=empresa).values_list("pk", "nombre")),
+            "instrumental": self._lookup(
+                models.Instrumento.objects.filter(empresa=empresa).values_list("pk", "nombre")
+            ),
+        }
+
+    @staticmethod
+    def _lookup(*nombres):
+        """Pk by "#pk" and by lowercased name; a name shared by several objects is ambiguous (None)."""
+        objetos = {}
+        for pares in nombres:
+            repetidos = {}
+            for pk, nombre in pares:
+                clave = nombre.strip().lower()
+                repetidos[clave] = None if clave in repetidos else pk
+                objetos[f"#{pk}"] = pk
+            # Later lookups (matrícula) win over earlier ones (username)
+            objetos.update(repetidos)
+        return objetos
+
+    def trabajo(self, fila):
+        valores, errores = {}, []
+        for nombre, campo in self.campos.items():
+            valor = fila.get(nombre)
+            if valor is None or (isinstance(valor, str) and not valor.strip()):
+                valores[nombre] = self.defaults[nombre]
+                continue
+            try:
+                valores[nombre] = campo.clean(valor.strip() if isinstance(valor, str) else valor)
+            except ValidationError as e:
+                errores.append(f"{nombre}: {' '.join(e.messages)}")
+        return models.Trabajo(**valores), errores
+
+    def relaciones(self, columna, valor):
+        """(pk, cantidad) pairs of a relation column, and errors."""
+        if valor is None or valor == "":
+            return [], []
+        if isinstance(valor, str):
+            pares = [parte.rpartition(":")[::2] if ":" in parte else (parte, "") for parte in valor.split(";")]
+            pares = [(nombre, cantidad) for nombre, cantidad in pares if nombre.strip()]
+        elif isinstance(valor, list) and all(isinstance(par, (list, tuple)) and len(par) == 2 for par in valor):
+            pares = valor
+        else:
+            return [], [f"{columna}: formato inválido."]
+        resultado, errores, vistos = [], [], set()
+        for nombre, cantidad in pares:
+            nombre = str(nombre).strip()
+            pk = self.objetos[columna].get(nombre.lower())
+            if pk is None:
+                repetido = nombre.lower() in self.objetos[columna]
+                errores.append(f"{columna}: «{nombre}» {'repetido' if repetido else 'no existe'} en la Empresa.")
+                continue
+            if pk in vistos:
+                errores.append(f"{columna}: «{nombre}» aparece más de una vez.")
+                continue
+            vistos.add(pk)
+            campo, default = self.cantidades[columna]
+            cantidad = str(cantidad).strip()
+            try:
+                resultado.append((pk, campo.clean(cantidad) if cantidad else campo.to_python(default)))
+            except ValidationError as e:
+                errores.append(f"{columna}: «{nombre}»: {' '.join(e.messages)}")
+        return resultado, errores
+
+
+def bulk_create(model, objs):
+    """
+    bulk_create() that also sets primary keys on backends that cannot return
+    them (SQLite). Must run in a transaction (or on a database nobody else
+    writes to): from the first insert on, the database is locked for other
+    writers, so the last rows are these ones.
+    """
+    creados = model.objects.bulk_create(objs)
+    if creados and creados[0].pk is None:
+        pks = model.objects.order_by("-pk").values_list("pk", flat=True)[: len(creados)]
+        for obj, pk in zip(creados, reversed(pks)):
+            obj.pk = pk
+    return creados
+
+
+def importar(empresa, filas, simular=False, chunk_size=500):
+    """
+    Imports ``filas`` (as returned by ``leer()``) as Trabajos of ``empresa``.
+    With ``simular`` only validates. Returns a ``Resultado``; if it has
+    errors, nothing was imported.
+    """
+    resultado = Resultado(filas=len(filas), simulacion=simular)
+    with parametros_globales():
+        validador = _Validador(empresa)
+    trabajos = []
+    for numero, fila in enumerate(filas, start=1):
+        trabajo, errores = validador.trabajo(fila)
+        relaciones = {}
+        for columna in RELACIONES:
+            relaciones[columna], errores_relacion = validador.relaciones(columna, fila.get(columna))
+            if columna == "actuantes" and not relaciones[columna] and not errores_relacion:
+                errores_relacion = ["actuantes: el trabajo necesita al menos un profesional de la Empresa."]
+            errores += errores_relacion
+        if errores:
+            resultado.errores += [(numero, error) for error in errores]
+            if len(resultado.errores) >= MAX_ERRORES:
+                break
+            continue
+        trabajos.append((trabajo, relaciones))
+    resultado.trabajos = len(trabajos)
+    for columna in RELACIONES:
+        setattr(resultado, columna, sum(len(relaciones[columna]) for _, relaciones in trabajos))
+    if resultado.errores or simular:
+        return resultado
+
+    ids = []
+    with transaction.atomic():
+        for i in range(0, len(trabajos), chunk_size):
+            chunk = trabajos[i : i + chunk_size]
+            bulk_create(models.Trabajo, [trabajo for trabajo, _ in chunk])
+            for columna, (model, campo, cantidad) in RELACIONES.items():
+                model.objects.bulk_create(
+                    model(trabajo_id=trabajo.pk, **{f"{campo}_id": pk, cantidad: valor})
+                    for trabajo, relaciones in chunk
+                    for pk, valor in relaciones[columna]
+                )
+            ids += [trabajo.pk for trabajo, _ in chunk]
+        actualizar_busqueda(ids, chunk_size=chunk_size)
+        update_snapshots(ids, chunk_size=chunk_size)
+    return resultado
@@ -0,0 +1,75 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from costos import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide tiempo, consultas SQL y memoria de las páginas de costos sobre empresas sintéticas "
+        "(en una base de datos de prueba) y falla si las consultas superan los presupuestos registrados. "
+        "Tiempo y memoria dependen de la máquina: sólo se controlan con --strict, contra presupuestos "
+        "registrados en la misma máquina (--update-baseline --baseline <archivo>)."
+    )
+
+    def add_arguments(self, parser):
+        for name in benchmark.DATASET:
+            parser.add_argument(f"--{name}", type=int, help=f"Cantidad de {name} (por empresa, salvo empresas).")
+        parser.add_argument("--repeat", type=int, default=5, help="Mediciones de tiempo por página.")
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Fallar también si el tiempo o la memoria superan el presupuesto (registrado en esta máquina).",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=2.0, help="Margen sobre el tiempo y la memoria (con --strict)."
+        )
+        parser.add_argument("--no-snapshots", action="store_true", help="Medir sin costos guardados (CostoTrabajo).")
+        parser.add_argument("--baseline", default=str(benchmark.BASELINE), help="Archivo de presupuestos.")
+        parser.add_argument(
+            "--update-baseline", action="store_true", help="Registrar los resultados como presupuestos."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            baseline = benchmark.load_baseline(options["baseline"])
+        except FileNotFoundError:
+            if not options["update_baseline"]:
+                raise CommandError(f"No existe {options['baseline']}; generarlo con --update-baseline.")
+            baseline = {"dataset": benchmark.DATASET, "pages": {}}
+        dataset = {name: options[name] or baseline["dataset"][name] for name in benchmark.DATASET}
+        if dataset != baseline["dataset"] and not options["update_baseline"]:
+            raise CommandError(f"Los presupuestos corresponden a {baseline['dataset']}, no a {dataset}.")
+
+        # one log line per request would flood the report
+        logging.getLogger("costos.requests").setLevel(logging.WARNING)
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # The manifest only exists after collectstatic
+            with override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"):
+                results = benchmark.run(dataset, repeat=options["repeat"], snapshots=not options["no_snapshots"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'página':<20} {'consultas':>9} {'ms':>9} {'KB':>9}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<20} {result.queries:>9} {result.time_ms:>9} {result.memory_kb:>9}")
+
+        if options["update_baseline"]:
+            benchmark.save_baseline(dataset, results, options["baseline"])
+            self.stdout.write(self.style.SUCCESS(f"Presupuestos guardados en {options['baseline']}."))
+            return
+        errors = benchmark.regressions(results, baseline["pages"], options["tolerance"], options["strict"])
+        if errors:
+            raise CommandError("Regresiones de rendimiento:\n" + "\n".join(errors))
+        self.stdout.write(self.style.SUCCESS("Todas las páginas dentro del presupuesto."))
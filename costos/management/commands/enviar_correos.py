@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from costos.outbox import entregar
+
+
+class Command(BaseCommand):
+    help = "Envía los correos pendientes (ver costos.outbox). Con --loop queda esperando correos nuevos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--max-intentos", type=int, help="Intentos antes de dar un correo por fallido.")
+        parser.add_argument("--loop", action="store_true", help="Seguir enviando, como proceso worker.")
+        parser.add_argument("--interval", type=float, default=10, help="Segundos de espera cuando no hay correos.")
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                enviados, fallidos = entregar(options["batch_size"], options["max_intentos"])
+                if enviados or fallidos:
+                    self.stdout.write(f"{enviados} correos enviados, {fallidos} con error.")
+                if not options["loop"]:
+                    break
+                if enviados + fallidos < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from costos.models import Empresa, Instrumento, Profesional, Trabajo, Vehiculo
+from costos.pagination import KeysetPaginator
+
+
+class Command(BaseCommand):
+    help = "Muestra el plan (EXPLAIN) de las consultas principales de los listados, para verificar el uso de índices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresa", type=int, help="Empresa (id) del filtro. Por defecto, la primera.")
+        parser.add_argument("--search", default="juan", help="Texto para la búsqueda de trabajos.")
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (sólo PostgreSQL).")
+
+    def handle(self, *args, **options):
+        empresa = Empresa.objects.filter(pk=options["empresa"]) if options["empresa"] else Empresa.objects.all()
+        empresa = empresa.order_by("pk").first()
+        if empresa is None:
+            raise CommandError("No hay ninguna Empresa.")
+        explain = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyze sólo está disponible en PostgreSQL.")
+            explain["analyze"] = True
+
+        n = options["page_size"]
+        trabajos = Trabajo.objects.de_empresa(empresa).with_costs()
+        paginator = KeysetPaginator(trabajos, n)
+        middle = trabajos.order_by("fecha", "pk")[trabajos.count() // 2 :].first()
+        values = [key.value(middle) for key in paginator.keys] if middle else [None] * len(paginator.keys)
+        keyset = trabajos.order_by(*[key.ordering() for key in paginator.keys]).filter(paginator.seek(values))
+        queries = {
+            "trabajos": trabajos,
+            "trabajos, página intermedia (keyset)": keyset,
+            "trabajos por expediente": trabajos.order_by("expediente"),
+            "trabajos por comitente": trabajos.order_by("comitente"),
+            "trabajos por costo": trabajos.order_by("-costo__costo_total"),
+            "trabajos buscando": trabajos.buscar(options["search"]),
+            "profesionales": Profesional.objects.filter(empresa=empresa),
+            "vehículos": Vehiculo.objects.filter(empresa=empresa),
+            "instrumentos": Instrumento.objects.filter(empresa=empresa),
+        }
+        self.stdout.write(f"Empresa: {empresa} (id {empresa.pk}), base de datos: {connection.vendor}")
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+            self.stdout.write(queryset[:n].explain(**explain))
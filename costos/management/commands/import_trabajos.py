@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from costos.importacion import ErrorImportacion, importar, leer
+from costos.models import Empresa
+
+
+class Command(BaseCommand):
+    help = "Importa trabajos de una Empresa desde un archivo CSV o JSON (ver costos.importacion)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo")
+        parser.add_argument("--empresa", type=int, required=True, help="Empresa (id) de los trabajos.")
+        parser.add_argument("--format", choices=["csv", "json"], help="Por defecto, según la extensión del archivo.")
+        parser.add_argument("--dry-run", action="store_true", help="Sólo validar, sin importar nada.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            empresa = Empresa.objects.get(pk=options["empresa"])
+        except Empresa.DoesNotExist:
+            raise CommandError(f"No existe la Empresa {options['empresa']}.")
+        try:
+            with open(options["archivo"], encoding="utf-8-sig", newline="") as archivo:
+                filas = leer(archivo, options["format"])
+        except (OSError, ErrorImportacion) as e:
+            raise CommandError(e)
+        resultado = importar(empresa, filas, simular=options["dry_run"], chunk_size=options["chunk_size"])
+        for numero, error in resultado.errores:
+            self.stderr.write(f"Fila {numero}: {error}")
+        if resultado.errores:
+            raise CommandError(f"{len(resultado.errores)} errores; no se importó ningún trabajo.")
+        self.stdout.write(self.style.SUCCESS(str(resultado)))
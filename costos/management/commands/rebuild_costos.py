@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from costos.costs import update_snapshots, update_stale
+from costos.models import Tarifario, Trabajo
+
+
+class Command(BaseCommand):
+    help = "Recalcula los costos guardados (CostoTrabajo) de los trabajos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--missing", action="store_true", help="Sólo los trabajos que aún no tienen costos guardados.")
+        parser.add_argument(
+            "--stale", action="store_true", help="Sólo los costos desactualizados por cambios de parámetros globales."
+        )
+        parser.add_argument("--include-closed", action="store_true", help="Recalcular también los trabajos cerrados.")
+        parser.add_argument("--empresa", type=int, help="Sólo los trabajos de esta Empresa (id).")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--loop", action="store_true", help="Con --stale, seguir recalculando, como proceso worker."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=10, help="Segundos de espera cuando no hay costos desactualizados."
+        )
+
+    def handle(self, *args, **options):
+        if options["stale"]:
+            return self.stale(options)
+        trabajos = Trabajo.objects.all()
+        if options["missing"]:
+            trabajos = trabajos.filter(costo__isnull=True)
+        elif not options["include_closed"]:
+            trabajos = trabajos.exclude(cerrado=True, costo__isnull=False)
+        if options["empresa"]:
+            trabajos = trabajos.de_empresa(options["empresa"])
+        if not options["missing"]:
+            # Rates are recomputed too, from the raw rows
+            tarifarios = Tarifario.objects.all()
+            if options["empresa"]:
+                tarifarios = tarifarios.filter(empresa=options["empresa"])
+            tarifarios.delete()
+        written = update_snapshots(trabajos.values_list("pk", flat=True), chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{written} costos de trabajos actualizados."))
+
+    def stale(self, options):
+        # A few chunks at a time, so every round prices with the latest parameters
+        limite = options["chunk_size"] * 10
+        try:
+            while True:
+                close_old_connections()
+                written = update_stale(limite, chunk_size=options["chunk_size"])
+                if written:
+                    self.stdout.write(f"{written} costos de trabajos actualizados.")
+                if written < limite:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from costos.costs import update_snapshots
+from costos.models import Trabajo
+from costos.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Vuelve a sumar los resúmenes mensuales de costos de cada Empresa a partir de los costos guardados."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresa", type=int, help="Sólo los resúmenes de esta Empresa (id).")
+
+    def handle(self, *args, **options):
+        # Trabajos without saved costs would be left out
+        faltantes = Trabajo.objects.filter(costo__isnull=True)
+        if options["empresa"]:
+            faltantes = faltantes.de_empresa(options["empresa"])
+        calculados = update_snapshots(faltantes.values_list("pk", flat=True))
+        written = reconstruir(options["empresa"])
+        self.stdout.write(self.style.SUCCESS(f"{written} resúmenes mensuales ({calculados} costos calculados)."))
@@ -0,0 +1,61 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from costos.escenarios import PARAMETROS, simular
+from costos.models import Empresa
+
+
+def _cambio(valor):
+    nombre, igual, monto = valor.partition("=")
+    if not igual:
+        raise ValueError(valor)
+    return nombre.strip(), monto.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Muestra cuánto cambiaría el costo de los trabajos con otros parámetros globales, "
+        "sin guardar nada (ver costos.escenarios)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cambios", nargs="+", type=_cambio, help=f"nombre=valor; nombres: {', '.join(PARAMETROS)}.")
+        parser.add_argument("--empresa", type=int, help="Sólo los trabajos de esta Empresa (id).")
+        parser.add_argument("--cerrados", action="store_true", help="Incluir los trabajos cerrados.")
+        parser.add_argument("--por-empresa", action="store_true", help="Resumen de cada Empresa.")
+        parser.add_argument("--csv", help="Archivo donde guardar el costo actual y el nuevo de cada trabajo.")
+
+    def handle(self, *args, **options):
+        empresa = None
+        if options["empresa"] is not None:
+            try:
+                empresa = Empresa.objects.get(pk=options["empresa"])
+            except Empresa.DoesNotExist:
+                raise CommandError(f"No existe la Empresa {options['empresa']}.")
+        try:
+            resultado = simular(dict(options["cambios"]), empresa=empresa, cerrados=options["cerrados"])
+        except ValueError as e:
+            raise CommandError(e)
+        for nombre, (actual, nuevo) in resultado.cambios.items():
+            self.stdout.write(f"{nombre}: {actual} → {nuevo}")
+        self.write_resumen("Total", resultado.resumen())
+        if options["por_empresa"]:
+            for empresa_id, resumen in sorted(resultado.por_empresa().items(), key=lambda item: item[0] or 0):
+                self.write_resumen(f"Empresa {empresa_id}", resumen)
+        if options["csv"]:
+            with open(options["csv"], "w", newline="") as archivo:
+                writer = csv.writer(archivo)
+                writer.writerow(["trabajo", "empresa", "costo_actual", "costo_nuevo", "diferencia"])
+                for i in resultado.impactos:
+                    writer.writerow([i.trabajo, i.empresa, i.costo_actual, i.costo_nuevo, i.diferencia])
+
+    def write_resumen(self, titulo, resumen):
+        self.stdout.write(
+            self.style.SUCCESS(f"{titulo}: ")
+            + f"{resumen['trabajos']} trabajos ({resumen['modificados']} cambian), "
+            f"$ {resumen['costo_actual']} → $ {resumen['costo_nuevo']} "
+            f"({resumen['diferencia']:+} / {resumen['variacion']:+}%); por trabajo: "
+            f"media {resumen['diferencia_media']:+}, mediana {resumen['diferencia_mediana']:+}, "
+            f"mín. {resumen['diferencia_minima']:+}, máx. {resumen['diferencia_maxima']:+}"
+        )
@@ -0,0 +1,79 @@
+"""
+In-memory request metrics per view, kept by InstrumentationMiddleware.
+
+Each process keeps a rolling window with the last requests of every view,
+so percentiles reflect recent traffic and memory stays bounded. Hits and
+misses of the cached template fragments are counted too.
+"""
+import collections
+import math
+import threading
+
+from django.conf import settings
+
+METRICS = ("total_ms", "db_ms", "template_ms", "queries")
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+class RequestMetrics:
+    def __init__(self, size=500):
+        self.size = size
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, **values):
+        with self._lock:
+            window = self._views.get(view)
+            if window is None:
+                window = self._views[view] = collections.deque(maxlen=self.size)
+            window.append(values)
+
+    def report(self):
+        """Count and percentiles of every metric, per view, slowest views first."""
+        with self._lock:
+            views = {view: list(window) for view, window in self._views.items()}
+        report = {}
+        for view, requests in views.items():
+            stats = {"count": len(requests)}
+            for metric in METRICS:
+                values = sorted(r[metric] for r in requests)
+                stats[metric] = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+                stats[metric]["max"] = values[-1]
+            report[view] = stats
+        return dict(sorted(report.items(), key=lambda item: item[1]["total_ms"]["p90"], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+class CacheMetrics:
+    """Hits and misses per cached fragment, since the process started (see the ``fragmento`` tag)."""
+
+    def __init__(self):
+        self._counts = collections.defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+
+    def record(self, name, hit):
+        with self._lock:
+            self._counts[name]["hits" if hit else "misses"] += 1
+
+    def report(self):
+        with self._lock:
+            counts = {name: dict(c) for name, c in self._counts.items()}
+        for c in counts.values():
+            c["hit_ratio"] = round(c["hits"] / (c["hits"] + c["misses"]), 3)
+        return dict(sorted(counts.items()))
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+request_metrics = RequestMetrics(getattr(settings, "REQUEST_METRICS_WINDOW", 500))
+fragment_metrics = CacheMetrics()
@@ -0,0 +1,100 @@
+import json
+import logging
+import time
+
+from django.db import connection
+
+from .metrics import request_metrics
+from .preferences import parametros_globales
+
+logger = logging.getLogger("costos.requests")
+
+
+class ParametrosGlobalesMiddleware:
+    """
+    Shares one snapshot of the global preferences across the whole request,
+    so cost calculations don't look the same values up over and over.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with parametros_globales():
+            return self.get_response(request)
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and adds up their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class InstrumentationMiddleware:
+    """
+    Records view name, query count, DB time, template render time and total
+    latency of every request. They are kept in ``metrics.request_metrics``
+    (see the ``metricas`` view) and logged as one JSON line on ``costos.requests``
+    at INFO level.
+
+    Should be the first middleware, so the latency includes all the others.
+    Streaming responses are measured until their last byte is sent (or the
+    client goes away), since their rows are usually read while streaming.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        request._template_seconds = 0.0
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(response.streaming_content, request, response, start, timer)
+        else:
+            self.record(request, response, start, timer)
+        return response
+
+    def stream(self, content, request, response, start, timer):
+        try:
+            with connection.execute_wrapper(timer):
+                yield from content
+        finally:
+            self.record(request, response, start, timer)
+
+    def record(self, request, response, start, timer):
+        match = request.resolver_match
+        values = {
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+            "db_ms": round(timer.seconds * 1000, 1),
+            "template_ms": round(request._template_seconds * 1000, 1),
+            "queries": timer.queries,
+        }
+        view = match.view_name if match else "-"
+        request_metrics.record(view, **values)
+        logger.info(
+            json.dumps(
+                {"view": view, "method": request.method, "path": request.path, "status": response.status_code, **values}
+            )
+        )
+
+    def process_template_response(self, request, response):
+        start = time.perf_counter()
+
+        def rendered(response):
+            request._template_seconds += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
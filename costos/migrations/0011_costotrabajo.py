@@ -0,0 +1,42 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0010_auto_20241002_1851'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajo',
+            name='cerrado',
+            field=models.BooleanField(default=False, help_text='Trabajo cerrado: sus costos ya no cambian al modificar gastos, vehículos, instrumentos o parámetros.', verbose_name='costos congelados'),
+        ),
+        migrations.CreateModel(
+            name='CostoTrabajo',
+            fields=[
+                ('trabajo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='costo', serialize=False, to='costos.trabajo')),
+                ('horas_total', models.PositiveIntegerField(default=0)),
+                ('cantidad_de_km', models.PositiveIntegerField(default=0)),
+                ('cantidad_de_jornadas', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('aportes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gastos_especificos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gastos_de_empresa', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo_actuantes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo_movilidad', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo_instrumental', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('costo_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('detalle', models.JSONField(default=dict)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='costos.empresa')),
+            ],
+            options={
+                'verbose_name': 'costo de trabajo',
+                'verbose_name_plural': 'costos de trabajos',
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+# Indexes for the filters and sorts of the lists:
+# - Trabajo: -fecha (default order), expediente and comitente (sortable
+#   columns). The Empresa filter is an EXISTS over Actuantes, served by the
+#   (trabajo, profesional) unique index and the (profesional, trabajo) one.
+# - Profesional, Vehiculo, Instrumento: (empresa, <default ordering>), so each
+#   list is one index range already in order.
+
+# Largest value of Actuantes.horas (PositiveSmallIntegerField on PostgreSQL)
+MAX_HORAS = 32767
+
+
+def merge_duplicate_actuantes(apps, schema_editor):
+    """Merges repeated Profesionales of a Trabajo into one row with the sum of their hours (same cost)."""
+    Actuantes = apps.get_model("costos", "Actuantes")
+    duplicados = (
+        Actuantes.objects.order_by()
+        .values("trabajo", "profesional")
+        .annotate(filas=Count("id"), horas_total=Sum("horas"))
+        .filter(filas__gt=1)
+    )
+    # Checked before merging anything: a sum that does not fit would fail halfway on PostgreSQL,
+    # and clamping it would change the cost of the Trabajo
+    excedidos = [
+        f"(trabajo {d['trabajo']}, profesional {d['profesional']})"
+        for d in duplicados.filter(horas_total__gt=MAX_HORAS)
+    ]
+    if excedidos:
+        raise RuntimeError(
+            f"Actuantes repetidos cuyas horas sumadas superan {MAX_HORAS}; corregirlos antes de migrar: "
+            + ", ".join(excedidos)
+        )
+    for dup in duplicados:
+        filas = Actuantes.objects.filter(trabajo=dup["trabajo"], profesional=dup["profesional"]).order_by("id")
+        primera = filas.first()
+        filas.exclude(pk=primera.pk).delete()
+        filas.update(horas=dup["horas_total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0011_costotrabajo'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_actuantes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='actuantes',
+            unique_together={('trabajo', 'profesional')},
+        ),
+        migrations.AddIndex(
+            model_name='actuantes',
+            index=models.Index(fields=['profesional', 'trabajo'], name='actuantes_profesional_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumento',
+            index=models.Index(fields=['empresa', 'nombre', 'valor_USD'], name='instrumento_empresa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profesional',
+            index=models.Index(fields=['empresa', 'matricula'], name='profesional_empresa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trabajo',
+            index=models.Index(fields=['-fecha'], name='trabajo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trabajo',
+            index=models.Index(fields=['expediente'], name='trabajo_expediente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trabajo',
+            index=models.Index(fields=['comitente'], name='trabajo_comitente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiculo',
+            index=models.Index(fields=['empresa', 'nombre', 'valor'], name='vehiculo_empresa_idx'),
+        ),
+    ]
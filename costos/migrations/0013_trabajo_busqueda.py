@@ -0,0 +1,66 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:41
+
+import unicodedata
+
+from django.db import migrations, models
+from django.db.models import Prefetch
+
+TRIGRAM_INDEX = "costos_trabajo_busqueda_trgm"
+
+
+# Frozen copies of costos.search.normalizar() and texto_busqueda() as of this migration
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto)).lower()
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def texto_busqueda(trabajo):
+    partes = [trabajo.expediente or "", trabajo.comitente]
+    for actuante in trabajo.actuantes.all():
+        profesional = actuante.profesional
+        partes += [profesional.matricula or "", profesional.last_name, profesional.first_name]
+    return normalizar(" ".join(str(p) for p in partes if p))
+
+
+def fill_busqueda(apps, schema_editor):
+    Trabajo = apps.get_model("costos", "Trabajo")
+    Actuantes = apps.get_model("costos", "Actuantes")
+    trabajos = Trabajo.objects.prefetch_related(
+        Prefetch("actuantes", Actuantes.objects.select_related("profesional").order_by("pk"))
+    )
+    ids = list(Trabajo.objects.values_list("pk", flat=True))
+    for i in range(0, len(ids), 500):
+        chunk = list(trabajos.filter(pk__in=ids[i : i + 500]))
+        for trabajo in chunk:
+            trabajo.busqueda = texto_busqueda(trabajo)
+        Trabajo.objects.bulk_update(chunk, ["busqueda"])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON costos_trabajo USING gin (busqueda gin_trgm_ops)"
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {TRIGRAM_INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0012_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajo',
+            name='busqueda',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(fill_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
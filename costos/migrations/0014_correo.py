@@ -0,0 +1,36 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0013_trabajo_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Correo',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=10)),
+                ('asunto', models.CharField(blank=True, max_length=255)),
+                ('destinatarios', models.TextField(blank=True)),
+                ('mensaje', models.JSONField()),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('enviado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-creado'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='correo',
+            index=models.Index(fields=['estado', 'proximo_intento'], name='correo_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 16:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0014_correo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarifario',
+            fields=[
+                ('empresa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tarifario', serialize=False, to='costos.empresa')),
+                ('tarifas', models.JSONField()),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0016_actualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vigencia',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parametro', models.CharField(choices=[('cotizacion_dolar', 'Cotización dólar'), ('modulo_tributario', 'Módulo tributario'), ('nafta', 'Nafta'), ('nafta_premium', 'Nafta Premium'), ('diesel', 'Diesel'), ('diesel_premium', 'Diesel Premium'), ('gnc', 'GNC')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('desde', models.DateField()),
+                ('hasta', models.DateField(help_text='Inclusive. Fuera de los períodos cargados rige la preferencia global.')),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['parametro', '-desde'],
+            },
+        ),
+    ]
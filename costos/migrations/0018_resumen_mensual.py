@@ -0,0 +1,60 @@
+# Generated by Django 3.1.4 on 2026-10-18 17:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+from costos.resumenes import sumar
+
+
+def fill_resumenes(apps, schema_editor):
+    Trabajo = apps.get_model("costos", "Trabajo")
+    CostoTrabajo = apps.get_model("costos", "CostoTrabajo")
+    ResumenMensual = apps.get_model("costos", "ResumenMensual")
+    CostoTrabajo.objects.update(fecha=Subquery(Trabajo.objects.filter(pk=OuterRef("trabajo")).values("fecha")[:1]))
+    ResumenMensual.objects.bulk_create([ResumenMensual(**fila) for fila in sumar(CostoTrabajo.objects.all())])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0017_vigencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costotrabajo',
+            name='fecha',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes.')),
+                ('trabajos', models.PositiveIntegerField(default=0)),
+                ('horas', models.PositiveIntegerField(default=0)),
+                ('km', models.PositiveIntegerField(default=0)),
+                ('jornadas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('aportes', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('gastos_especificos', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('gastos_de_empresa', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('costo_actuantes', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('costo_movilidad', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('costo_instrumental', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('costo_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='costos.empresa')),
+            ],
+            options={
+                'verbose_name': 'resumen mensual',
+                'verbose_name_plural': 'resúmenes mensuales',
+                'ordering': ['empresa', '-mes'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumenmensual',
+            constraint=models.UniqueConstraint(fields=('empresa', 'mes'), name='resumen_empresa_mes'),
+        ),
+        migrations.RunPython(fill_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.4 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('costos', '0018_resumen_mensual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='costotrabajo',
+            name='desactualizado',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='costotrabajo',
+            index=models.Index(condition=models.Q(desactualizado__isnull=False), fields=['desactualizado'], name='costo_desactualizado_idx'),
+        ),
+    ]
@@ -1,12 +1,14 @@
-import decimal
 from enum import Enum
 
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 
-from .preferences import get_aporte_caja, get_aporte_copa, get_cotizacion_dolar, get_modulo_tributario, get_valor_litro
+from . import money
+from .preferences import get_aporte_caja, get_aporte_copa, get_cotizacion_dolar
 
 
 class Periodo(Enum):
@@ -24,6 +26,8 @@ class Periodo(Enum):
 class Empresa(models.Model):
     nombre = models.CharField(max_length=100, blank=True)
     horas_semanales = models.PositiveSmallIntegerField(default=40, help_text="Horas de trabajo por semana.")
+    # Also moved by changes to its gastos, profesionales, vehículos and instrumentos, see costos.versiones
+    actualizado = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["nombre"]
@@ -63,22 +67,25 @@ class Empresa(models.Model):
     @property
     def gastos_semanales(self):
         """Gastos por semana de trabajo en la Oficina de la Empresa."""
-        return round(decimal.Decimal(sum([gasto.semanal for gasto in self.gastos.all()])), 2)
+        return money.a_decimal(self.gastos_centavos(Periodo.SEMANA))
 
     @property
     def gastos_por_hora(self):
         """Gastos por hora de trabajo en la Oficina de la Empresa."""
-        return round(self.gastos_semanales / self.horas_semanales, 2)
+        return money.a_decimal(money.redondear(self.gastos_centavos(Periodo.SEMANA), 100 * self.horas_semanales))
 
     @property
     def gastos_mensuales(self):
         """Gastos por mes de trabajo en la Oficina de la Empresa."""
-        return round(decimal.Decimal(sum([gasto.mensual for gasto in self.gastos.all()])), 2)
+        return money.a_decimal(self.gastos_centavos(Periodo.MES))
 
     @property
     def gastos_anuales(self):
         """Gastos por año de trabajo en la Oficina de la Empresa."""
-        return round(decimal.Decimal(sum([gasto.anual for gasto in self.gastos.all()])), 2)
+        return money.a_decimal(self.gastos_centavos(Periodo.AÑO))
+
+    def gastos_centavos(self, periodo):
+        return sum([gasto.centavos(periodo) for gasto in self.gastos.all()])
 
 
 class Profesional(AbstractUser):
@@ -89,6 +96,8 @@ class Profesional(AbstractUser):
     class Meta:
         ordering = ["matricula"]
         verbose_name_plural = "profesionales"
+        # Profesionales of the User's Empresa, in list order
+        indexes = [models.Index(fields=["empresa", "matricula"], name="profesional_empresa_idx")]
 
     def __str__(self):
         if self.matricula and self.apellido and self.nombre:
@@ -113,8 +122,10 @@ class Profesional(AbstractUser):
     @property
     def costo_por_hora(self):
         """Costo de 1 hora de trabajo del Profesional."""
-        total_gastos_semanales = decimal.Decimal(sum([gasto.semanal for gasto in self.gastos.all()]))
-        return round(total_gastos_semanales / self.empresa.horas_semanales, 2) if self.empresa else 0
+        if not self.empresa:
+            return 0
+        semanales = sum([gasto.centavos(Periodo.SEMANA) for gasto in self.gastos.all()])
+        return money.a_decimal(money.redondear(semanales, 100 * self.empresa.horas_semanales))
 
     @property
     def gastos_semanales(self):
@@ -137,6 +148,42 @@ class Profesional(AbstractUser):
         return round(sum([gasto.anual for gasto in self.gastos.all()]), 2)
 
 
+class CostsQuerySet(models.QuerySet):
+    """
+    Queryset whose ``with_costs()`` computes the costs of all fetched rows in
+    one batch. Subclasses say how, overriding ``attach_costs()``.
+    """
+
+    _with_costs = False
+
+    def with_costs(self):
+        """Computes the costs of the fetched rows in batch when the queryset is evaluated."""
+        qs = self._chain()
+        qs._with_costs = True
+        return qs
+
+    def attach_costs(self, objs):
+        """Computes the costs of the fetched ``objs`` in place. Rows without costs have nothing to compute."""
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._with_costs = self._with_costs
+        return clone
+
+    def _fetch_all(self):
+        computed = self._result_cache is not None
+        super()._fetch_all()
+        if self._with_costs and not computed:
+            self.attach_costs(self._result_cache)
+
+
+class VehiculoQuerySet(CostsQuerySet):
+    def attach_costs(self, vehiculos):
+        from .costs import compute_costos_km
+
+        compute_costos_km(vehiculos)
+
+
 class Vehiculo(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name="vehiculos")
     nombre = models.CharField(max_length=30)
@@ -181,10 +228,14 @@ class Vehiculo(models.Model):
         "RTO", max_digits=10, decimal_places=2, default=0, help_text="Costo de Revisión Técnica Obligatoria."
     )
 
+    objects = VehiculoQuerySet.as_manager()
+
     class Meta:
         ordering = ["nombre", "valor"]
         verbose_name = "vehículo"
         verbose_name_plural = "vehículos"
+        # Vehículos of the User's Empresa, in list order
+        indexes = [models.Index(fields=["empresa", "nombre", "valor"], name="vehiculo_empresa_idx")]
 
     def __str__(self):
         return self.nombre
@@ -198,91 +249,80 @@ class Vehiculo(models.Model):
     def get_delete_url(self):
         return reverse("vehiculo_delete", kwargs={"pk": self.pk})
 
+    @cached_property
+    def costos_km(self):
+        from .costs import compute_costos_km
+
+        return compute_costos_km([self])[0]
+
     @property
     def combustible_valor(self):
-        return get_valor_litro(self.get_tipo_combustible_display())
+        return self.costos_km.combustible_valor
 
     @property
     def combustible(self):
-        return round(self.combustible_valor / self.rendimiento, 2)
+        return self.costos_km.combustible
 
     @property
     def valor_residual(self):
         """Valor residual a 5 años."""
-        return round(self.valor / 2, 2) if self.valor else 0
+        return self.costos_km.valor_residual
 
     @property
     def amortizacion_valor(self):
-        if self.valor:
-            return round((self.valor - self.valor_residual) / (5 * self.kilometraje_anual), 2)
-        else:
-            return 0
+        return self.costos_km.amortizacion_valor
 
     @property
     def kilometraje_mensual(self):
-        return round(self.kilometraje_anual / decimal.Decimal(12), 2) if self.kilometraje_anual else 1
+        return self.costos_km.kilometraje_mensual
 
     @property
     def amortizacion_seguro(self):
-        return round(self.costo_seguro / self.kilometraje_mensual, 2) if self.costo_seguro else 0
+        return self.costos_km.amortizacion_seguro
 
     @property
     def amortizacion_patente(self):
-        return round(self.costo_patente / 2 / self.kilometraje_mensual, 2) if self.costo_patente else 0
+        return self.costos_km.amortizacion_patente
 
     @property
     def amortizacion_cochera(self):
-        return round(self.costo_cochera / self.kilometraje_mensual, 2) if self.costo_cochera else 0
+        return self.costos_km.amortizacion_cochera
 
     @property
     def amortizacion_lavado(self):
-        return round(self.costo_lavado / self.kilometraje_mensual, 2) if self.costo_lavado else 0
+        return self.costos_km.amortizacion_lavado
 
     @property
     def amortizacion_neumaticos(self):
-        return round(self.costo_neumatico * 4 / 40000, 2) if self.costo_neumatico else 0
+        return self.costos_km.amortizacion_neumaticos
 
     @property
     def reparaciones(self):
-        return round(self.costo_anual_reparaciones / self.kilometraje_anual, 2) if self.costo_anual_reparaciones else 0
+        return self.costos_km.reparaciones
 
     @property
     def repuestos(self):
-        return round(self.valor * decimal.Decimal(0.02), 2) if self.valor else 0
+        return self.costos_km.repuestos
 
     @property
     def repuestos_por_km(self):
-        return round(self.repuestos / self.kilometraje_anual, 2) if self.valor else 0
+        return self.costos_km.repuestos_por_km
 
     @property
     def service(self):
-        return round(self.costo_service / 10000, 2) if self.costo_service else 0
+        return self.costos_km.service
 
     @property
     def lubricacion(self):
-        return round(self.costo_lubricante * 2 / self.kilometraje_anual, 2) if self.costo_lubricante else 0
+        return self.costos_km.lubricacion
 
     @property
     def rto(self):
-        return round(self.costo_rto / (2 * self.kilometraje_anual), 2) if self.costo_rto else 0
+        return self.costos_km.rto
 
     @property
     def costo_km(self):
-        return round(
-            self.amortizacion_valor
-            + self.amortizacion_seguro
-            + self.amortizacion_patente
-            + self.amortizacion_cochera
-            + self.combustible
-            + self.lubricacion
-            + self.amortizacion_lavado
-            + self.reparaciones
-            + self.repuestos_por_km
-            + self.amortizacion_neumaticos
-            + self.service
-            + self.rto,
-            2,
-        )
+        return self.costos_km.costo_km
 
 
 class Instrumento(models.Model):
@@ -301,6 +341,8 @@ class Instrumento(models.Model):
 
     class Meta:
         ordering = ["nombre", "valor_USD"]
+        # Instrumentos of the User's Empresa, in list order
+        indexes = [models.Index(fields=["empresa", "nombre", "valor_USD"], name="instrumento_empresa_idx")]
 
     def __str__(self):
         return self.nombre
@@ -316,14 +358,16 @@ class Instrumento(models.Model):
 
     @property
     def valor_ARS(self):
-        DOLAR = get_cotizacion_dolar()
-        return round(self.valor_USD * DOLAR, 2) if self.pk else 0
+        if not self.pk:
+            return 0
+        (valor, den), (dolar, den_dolar) = money.ratio(self.valor_USD), money.ratio(get_cotizacion_dolar())
+        return money.a_decimal(money.redondear(valor * dolar, den * den_dolar))
 
     valor_ARS.fget.short_description = "valor ARS"
 
     @property
     def costo_jornada(self):
-        return round(self.valor_ARS / self.vida_util, 2)
+        return money.a_decimal(money.redondear(money.centavos(self.valor_ARS), 100 * self.vida_util))
 
 
 class TipoGasto(models.Model):
@@ -369,15 +413,22 @@ class Gasto(models.Model):
 
     @property
     def semanal(self):
-        return round(self.jornada * Periodo.SEMANA.value, 2)
+        return money.a_decimal(self.centavos(Periodo.SEMANA))
 
     @property
     def mensual(self):
-        return round(self.jornada * Periodo.MES.value, 2)
+        return money.a_decimal(self.centavos(Periodo.MES))
 
     @property
     def anual(self):
-        return round(self.jornada * Periodo.AÑO.value, 2)
+        return money.a_decimal(self.centavos(Periodo.AÑO))
+
+    def centavos(self, periodo):
+        """Monto (rounded to centavos) for ``periodo``, in centavos."""
+        num, den = money.ratio(self.monto)
+        # Rounded like round(self.jornada * periodo.value, 2): both operations round to the Decimal precision
+        num, den = money.como_decimal(num, den * self.periodo)
+        return money.redondear(*money.como_decimal(num * periodo.value, den))
 
 
 class GastoEmpresa(Gasto):
@@ -398,6 +449,37 @@ class GastoPersonal(Gasto):
         verbose_name_plural = "gastos personales"
 
 
+class TrabajoQuerySet(CostsQuerySet):
+    def with_costs(self):
+        """
+        Attaches the costs of every Trabajo in the queryset when it is evaluated,
+        with a fixed number of queries regardless of how many rows are fetched.
+        Saved costs (CostoTrabajo) are read in the same query; the rest are
+        computed in batch.
+        """
+        return super().with_costs().select_related("costo__empresa")
+
+    def de_empresa(self, empresa):
+        """
+        Trabajos where any Profesional of the Empresa acts. A single EXISTS
+        predicate, so rows are not duplicated and no DISTINCT is needed.
+        """
+        return self.filter(
+            models.Exists(Actuantes.objects.filter(trabajo=models.OuterRef("pk"), profesional__empresa=empresa))
+        )
+
+    def buscar(self, texto):
+        """Trabajos matching every word of ``texto`` by expediente, comitente or actuantes (see costos.search)."""
+        from .search import buscar
+
+        return buscar(self, texto)
+
+    def attach_costs(self, trabajos):
+        from .costs import attach_costs
+
+        attach_costs(trabajos)
+
+
 class Trabajo(models.Model):
     fecha = models.DateField(default=timezone.now, help_text="Fecha de cálculo de costos.")
     expediente = models.PositiveIntegerField(blank=True, null=True, help_text="Expediente CoPA relacionado.")
@@ -481,9 +563,29 @@ class Trabajo(models.Model):
     otros_gastos = models.DecimalField(
         max_digits=10, decimal_places=2, default=0, help_text="Otros gastos sin categorizar."
     )
+    cerrado = models.BooleanField(
+        "costos congelados",
+        default=False,
+        help_text="Trabajo cerrado: sus costos ya no cambian al modificar gastos, vehículos, instrumentos o parámetros.",
+    )
+    # expediente, comitente y actuantes normalizados, ver costos.search
+    busqueda = models.TextField(blank=True, editable=False)
+    # Also moved by changes to its actuantes, movilidad and instrumental, see costos.versiones
+    actualizado = models.DateTimeField(auto_now=True)
+
+    objects = TrabajoQuerySet.as_manager()
 
     class Meta:
         ordering = ["-fecha"]
+        # Sortable columns of the list. The Empresa filter is an EXISTS over
+        # Actuantes (see TrabajoQuerySet.de_empresa), so the first page is read
+        # in index order, checking each row until it is full. Searches go to
+        # busqueda, with a trigram index on PostgreSQL (migration 0013).
+        indexes = [
+            models.Index(fields=["-fecha"], name="trabajo_fecha_idx"),
+            models.Index(fields=["expediente"], name="trabajo_expediente_idx"),
+            models.Index(fields=["comitente"], name="trabajo_comitente_idx"),
+        ]
 
     def __str__(self):
         return f"{self.expediente}" if self.expediente else "S_N"
@@ -502,140 +604,111 @@ class Trabajo(models.Model):
     def get_csv_url(self):
         return reverse("trabajo_csv", kwargs={"pk": self.pk})
 
+    @cached_property
+    def costos(self):
+        """Desglose de costos del Trabajo: el guardado si existe y está al día, si no calculado en una sola pasada."""
+        from .costs import compute_costs
+
+        try:
+            if not self.costo.desactualizado:
+                return self.costo.as_costos()
+        except CostoTrabajo.DoesNotExist:
+            pass
+        return compute_costs(self)
+
     @property
     def empresa(self):
-        return self.profesionales.first().empresa if self.profesionales.last() else None
+        return self.costos.empresa
 
     @property
     def cantidad_de_profesionales(self):
-        return self.profesionales.count()
+        return self.costos.cantidad_de_profesionales
 
     cantidad_de_profesionales.fget.short_description = "# profesionales"
 
     @property
     def cantidad_de_instrumentos(self):
-        return self.instrumental.count()
+        return self.costos.cantidad_de_instrumentos
 
     cantidad_de_instrumentos.fget.short_description = "# instrumentos"
 
     @property
     def cantidad_de_vehiculos(self):
-        return self.movilidad.count()
+        return self.costos.cantidad_de_vehiculos
 
     cantidad_de_vehiculos.fget.short_description = "# vehículos"
 
     @property
     def horas_total(self):
-        return sum([p.horas for p in self.actuantes.all()])
+        return self.costos.horas_total
 
     @property
     def aportes(self):
-        return self.aporte_copa + self.aporte_caja
+        return self.costos.aportes
 
     @property
     def sellado_fiscal(self):
-        if self.partidas and self.lotes_finales:
-            MT = get_modulo_tributario()
-            _91011 = 6 * 2 * MT
-            _91066 = 300 * MT
-            _95013 = 300 * MT
-            _95068 = 300 * MT
-            _95077 = 500 * MT
-            return _91011 + _91066 + _95013 * self.partidas + _95068 * self.lotes_finales + _95077
-        else:
-            return 0
+        return self.costos.sellado_fiscal
 
     @property
     def informe_catastral(self):
-        MT = get_modulo_tributario()
-        INFORME_CATASTRAL = 400 * MT
-        return INFORME_CATASTRAL * self.partidas
+        return self.costos.informe_catastral
 
     @property
     def gastos_de_empresa(self):
-        if self.empresa:
-            return self.horas_total * self.empresa.gastos_por_hora
-        else:
-            return 0
+        return self.costos.gastos_de_empresa
 
     @property
     def costo_actuantes(self):
-        return round(decimal.Decimal(sum([f.horas * f.profesional.costo_por_hora for f in self.actuantes.all()])), 2)
+        return self.costos.costo_actuantes
 
     @property
     def costo_movilidad(self):
-        return round(decimal.Decimal(sum([m.km * m.vehiculo.costo_km for m in self.movilidad.all()])), 2)
+        return self.costos.costo_movilidad
 
     @property
     def cantidad_de_km(self):
-        return sum([m.km for m in self.movilidad.all()])
+        return self.costos.cantidad_de_km
 
     @property
     def costo_instrumental(self):
-        return round(
-            decimal.Decimal(sum([i.jornadas * i.instrumento.costo_jornada for i in self.instrumental.all()])), 2
-        )
+        return self.costos.costo_instrumental
 
     @property
     def cantidad_de_jornadas(self):
-        return sum([i.jornadas for i in self.instrumental.all()])
+        return self.costos.cantidad_de_jornadas
 
     @property
     def gastos_especificos(self):
-        return (
-            self.escrituras
-            + self.visados
-            + self.ccu
-            + self.estudio_titulos
-            + self.georreferenciacion
-            + self.citaciones
-            + self.viaticos
-            + self.ayudante
-            + self.dibujante
-            + self.impresiones
-            + self.mojones
-            + self.gestor
-            + self.seguros_especiales
-            + self.alquiler_instrumentos
-            + self.otros_gastos
-            + self.sellado_fiscal
-            + self.informe_catastral
-        )
+        return self.costos.gastos_especificos
 
     @property
     def costo_total(self):
-        return (
-            self.aportes
-            + self.gastos_especificos
-            + self.gastos_de_empresa
-            + self.costo_actuantes
-            + self.costo_movilidad
-            + self.costo_instrumental
-        )
+        return self.costos.costo_total
 
     @property
     def proporcion_empresa(self):
-        return round(self.gastos_de_empresa / self.costo_total * 100, 1)
+        return self.costos.proporcion_empresa
 
     @property
     def proporcion_actuantes(self):
-        return round(self.costo_actuantes / self.costo_total * 100, 1)
+        return self.costos.proporcion_actuantes
 
     @property
     def proporcion_movilidad(self):
-        return round(self.costo_movilidad / self.costo_total * 100, 1)
+        return self.costos.proporcion_movilidad
 
     @property
     def proporcion_instrumental(self):
-        return round(self.costo_instrumental / self.costo_total * 100, 1)
+        return self.costos.proporcion_instrumental
 
     @property
     def proporcion_aportes(self):
-        return round(self.aportes / self.costo_total * 100, 1)
+        return self.costos.proporcion_aportes
 
     @property
     def proporcion_especificos(self):
-        return round(self.gastos_especificos / self.costo_total * 100, 1)
+        return self.costos.proporcion_especificos
 
 
 class Actuantes(models.Model):
@@ -645,6 +718,11 @@ class Actuantes(models.Model):
 
     class Meta:
         ordering = ["-horas", "profesional"]
+        # A Profesional acts once per Trabajo. The unique index also serves the
+        # lookups by trabajo; the other one goes from the Profesionales of an
+        # Empresa to their Trabajos.
+        unique_together = ["trabajo", "profesional"]
+        indexes = [models.Index(fields=["profesional", "trabajo"], name="actuantes_profesional_idx")]
 
     def __str__(self):
         return f"{self.trabajo} - {self.profesional} [{self.horas} hs]"
@@ -694,3 +772,169 @@ class Instrumental(models.Model):
     @property
     def costo(self):
         return self.instrumento.costo_jornada * self.jornadas
+
+
+class CostoTrabajo(models.Model):
+    """Costos de un Trabajo, guardados para leerlos sin recalcularlos."""
+
+    trabajo = models.OneToOneField(Trabajo, on_delete=models.CASCADE, primary_key=True, related_name="costo")
+    empresa = models.ForeignKey(Empresa, blank=True, null=True, on_delete=models.SET_NULL, related_name="+")
+    horas_total = models.PositiveIntegerField(default=0)
+    cantidad_de_km = models.PositiveIntegerField(default=0)
+    cantidad_de_jornadas = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    aportes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gastos_especificos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gastos_de_empresa = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo_actuantes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo_movilidad = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo_instrumental = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    costo_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Exact breakdown (with line items), as computed
+    detalle = models.JSONField(default=dict)
+    # Fecha of the Trabajo when it was priced: the month it is summed in (see costos.resumenes)
+    fecha = models.DateField(blank=True, null=True)
+    actualizado = models.DateTimeField(auto_now=True)
+    # When a global parameter it was priced with changed; until it is priced
+    # again (rebuild_costos --stale) costs are computed on read, see costos.costs
+    desactualizado = models.DateTimeField(blank=True, null=True, editable=False)
+
+    class Meta:
+        verbose_name = "costo de trabajo"
+        verbose_name_plural = "costos de trabajos"
+        indexes = [
+            models.Index(
+                fields=["desactualizado"],
+                name="costo_desactualizado_idx",
+                condition=models.Q(desactualizado__isnull=False),
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.trabajo_id} - $ {self.costo_total}"
+
+    @classmethod
+    def from_costos(cls, trabajo, costos):
+        return cls(
+            trabajo=trabajo,
+            empresa=costos.empresa,
+            horas_total=costos.horas_total,
+            cantidad_de_km=costos.cantidad_de_km,
+            cantidad_de_jornadas=costos.cantidad_de_jornadas,
+            aportes=costos.aportes,
+            gastos_especificos=round(costos.gastos_especificos, 2),
+            gastos_de_empresa=costos.gastos_de_empresa,
+            costo_actuantes=costos.costo_actuantes,
+            costo_movilidad=costos.costo_movilidad,
+            costo_instrumental=costos.costo_instrumental,
+            costo_total=round(costos.costo_total, 2),
+            detalle=costos.as_dict(),
+            fecha=trabajo.fecha,
+            actualizado=timezone.now(),
+        )
+
+    def as_costos(self):
+        from .costs import CostosTrabajo
+
+        return CostosTrabajo.from_dict(self.detalle, empresa=self.empresa)
+
+
+class ResumenMensual(models.Model):
+    """Costos de los trabajos de una Empresa en un mes, sumados de sus CostoTrabajo (ver costos.resumenes)."""
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name="resumenes")
+    mes = models.DateField(help_text="Primer día del mes.")
+    trabajos = models.PositiveIntegerField(default=0)
+    horas = models.PositiveIntegerField(default=0)
+    km = models.PositiveIntegerField(default=0)
+    jornadas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    aportes = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    gastos_especificos = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    gastos_de_empresa = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    costo_actuantes = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    costo_movilidad = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    costo_instrumental = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    costo_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["empresa", "-mes"]
+        verbose_name = "resumen mensual"
+        verbose_name_plural = "resúmenes mensuales"
+        constraints = [models.UniqueConstraint(fields=["empresa", "mes"], name="resumen_empresa_mes")]
+
+    def __str__(self):
+        return f"{self.empresa_id} - {self.mes:%m/%Y}"
+
+
+class Tarifario(models.Model):
+    """Tarifas (costo por hora, por km y por jornada) de una Empresa, guardadas para no recalcularlas."""
+
+    empresa = models.OneToOneField(Empresa, on_delete=models.CASCADE, primary_key=True, related_name="tarifario")
+    # Rates and the parameters they were priced with, as serialized by costos.tarifas
+    tarifas = models.JSONField()
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Tarifario de {self.empresa_id}"
+
+
+class Vigencia(models.Model):
+    """Valor que tuvo un parámetro global durante un período (ver costos.vigencias)."""
+
+    PARAMETROS = (
+        ("cotizacion_dolar", "Cotización dólar"),
+        ("modulo_tributario", "Módulo tributario"),
+        ("nafta", "Nafta"),
+        ("nafta_premium", "Nafta Premium"),
+        ("diesel", "Diesel"),
+        ("diesel_premium", "Diesel Premium"),
+        ("gnc", "GNC"),
+    )
+    parametro = models.CharField(max_length=20, choices=PARAMETROS)
+    valor = models.DecimalField(max_digits=14, decimal_places=4)
+    desde = models.DateField()
+    hasta = models.DateField(help_text="Inclusive. Fuera de los períodos cargados rige la preferencia global.")
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["parametro", "-desde"]
+
+    def __str__(self):
+        return f"{self.get_parametro_display()} {self.valor} ({self.desde} a {self.hasta})"
+
+    def clean(self):
+        if self.desde and self.hasta:
+            if self.desde > self.hasta:
+                raise ValidationError({"hasta": "El período termina antes de empezar."})
+            superpuestas = Vigencia.objects.filter(
+                parametro=self.parametro, desde__lte=self.hasta, hasta__gte=self.desde
+            ).exclude(pk=self.pk)
+            if superpuestas.exists():
+                raise ValidationError(f"Se superpone con {superpuestas.first()}.")
+
+
+class Correo(models.Model):
+    """Mensaje de correo en espera de ser enviado (ver costos.outbox)."""
+
+    PENDIENTE = "pendiente"
+    ENVIADO = "enviado"
+    FALLIDO = "fallido"
+    ESTADOS = [(PENDIENTE, "Pendiente"), (ENVIADO, "Enviado"), (FALLIDO, "Fallido")]
+
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    asunto = models.CharField(max_length=255, blank=True)
+    destinatarios = models.TextField(blank=True)
+    # The EmailMessage, as serialized by costos.outbox
+    mensaje = models.JSONField()
+    intentos = models.PositiveSmallIntegerField(default=0)
+    proximo_intento = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    enviado = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-creado"]
+        indexes = [models.Index(fields=["estado", "proximo_intento"], name="correo_pendiente_idx")]
+
+    def __str__(self):
+        return f"{self.asunto} ({self.get_estado_display()})"
@@ -0,0 +1,66 @@
+"""
+Money kernel.
+
+Cost arithmetic is done on exact integer ratios, rounded to integer centavos
+(half to even, like ``round(Decimal, 2)``) only where the original Decimal
+code rounds, so results are identical while intermediate steps are plain
+int operations. Amounts cross the model boundary with ``ratio()`` and
+``centavos()`` on the way in and ``a_decimal()`` on the way out.
+"""
+import decimal
+
+
+def ratio(value):
+    """Exact ``(numerator, denominator)`` of a Decimal, int or float."""
+    return value.as_integer_ratio()
+
+
+def redondear(num, den=1):
+    """``round(num / den, 2)`` (half to even, like Decimal) as an integer amount of centavos."""
+    if den < 0:
+        num, den = -num, -den
+    q, r = divmod(num * 100, den)
+    if 2 * r > den or (2 * r == den and q % 2):
+        q += 1
+    return q
+
+
+def como_decimal(num, den):
+    """
+    ``num / den`` rounded the way a Decimal operation rounds its result (to
+    the context precision, 28 significant digits by default, half to even),
+    as an exact ratio. Needed where the original code chains operations.
+    """
+    if num == 0:
+        return 0, 1
+    if den < 0:
+        num, den = -num, -den
+    signo, num = (-1 if num < 0 else 1), abs(num)
+    digitos = decimal.getcontext().prec
+
+    def escalar(k):
+        return (num * 10 ** k, den) if k >= 0 else (num, den * 10 ** -k)
+
+    # Scale by 10**k so the integer part of the quotient has exactly ``digitos`` digits
+    k = digitos - len(str(num)) + len(str(den))
+    n, d = escalar(k)
+    while n // d >= 10 ** digitos:
+        k -= 1
+        n, d = escalar(k)
+    while n // d < 10 ** (digitos - 1):
+        k += 1
+        n, d = escalar(k)
+    q, r = divmod(n, d)
+    if 2 * r > d or (2 * r == d and q % 2):
+        q += 1
+    return (signo * q, 10 ** k) if k >= 0 else (signo * q * 10 ** -k, 1)
+
+
+def centavos(value):
+    """``round(value, 2)`` in centavos."""
+    return redondear(*ratio(value))
+
+
+def a_decimal(centavos):
+    """Decimal amount with two decimal places, as ``round(Decimal, 2)`` returns it."""
+    return decimal.Decimal(centavos).scaleb(-2)
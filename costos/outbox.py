@@ -0,0 +1,164 @@
+"""
+Email outbox.
+
+EMAIL_BACKEND is ``costos.outbox.OutboxBackend``: sending a message (send_mail,
+the password reset email, ...) only saves it as a Correo, in the current
+transaction, so requests never wait for the mail provider. The
+``enviar_correos`` command delivers them in batches through
+OUTBOX_EMAIL_BACKEND (SendGrid in production; the console or file backend
+in development), retrying failures with exponential backoff.
+
+Delivery is at least once: if the worker dies while handing a message to
+the provider, that message is sent again.
+"""
+import base64
+import datetime
+
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from . import models
+
+DEFAULT_TRANSPORT = "anymail.backends.sendgrid.EmailBackend"
+
+
+def serializar(message):
+    """JSON-compatible dict with everything needed to rebuild ``message``."""
+    adjuntos = []
+    for adjunto in message.attachments:
+        if not isinstance(adjunto, tuple):
+            raise ValueError("Only (filename, content, mimetype) attachments can be queued")
+        filename, content, mimetype = adjunto
+        binario = isinstance(content, bytes)
+        adjuntos.append([filename, base64.b64encode(content).decode() if binario else content, mimetype, binario])
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": message.to,
+        "cc": message.cc,
+        "bcc": message.bcc,
+        "reply_to": message.reply_to,
+        "headers": message.extra_headers,
+        "content_subtype": message.content_subtype,
+        "alternatives": getattr(message, "alternatives", []),
+        "attachments": adjuntos,
+    }
+
+
+def deserializar(datos):
+    message = mail.EmailMultiAlternatives(
+        subject=datos["subject"],
+        body=datos["body"],
+        from_email=datos["from_email"],
+        to=datos["to"],
+        cc=datos["cc"],
+        bcc=datos["bcc"],
+        reply_to=datos["reply_to"],
+        headers=datos["headers"],
+        alternatives=[tuple(alternative) for alternative in datos["alternatives"]],
+    )
+    message.content_subtype = datos["content_subtype"]
+    for filename, content, mimetype, binario in datos["attachments"]:
+        message.attach(filename, base64.b64decode(content) if binario else content, mimetype)
+    return message
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Email backend that queues the messages as Correos instead of sending them."""
+
+    def send_messages(self, email_messages):
+        correos = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            try:
+                # Invalid headers (BadHeaderError) are reported now, to the sender
+                message.message()
+                mensaje = serializar(message)
+            except Exception:
+                if not self.fail_silently:
+                    raise
+                continue
+            correos.append(
+                models.Correo(
+                    asunto=message.subject[:255], destinatarios=", ".join(message.recipients()), mensaje=mensaje
+                )
+            )
+        models.Correo.objects.bulk_create(correos)
+        return len(correos)
+
+
+def get_transport():
+    backend = getattr(settings, "OUTBOX_EMAIL_BACKEND", DEFAULT_TRANSPORT)
+    if backend == f"{__name__}.{OutboxBackend.__name__}":
+        raise ImproperlyConfigured("OUTBOX_EMAIL_BACKEND must be a backend that actually sends email.")
+    return mail.get_connection(backend)
+
+
+def reservar(batch_size, lease):
+    """
+    Claims up to ``batch_size`` due Correos in a short transaction: their
+    next attempt is pushed ``lease`` seconds ahead, so other workers skip
+    them while they are being sent, and the attempt is counted.
+    """
+    with transaction.atomic():
+        correos = list(
+            models.Correo.objects.select_for_update(skip_locked=True)
+            .filter(estado=models.Correo.PENDIENTE, proximo_intento__lte=timezone.now())
+            .order_by("proximo_intento", "pk")[:batch_size]
+        )
+        for correo in correos:
+            correo.intentos += 1
+            correo.proximo_intento = timezone.now() + datetime.timedelta(seconds=lease)
+        models.Correo.objects.bulk_update(correos, ["intentos", "proximo_intento"])
+    return correos
+
+
+def entregar(batch_size=50, max_intentos=None):
+    """
+    Sends up to ``batch_size`` due Correos. A failed message is retried after
+    OUTBOX_RETRY_DELAY seconds, doubled on every attempt (up to
+    OUTBOX_MAX_RETRY_DELAY), and is marked as failed after ``max_intentos``.
+    Returns how many were sent and how many failed.
+
+    Messages are claimed for OUTBOX_LEASE seconds (see ``reservar()``), so
+    several workers can run at the same time, and are sent outside any
+    transaction, saving the result of each one as soon as it is known. If
+    the worker dies, only the message it was sending can be sent twice; the
+    rest of its batch is retried when the lease expires.
+    """
+    if max_intentos is None:
+        max_intentos = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 8)
+    retry_delay = getattr(settings, "OUTBOX_RETRY_DELAY", 60)
+    max_retry_delay = getattr(settings, "OUTBOX_MAX_RETRY_DELAY", 6 * 60 * 60)
+    correos = reservar(batch_size, getattr(settings, "OUTBOX_LEASE", 15 * 60))
+    if not correos:
+        return 0, 0
+    enviados = fallidos = 0
+    transport = get_transport()
+    try:
+        for correo in correos:
+            try:
+                transport.send_messages([deserializar(correo.mensaje)])
+            except Exception as e:
+                fallidos += 1
+                correo.error = f"{type(e).__name__}: {e}"
+                if correo.intentos >= max_intentos:
+                    correo.estado = models.Correo.FALLIDO
+                else:
+                    delay = min(retry_delay * 2 ** (correo.intentos - 1), max_retry_delay)
+                    correo.proximo_intento = timezone.now() + datetime.timedelta(seconds=delay)
+            else:
+                enviados += 1
+                correo.estado = models.Correo.ENVIADO
+                correo.enviado = timezone.now()
+                correo.error = ""
+            correo.save(update_fields=["estado", "proximo_intento", "error", "enviado"])
+    finally:
+        transport.close()
+    return enviados, fallidos
@@ -0,0 +1,205 @@
+"""
+Keyset (seek) pagination.
+
+Pages are read with ``WHERE (sort keys) > (last row's keys) LIMIT n`` instead
+of OFFSET, so a deep page costs the same as the first one. The position is an
+opaque cursor token in the querystring. The order is the queryset's (or the
+model's default), with the primary key appended to make it total.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+FIRST, NEXT, PREVIOUS, LAST = "f", "n", "p", "l"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Key:
+    """One sort key: a field path (possibly through relations or an annotation) and its direction."""
+
+    def __init__(self, model, order):
+        self.descending = order.startswith("-")
+        self.name = order.lstrip("-")
+        if self.name == "pk":
+            self.field, self.nullable = model._meta.pk, False
+        else:
+            self.field, self.nullable = self._resolve(model, self.name.split("__"))
+
+    @staticmethod
+    def _resolve(model, path):
+        nullable = False
+        field = None
+        for i, part in enumerate(path):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None, False  # annotation
+            if field.is_relation:
+                # Reverse relations may be missing too
+                nullable = nullable or field.null or field.auto_created
+                model = field.related_model
+                if i == len(path) - 1:
+                    field = model._meta.pk
+            else:
+                nullable = nullable or field.null
+        return field, nullable
+
+    def ordering(self, reverse=False):
+        # NULLs go first ascending and last descending, as PostgreSQL does by default
+        descending = self.descending != reverse
+        expression = F(self.name)
+        if not self.nullable:
+            return expression.desc() if descending else expression.asc()
+        return expression.desc(nulls_last=True) if descending else expression.asc(nulls_first=True)
+
+    def value(self, obj):
+        for part in self.name.split("__"):
+            try:
+                obj = getattr(obj, part)
+            except ObjectDoesNotExist:
+                return None
+            if obj is None:
+                return None
+        return obj.pk if hasattr(obj, "_meta") else obj
+
+    def dump(self, value):
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+    def load(self, value):
+        return self.field.to_python(value) if self.field is not None and value is not None else value
+
+    def equal(self, value):
+        return Q(**{f"{self.name}__isnull": True}) if value is None else Q(**{self.name: value})
+
+    def after(self, value, reverse=False):
+        """Rows after ``value`` in this key's order (before it if ``reverse``), or None if there are none."""
+        descending = self.descending != reverse
+        if value is None:
+            # NULLs are first ascending and last descending
+            return None if descending else Q(**{f"{self.name}__isnull": False})
+        q = Q(**{f"{self.name}__{'lt' if descending else 'gt'}": value})
+        if self.nullable and descending:
+            q |= Q(**{f"{self.name}__isnull": True})
+        return q
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, estimate_count=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.estimate_count = estimate_count
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not {"pk", "-pk", "id", "-id"} & set(ordering):
+            ordering.append("pk")
+        self.keys = [Key(queryset.model, o) for o in ordering]
+        self.signature = ",".join(ordering)
+
+    @cached_property
+    def count(self):
+        """Total rows, estimated by the planner on PostgreSQL if ``estimate_count``."""
+        if self.estimate_count and connections[self.queryset.db].vendor == "postgresql":
+            plan = json.loads(self.queryset.order_by().explain(format="json"))
+            return int(plan[0]["Plan"]["Plan Rows"])
+        return self.queryset.count()
+
+    @property
+    def count_is_estimate(self):
+        return self.estimate_count and connections[self.queryset.db].vendor == "postgresql"
+
+    def encode(self, direction, obj=None):
+        data = {"d": direction, "o": self.signature}
+        if obj is not None:
+            data["k"] = [key.dump(key.value(obj)) for key in self.keys]
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    def decode(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if data["o"] != self.signature:
+                raise InvalidCursor("The cursor belongs to another order")
+            if data["d"] in (FIRST, LAST):
+                return data["d"], None
+            if data["d"] not in (NEXT, PREVIOUS) or len(data["k"]) != len(self.keys):
+                raise InvalidCursor("Invalid cursor")
+            return data["d"], [key.load(v) for key, v in zip(self.keys, data["k"])]
+        except (binascii.Error, TypeError, KeyError, ValueError, AttributeError, ValidationError) as e:
+            raise InvalidCursor(str(e)) from e
+
+    def seek(self, values, reverse=False):
+        """Condition for the rows after the one with sort key ``values`` (before it if ``reverse``)."""
+        condition = Q(pk__in=[])
+        for i, key in enumerate(self.keys):
+            after = key.after(values[i], reverse)
+            if after is not None:
+                prefix = Q()
+                for previous, value in zip(self.keys[:i], values[:i]):
+                    prefix &= previous.equal(value)
+                condition |= prefix & after
+        return condition
+
+    def page(self, cursor=None):
+        """The page at ``cursor`` (a token from a previous page), or the first one."""
+        try:
+            direction, values = self.decode(cursor) if cursor else (FIRST, None)
+        except InvalidCursor:
+            direction, values = FIRST, None
+        reverse = direction in (PREVIOUS, LAST)
+        queryset = self.queryset.order_by(*[key.ordering(reverse) for key in self.keys])
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, reverse))
+        rows = list(queryset[: self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+        return KeysetPage(self, rows, direction, more)
+
+
+class KeysetPage:
+    """A page of rows; in templates it stands in for Django's Page (without page numbers)."""
+
+    def __init__(self, paginator, object_list, direction, more):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.direction = direction
+        if direction in (PREVIOUS, LAST):
+            self._has_previous, self._has_next = more, direction == PREVIOUS
+        else:
+            self._has_previous, self._has_next = direction == NEXT, more
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        return self.paginator.encode(NEXT, self.object_list[-1]) if self.has_next() else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.encode(PREVIOUS, self.object_list[0]) if self.has_previous() else None
+
+    @property
+    def last_cursor(self):
+        return self.paginator.encode(LAST) if self.has_next() else None
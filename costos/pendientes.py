@@ -0,0 +1,49 @@
+"""
+Work deferred to the commit of the current transaction.
+
+Signals collect what has to be recomputed (Trabajos whose snapshots or
+search text changed, months whose rollups did) while a transaction runs,
+and it is done once, merged, when it commits. ``Pendientes`` keeps that
+buffer per thread, tied to the ``on_commit`` callback that will flush it:
+if the transaction rolls back, Django drops the callback, and the next
+transaction starts an empty buffer instead of inheriting the discarded
+work.
+
+A savepoint rolled back inside a transaction that registered work before
+it keeps the buffer, with the items of the savepoint too; flushing them
+only recomputes those rows from what was committed.
+"""
+import threading
+
+from django.db import transaction
+
+
+class Pendientes:
+    """Items added during a transaction, handed to ``flush(items)`` (a list) once it commits."""
+
+    def __init__(self, flush):
+        self.flush = flush
+        self._local = threading.local()
+
+    def add(self, items):
+        pendientes = getattr(self._local, "pendientes", None)
+        if pendientes is not None and self._registrado(pendientes[1]):
+            pendientes[0].extend(items)
+            return
+        buffer = list(items)
+        callback = self._callback(buffer)
+        self._local.pendientes = (buffer, callback)
+        # Runs right away in autocommit
+        transaction.on_commit(callback)
+
+    def _callback(self, buffer):
+        def callback():
+            self._local.pendientes = None
+            self.flush(buffer)
+
+        return callback
+
+    @staticmethod
+    def _registrado(callback):
+        # Still waiting for the commit of the current transaction
+        return any(func is callback for _, func in transaction.get_connection().run_on_commit)
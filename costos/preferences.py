@@ -1,5 +1,9 @@
+import contextvars
 import decimal
+from contextlib import contextmanager
+from dataclasses import dataclass
 
+from django.utils.functional import SimpleLazyObject
 from dynamic_preferences.preferences import Section
 from dynamic_preferences.registries import global_preferences_registry
 from dynamic_preferences.types import DecimalPreference, StringPreference
@@ -185,6 +189,91 @@ class OtrosGastos(DecimalPreference):
     default = decimal.Decimal(0)
 
 
+# Snapshot
+# --------
+@dataclass(frozen=True)
+class ParametrosGlobales:
+    """Immutable snapshot of the global preferences used in cost calculations."""
+
+    cotizacion_dolar: decimal.Decimal
+    modulo_tributario: decimal.Decimal
+    aporte_copa: decimal.Decimal
+    aporte_caja: decimal.Decimal
+    nafta: decimal.Decimal
+    nafta_premium: decimal.Decimal
+    diesel: decimal.Decimal
+    diesel_premium: decimal.Decimal
+    gnc: decimal.Decimal
+
+    @classmethod
+    def load(cls):
+        """Reads every global preference at once."""
+        prefs = global_preferences_registry.manager().all()
+        return cls(
+            cotizacion_dolar=prefs["cotizacion_dolar"],
+            modulo_tributario=prefs["modulo_tributario"],
+            aporte_copa=prefs[f"{aportes.name}__copa"],
+            aporte_caja=prefs[f"{aportes.name}__caja"],
+            nafta=prefs[f"{combustible.name}__nafta"],
+            nafta_premium=prefs[f"{combustible.name}__nafta_premium"],
+            diesel=prefs[f"{combustible.name}__diesel"],
+            diesel_premium=prefs[f"{combustible.name}__diesel_premium"],
+            gnc=prefs[f"{combustible.name}__gnc"],
+        )
+
+    def valor_litro(self, tipo_combustible):
+        return getattr(self, tipo_combustible.lower().replace(" ", "_"))
+
+
+_parametros = contextvars.ContextVar("parametros_globales", default=None)
+_vigencias = contextvars.ContextVar("vigencias", default=None)
+
+
+def _cargar_vigencias():
+    from .vigencias import cargar
+
+    return cargar()
+
+
+@contextmanager
+def parametros_globales(parametros=None):
+    """
+    Makes a ParametrosGlobales snapshot the active one while the block runs,
+    so every helper below reads from it instead of looking preferences up.
+    Without arguments, the snapshot is loaded lazily on first use. The
+    periods of date-effective values (see costos.vigencias) are checked once
+    per block too, when first needed.
+    """
+    token = _parametros.set(parametros or SimpleLazyObject(ParametrosGlobales.load))
+    vigencias = _vigencias.get()
+    token_vigencias = _vigencias.set(vigencias if vigencias is not None else SimpleLazyObject(_cargar_vigencias))
+    try:
+        yield _parametros.get()
+    finally:
+        _vigencias.reset(token_vigencias)
+        _parametros.reset(token)
+
+
+def get_parametros():
+    """Returns the active snapshot, or loads a new one."""
+    parametros = _parametros.get()
+    return parametros if parametros is not None else ParametrosGlobales.load()
+
+
+def get_vigencias():
+    """Returns the active ``Vigencias`` index, or loads it."""
+    vigencias = _vigencias.get()
+    return vigencias if vigencias is not None else _cargar_vigencias()
+
+
+def reset_parametros():
+    """Discards the active snapshot (if any) after a global preference or a period changes."""
+    if _parametros.get() is not None:
+        _parametros.set(SimpleLazyObject(ParametrosGlobales.load))
+    if _vigencias.get() is not None:
+        _vigencias.set(SimpleLazyObject(_cargar_vigencias))
+
+
 # Helpers
 # -------
 def global_parameters(section, name):
@@ -193,22 +282,43 @@ def global_parameters(section, name):
     return global_preferences[param]
 
 
-def get_cotizacion_dolar():
-    return global_parameters(None, "cotizacion_dolar")
+def _vigente(nombre, fecha):
+    # Value of the period containing fecha, if any
+    return get_vigencias().valor(nombre, fecha) if fecha is not None else None
+
+
+def get_cotizacion_dolar(fecha=None):
+    valor = _vigente("cotizacion_dolar", fecha)
+    if valor is not None:
+        return valor
+    parametros = _parametros.get()
+    return parametros.cotizacion_dolar if parametros is not None else global_parameters(None, "cotizacion_dolar")
 
 
-def get_modulo_tributario():
-    return global_parameters(None, "modulo_tributario")
+def get_modulo_tributario(fecha=None):
+    valor = _vigente("modulo_tributario", fecha)
+    if valor is not None:
+        return valor
+    parametros = _parametros.get()
+    return parametros.modulo_tributario if parametros is not None else global_parameters(None, "modulo_tributario")
 
 
 def get_aporte_copa():
-    return global_parameters(aportes, "copa")
+    parametros = _parametros.get()
+    return parametros.aporte_copa if parametros is not None else global_parameters(aportes, "copa")
 
 
 def get_aporte_caja():
-    return global_parameters(aportes, "caja")
+    parametros = _parametros.get()
+    return parametros.aporte_caja if parametros is not None else global_parameters(aportes, "caja")
 
 
-def get_valor_litro(tipo_combustible):
+def get_valor_litro(tipo_combustible, fecha=None):
     tipo = tipo_combustible.lower().replace(" ", "_")
+    valor = _vigente(tipo, fecha)
+    if valor is not None:
+        return valor
+    parametros = _parametros.get()
+    if parametros is not None:
+        return parametros.valor_litro(tipo_combustible)
     return global_parameters(combustible, tipo)
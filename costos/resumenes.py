@@ -0,0 +1,127 @@
+"""
+Monthly cost rollups.
+
+``ResumenMensual`` keeps, for each Empresa and month, the number of Trabajos
+and the sums of their saved costs (CostoTrabajo), so costs over time are
+read from a few rows instead of pricing every Trabajo. A snapshot is summed
+in the Empresa and month it was priced with (``CostoTrabajo.empresa`` and
+``.fecha``), which are kept with it.
+
+Rollups are maintained incrementally: when snapshots are written or deleted,
+the months they were in and the months they are in now are summed again
+from the snapshots, with one aggregate query per batch, inside the
+transaction that rewrites them. ``rebuild_resumenes`` sums every month again.
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from . import models, versiones
+from .pendientes import Pendientes
+
+# Rollup fields and the snapshot aggregates they hold
+CAMPOS = {
+    "trabajos": Count("pk"),
+    "horas": Sum("horas_total"),
+    "km": Sum("cantidad_de_km"),
+    "jornadas": Sum("cantidad_de_jornadas"),
+    "aportes": Sum("aportes"),
+    "gastos_especificos": Sum("gastos_especificos"),
+    "gastos_de_empresa": Sum("gastos_de_empresa"),
+    "costo_actuantes": Sum("costo_actuantes"),
+    "costo_movilidad": Sum("costo_movilidad"),
+    "costo_instrumental": Sum("costo_instrumental"),
+    "costo_total": Sum("costo_total"),
+}
+
+
+def mes(fecha):
+    return fecha.replace(day=1)
+
+
+def sumar(costos):
+    """Rollup rows (dicts with ``empresa_id`` and ``mes``) of a CostoTrabajo queryset."""
+    filas = (
+        costos.filter(empresa__isnull=False, fecha__isnull=False)
+        .annotate(mes=TruncMonth("fecha"))
+        .order_by()
+        .values("empresa", "mes")
+        .annotate(**CAMPOS)
+    )
+    return [{"empresa_id": fila.pop("empresa"), **fila} for fila in filas]
+
+
+def ultimos(empresa, meses=12):
+    """The last ``meses`` rollups of an Empresa, newest first, in a single query."""
+    return list(models.ResumenMensual.objects.filter(empresa=empresa).order_by("-mes")[:meses])
+
+
+def actualizar(claves, intentos=3):
+    """
+    Sums again the rollups of the given (Empresa id, fecha) keys, each standing
+    for the month of the fecha. Months left without snapshots are deleted.
+
+    The rows of those months are locked before summing, so concurrent updates
+    of the same month are applied one after the other, each summing what the
+    previous one committed. A month inserted by another process meanwhile
+    makes the insert fail; then everything is summed again.
+    """
+    claves = {(empresa, mes(fecha)) for empresa, fecha in claves if empresa is not None and fecha is not None}
+    if not claves:
+        return
+    try:
+        with transaction.atomic():
+            _reescribir(claves)
+    except IntegrityError:
+        if intentos <= 1:
+            raise
+        actualizar(claves, intentos - 1)
+
+
+def _reescribir(claves):
+    empresas = {empresa for empresa, _ in claves}
+    desde = min(m for _, m in claves)
+    ultimo = max(m for _, m in claves)
+    hasta = (ultimo + datetime.timedelta(days=31)).replace(day=1)
+    existentes = (
+        models.ResumenMensual.objects.select_for_update()
+        .filter(empresa__in=empresas, mes__range=(desde, ultimo))
+        .order_by("pk")
+    )
+    existentes = [fila for fila in existentes.values_list("pk", "empresa", "mes") if fila[1:] in claves]
+    costos = models.CostoTrabajo.objects.filter(empresa__in=empresas, fecha__gte=desde, fecha__lt=hasta)
+    nuevos = [models.ResumenMensual(**fila) for fila in sumar(costos) if (fila["empresa_id"], fila["mes"]) in claves]
+    models.ResumenMensual.objects.filter(pk__in=[pk for pk, _, _ in existentes]).delete()
+    models.ResumenMensual.objects.bulk_create(nuevos)
+    # Rewritten months move the version of the Empresa page (see versiones.empresa()); deleted ones must move it
+    escritos = {(r.empresa_id, r.mes) for r in nuevos}
+    vaciadas = {empresa for _, empresa, m in existentes if (empresa, m) not in escritos}
+    if vaciadas:
+        versiones.actualizar(models.Empresa.objects.filter(pk__in=vaciadas))
+
+
+def reconstruir(empresa=None):
+    """Sums again every rollup (of ``empresa``, if given). Returns how many rows were written."""
+    costos = models.CostoTrabajo.objects.all()
+    resumenes = models.ResumenMensual.objects.all()
+    if empresa is not None:
+        costos = costos.filter(empresa=empresa)
+        resumenes = resumenes.filter(empresa=empresa)
+    nuevos = [models.ResumenMensual(**fila) for fila in sumar(costos)]
+    with transaction.atomic():
+        resumenes.delete()
+        models.ResumenMensual.objects.bulk_create(nuevos)
+    return len(nuevos)
+
+
+def schedule_update(claves):
+    """
+    Sums again the rollups of (Empresa id, fecha) ``claves`` once the current
+    transaction commits, merged with the other calls in the same transaction.
+    """
+    _pendientes.add(claves)
+
+
+_pendientes = Pendientes(actualizar)
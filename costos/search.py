@@ -0,0 +1,93 @@
+"""
+Trabajo search.
+
+Every Trabajo keeps ``busqueda``: its expediente, comitente and the matrícula
+and name of its actuantes, in lowercase and without accents. Signals keep it
+up to date. On PostgreSQL the column has a trigram GIN index (migration
+0013), so ``LIKE '%word%'`` is served by the index and results are ranked
+by similarity. Other backends (SQLite, for development) only filter.
+"""
+import unicodedata
+
+from django.db import connections, transaction
+from django.db.models import Prefetch
+
+from . import models
+from .pendientes import Pendientes
+
+
+def normalizar(texto):
+    """Lowercase text without accents, so "Pérez" is found as "perez"."""
+    texto = unicodedata.normalize("NFKD", str(texto)).lower()
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def texto_busqueda(trabajo):
+    partes = [trabajo.expediente or "", trabajo.comitente]
+    for actuante in trabajo.actuantes.all():
+        profesional = actuante.profesional
+        partes += [profesional.matricula or "", profesional.last_name, profesional.first_name]
+    return normalizar(" ".join(str(p) for p in partes if p))
+
+
+def actualizar_busqueda(trabajo_ids, chunk_size=500):
+    """Recomputes ``busqueda`` of the given Trabajos. Returns how many were updated."""
+    trabajo_ids = list(trabajo_ids)
+    actualizados = 0
+    for i in range(0, len(trabajo_ids), chunk_size):
+        trabajos = list(
+            models.Trabajo.objects.filter(pk__in=trabajo_ids[i : i + chunk_size])
+            .only("expediente", "comitente", "busqueda")
+            .prefetch_related(
+                Prefetch("actuantes", models.Actuantes.objects.select_related("profesional").order_by("pk"))
+            )
+        )
+        cambiados = []
+        for trabajo in trabajos:
+            texto = texto_busqueda(trabajo)
+            if texto != trabajo.busqueda:
+                trabajo.busqueda = texto
+                cambiados.append(trabajo)
+        with transaction.atomic():
+            models.Trabajo.objects.bulk_update(cambiados, ["busqueda"])
+        actualizados += len(cambiados)
+    return actualizados
+
+
+def schedule_update(trabajos):
+    """
+    Recomputes ``busqueda`` of ``trabajos`` (a Trabajo queryset) once the
+    current transaction commits, merging several calls into one update.
+    """
+    _pendientes.add([trabajos])
+
+
+def _flush_pending(querysets):
+    trabajo_ids = set()
+    for qs in querysets:
+        trabajo_ids.update(qs.values_list("pk", flat=True))
+    if trabajo_ids:
+        actualizar_busqueda(trabajo_ids)
+
+
+_pendientes = Pendientes(_flush_pending)
+
+
+def buscar(queryset, texto):
+    """
+    Trabajos of ``queryset`` whose ``busqueda`` contains every word of ``texto``.
+    On PostgreSQL they are ranked by trigram similarity, unless the queryset
+    already has an explicit order.
+    """
+    palabras = normalizar(texto).split()
+    if not palabras:
+        return queryset
+    for palabra in palabras:
+        queryset = queryset.filter(busqueda__contains=palabra)
+    if connections[queryset.db].vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = queryset.annotate(rango=TrigramSimilarity("busqueda", " ".join(palabras)))
+        if not queryset.query.order_by:
+            queryset = queryset.order_by("-rango", *models.Trabajo._meta.ordering)
+    return queryset
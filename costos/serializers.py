@@ -0,0 +1,161 @@
+"""
+Read-only serializers of the REST API (see costos.api).
+
+Costs are never computed field by field: Trabajo costs come from their
+snapshot (``Trabajo.costos``, attached in batch by ``with_costs()``), and
+rates from the rate cards of the Empresas, loaded once per page into the
+``tarifas`` context entry.
+"""
+from rest_framework import serializers
+
+from . import models
+
+
+class SparseFieldsMixin:
+    """Keeps only the fields named in the ``campos`` context entry (a set), when there is one."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = self.context.get("campos")
+        if campos:
+            for nombre in set(self.fields) - campos:
+                self.fields.pop(nombre)
+
+
+class TarifaField(serializers.DecimalField):
+    """A rate of the object, from its Empresa's rate card (``costs.Tarificador`` in the ``tarifas`` context entry)."""
+
+    def __init__(self, tarifa, **kwargs):
+        self.tarifa = tarifa
+        super().__init__(max_digits=14, decimal_places=2, read_only=True, source="*", **kwargs)
+
+    def to_representation(self, obj):
+        return super().to_representation(getattr(self.context["tarifas"], self.tarifa)(obj))
+
+
+class CostoField(serializers.DecimalField):
+    def __init__(self, **kwargs):
+        super().__init__(max_digits=14, decimal_places=2, read_only=True, **kwargs)
+
+
+class EmpresaSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    gastos_por_hora = TarifaField("gastos_por_hora")
+
+    class Meta:
+        model = models.Empresa
+        fields = ["id", "nombre", "horas_semanales", "gastos_por_hora"]
+
+
+class ProfesionalSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    costo_por_hora = TarifaField("costo_por_hora")
+
+    class Meta:
+        model = models.Profesional
+        fields = ["id", "username", "first_name", "last_name", "matricula", "cuit", "empresa", "costo_por_hora"]
+
+
+class VehiculoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    costo_km = TarifaField("costo_km")
+
+    class Meta:
+        model = models.Vehiculo
+        fields = [
+            "id",
+            "empresa",
+            "nombre",
+            "valor",
+            "kilometraje_anual",
+            "tipo_combustible",
+            "rendimiento",
+            "costo_km",
+        ]
+
+
+class InstrumentoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    costo_jornada = TarifaField("costo_jornada")
+
+    class Meta:
+        model = models.Instrumento
+        fields = ["id", "empresa", "nombre", "valor_USD", "vida_util", "costo_jornada"]
+
+
+class ActuantesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Actuantes
+        fields = ["profesional", "horas"]
+
+
+class MovilidadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Movilidad
+        fields = ["vehiculo", "km"]
+
+
+class InstrumentalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = models.Instrumental
+        fields = ["instrumento", "jornadas"]
+
+
+class TrabajoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    actuantes = ActuantesSerializer(many=True, read_only=True)
+    movilidad = MovilidadSerializer(many=True, read_only=True)
+    instrumental = InstrumentalSerializer(many=True, read_only=True)
+    empresa = serializers.PrimaryKeyRelatedField(source="costos.empresa", read_only=True)
+    horas_total = serializers.IntegerField(source="costos.horas_total", read_only=True)
+    cantidad_de_km = serializers.IntegerField(source="costos.cantidad_de_km", read_only=True)
+    cantidad_de_jornadas = CostoField(source="costos.cantidad_de_jornadas")
+    aportes = CostoField(source="costos.aportes")
+    sellado_fiscal = CostoField(source="costos.sellado_fiscal")
+    informe_catastral = CostoField(source="costos.informe_catastral")
+    gastos_especificos = CostoField(source="costos.gastos_especificos")
+    gastos_de_empresa = CostoField(source="costos.gastos_de_empresa")
+    costo_actuantes = CostoField(source="costos.costo_actuantes")
+    costo_movilidad = CostoField(source="costos.costo_movilidad")
+    costo_instrumental = CostoField(source="costos.costo_instrumental")
+    costo_total = CostoField(source="costos.costo_total")
+
+    class Meta:
+        model = models.Trabajo
+        fields = [
+            "id",
+            "fecha",
+            "expediente",
+            "comitente",
+            "cerrado",
+            "aporte_copa",
+            "aporte_caja",
+            "partidas",
+            "lotes_finales",
+            "escrituras",
+            "visados",
+            "ccu",
+            "estudio_titulos",
+            "georreferenciacion",
+            "citaciones",
+            "viaticos",
+            "ayudante",
+            "dibujante",
+            "impresiones",
+            "mojones",
+            "gestor",
+            "seguros_especiales",
+            "alquiler_instrumentos",
+            "otros_gastos",
+            "actuantes",
+            "movilidad",
+            "instrumental",
+            "empresa",
+            "horas_total",
+            "cantidad_de_km",
+            "cantidad_de_jornadas",
+            "aportes",
+            "sellado_fiscal",
+            "informe_catastral",
+            "gastos_especificos",
+            "gastos_de_empresa",
+            "costo_actuantes",
+            "costo_movilidad",
+            "costo_instrumental",
+            "costo_total",
+        ]
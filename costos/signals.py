@@ -0,0 +1,226 @@
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from dynamic_preferences.models import GlobalPreferenceModel
+
+from . import models, resumenes, search, tarifas, versiones
+from .costs import schedule_update
+from .preferences import reset_parametros
+
+
+def trabajos_parametro(nombre):
+    """Trabajos whose cost depends on global parameter ``nombre``, or None if it prices none."""
+    trabajos = models.Trabajo.objects.all()
+    if nombre == "modulo_tributario":
+        return trabajos.filter(partidas__gt=0)
+    if nombre == "cotizacion_dolar":
+        return trabajos.filter(instrumental__isnull=False)
+    tipos = [k for k, v in models.Vehiculo.TIPO_COMBUSTIBLE if v.lower().replace(" ", "_") == nombre]
+    return trabajos.filter(movilidad__vehiculo__tipo_combustible__in=tipos) if tipos else None
+
+
+@receiver([post_save, post_delete], sender=GlobalPreferenceModel)
+def global_preference_changed(sender, instance, **kwargs):
+    reset_parametros()
+    if kwargs.get("raw"):
+        return
+    trabajos = trabajos_parametro(instance.name)
+    if trabajos is not None:
+        # Trabajos dated within a period of the parameter are priced with its value instead.
+        # They may be every Trabajo of every Empresa: priced by the worker, not in the request
+        periodos = models.Vigencia.objects.filter(
+            parametro=instance.name, desde__lte=OuterRef("fecha"), hasta__gte=OuterRef("fecha")
+        )
+        schedule_update(trabajos.filter(~Exists(periodos)), diferido=True)
+
+
+# Periods of global parameters
+# ----------------------------
+@receiver(pre_save, sender=models.Vigencia)
+def vigencia_saving(sender, instance, raw=False, **kwargs):
+    # The period it had before, whose Trabajos are priced again too once saved
+    if instance.pk and not raw:
+        anterior = models.Vigencia.objects.filter(pk=instance.pk).values_list("parametro", "desde", "hasta")
+        instance.periodo_anterior = anterior.first()
+
+
+@receiver([post_save, post_delete], sender=models.Vigencia)
+def vigencia_changed(sender, instance, raw=False, **kwargs):
+    reset_parametros()
+    if raw:
+        return
+    periodos = [(instance.parametro, instance.desde, instance.hasta), getattr(instance, "periodo_anterior", None)]
+    for parametro, desde, hasta in filter(None, periodos):
+        # A period may span years of Trabajos: priced by the worker, like a preference change
+        schedule_update(trabajos_parametro(parametro).filter(fecha__range=(desde, hasta)), diferido=True)
+
+
+# Rate cards
+# ----------
+# Connected before the snapshot receivers, which may run at once (outside a
+# transaction) and must not price with an outdated card. Preference changes
+# need nothing here: cards are stamped with the prices they were priced with.
+@receiver([post_save, post_delete], sender=models.GastoEmpresa)
+@receiver([post_save, post_delete], sender=models.Vehiculo)
+@receiver([post_save, post_delete], sender=models.Instrumento)
+def tarifas_empresa_changed(sender, instance, **kwargs):
+    tarifas.invalidar(instance.empresa_id)
+
+
+@receiver(post_save, sender=models.Empresa)
+def tarifas_empresa_saved(sender, instance, created, **kwargs):
+    if not created:
+        tarifas.invalidar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=models.GastoPersonal)
+def tarifas_gasto_personal_changed(sender, instance, **kwargs):
+    empresa = models.Profesional.objects.filter(pk=instance.profesional_id).values_list("empresa", flat=True)
+    tarifas.invalidar(empresa.first())
+
+
+@receiver(post_save, sender=models.Profesional)
+def tarifas_profesional_saved(sender, instance, created, update_fields=None, **kwargs):
+    # A new Profesional is added to the card when it is first needed
+    if not created and (update_fields is None or "empresa" in update_fields):
+        tarifas.invalidar(instance.empresa_id)
+
+
+# Cost snapshots
+# --------------
+# A closed Trabajo keeps its snapshot: only the save that closes it (merged
+# with the row changes of the same transaction), reopens it, or finds it
+# without a snapshot prices it again
+@receiver(pre_save, sender=models.Trabajo)
+def trabajo_saving(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance.estaba_cerrado = models.Trabajo.objects.filter(pk=instance.pk, cerrado=True).exists()
+
+
+@receiver(post_save, sender=models.Trabajo)
+def trabajo_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cerrados = not getattr(instance, "estaba_cerrado", False)
+        schedule_update(models.Trabajo.objects.filter(pk=instance.pk), cerrados=cerrados)
+
+
+@receiver([post_save, post_delete], sender=models.Actuantes)
+@receiver([post_save, post_delete], sender=models.Movilidad)
+@receiver([post_save, post_delete], sender=models.Instrumental)
+def trabajo_row_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_update(models.Trabajo.objects.filter(pk=instance.trabajo_id))
+
+
+# Changes to an Empresa, its gastos, Profesionales, Vehículos or Instrumentos may
+# reach years of Trabajos: priced by the worker, like a preference change
+@receiver([post_save, post_delete], sender=models.GastoEmpresa)
+def gasto_empresa_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_update(models.Trabajo.objects.de_empresa(instance.empresa_id), diferido=True)
+
+
+@receiver([post_save, post_delete], sender=models.GastoPersonal)
+def gasto_personal_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_update(models.Trabajo.objects.filter(actuantes__profesional=instance.profesional_id), diferido=True)
+
+
+@receiver(post_save, sender=models.Empresa)
+def empresa_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        schedule_update(models.Trabajo.objects.de_empresa(instance.pk), diferido=True)
+
+
+@receiver(post_save, sender=models.Profesional)
+def profesional_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login: ignore them
+    if not raw and not created and (update_fields is None or "empresa" in update_fields):
+        schedule_update(models.Trabajo.objects.filter(actuantes__profesional=instance.pk), diferido=True)
+
+
+@receiver(post_save, sender=models.Vehiculo)
+def vehiculo_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        schedule_update(models.Trabajo.objects.filter(movilidad__vehiculo=instance.pk), diferido=True)
+
+
+@receiver(post_save, sender=models.Instrumento)
+def instrumento_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        schedule_update(models.Trabajo.objects.filter(instrumental__instrumento=instance.pk), diferido=True)
+
+
+# Monthly rollups
+# ---------------
+# Snapshot writes update them in update_snapshots(); deletions (with their Trabajo) here
+@receiver(post_delete, sender=models.CostoTrabajo)
+def costo_trabajo_deleted(sender, instance, **kwargs):
+    resumenes.schedule_update([(instance.empresa_id, instance.fecha)])
+
+
+# Search text
+# -----------
+@receiver(post_save, sender=models.Trabajo)
+def trabajo_busqueda(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.schedule_update(models.Trabajo.objects.filter(pk=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=models.Actuantes)
+def actuantes_busqueda(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.schedule_update(models.Trabajo.objects.filter(pk=instance.trabajo_id))
+
+
+@receiver(post_save, sender=models.Profesional)
+def profesional_busqueda(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    campos = {"matricula", "first_name", "last_name"}
+    if not raw and not created and (update_fields is None or campos & set(update_fields)):
+        search.schedule_update(models.Trabajo.objects.filter(actuantes__profesional=instance.pk))
+
+
+# Versions
+# --------
+# Trabajo and Empresa pages show (and price with) these rows, see costos.versiones
+@receiver([post_save, post_delete], sender=models.Actuantes)
+@receiver([post_save, post_delete], sender=models.Movilidad)
+@receiver([post_save, post_delete], sender=models.Instrumental)
+def version_trabajo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versiones.actualizar(models.Trabajo.objects.filter(pk=instance.trabajo_id))
+
+
+@receiver([post_save, post_delete], sender=models.GastoEmpresa)
+@receiver([post_save, post_delete], sender=models.Vehiculo)
+@receiver([post_save, post_delete], sender=models.Instrumento)
+def version_empresa(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versiones.actualizar(models.Empresa.objects.filter(pk=instance.empresa_id))
+
+
+@receiver([post_save, post_delete], sender=models.GastoPersonal)
+def version_gasto_personal(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versiones.actualizar(models.Empresa.objects.filter(profesionales=instance.profesional_id))
+
+
+@receiver([post_save, post_delete], sender=models.Profesional)
+def version_profesional(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logins only touch last_login: ignore them
+    if not raw and (update_fields is None or set(update_fields) != {"last_login"}):
+        versiones.actualizar(models.Empresa.objects.filter(pk=instance.empresa_id))
+
+
+@receiver([post_save, post_delete], sender=GlobalPreferenceModel)
+@receiver([post_save, post_delete], sender=models.TipoGasto)
+def version_global(sender, instance, raw=False, created=False, **kwargs):
+    # New rows change nothing yet (preferences are created with their default on first read)
+    if not raw and not created:
+        versiones.actualizar(models.Empresa.objects.all())
+
+
+@receiver([post_save, post_delete], sender=models.Vigencia)
+def version_vigencia(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versiones.actualizar(models.Empresa.objects.all())
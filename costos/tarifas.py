@@ -0,0 +1,145 @@
+"""
+Empresa rate cards.
+
+The rates a Trabajo is priced with (gastos por hora of the Empresa, costo
+por hora of each Profesional, costo por km of each Vehiculo and costo por
+jornada of each Instrumento) only change when their own rows do, so each
+Empresa keeps them precomputed in a Tarifario row. Costing a Trabajo then
+reads one row per Empresa instead of every Gasto, Vehiculo and Instrumento.
+
+Signals delete the Tarifario of an Empresa when something it depends on
+changes; it is rebuilt on next use. Rates that depend on global preferences
+(fuel prices, dollar rate) are stamped with the values they were priced
+with, and a card priced with other values is rebuilt.
+
+Cards are also stamped with the version of their Empresa
+(``Empresa.actualizado``, moved in the same transaction as any row they
+depend on, see costos.versiones). A request that builds a card while a
+change is still uncommitted reads the old rows and the old version, so its
+card is rebuilt on the first read after the commit instead of staying in use.
+"""
+import decimal
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F, Prefetch
+
+from . import models
+
+# Global preferences the rates depend on
+PARAMETROS = ("cotizacion_dolar", "nafta", "nafta_premium", "diesel", "diesel_premium", "gnc")
+
+
+def _dump(value):
+    # Exact amounts as strings; plain 0 (no rate) is kept as an int
+    return value if isinstance(value, int) else str(value)
+
+
+def _load(value):
+    return value if isinstance(value, int) else decimal.Decimal(value)
+
+
+def _parametros(parametros):
+    return {name: str(getattr(parametros, name)) for name in PARAMETROS}
+
+
+def _version(actualizado):
+    return actualizado.isoformat() if actualizado else None
+
+
+@dataclass(frozen=True)
+class Tarifas:
+    """Rates of one Empresa. Profesionales, Vehiculos and Instrumentos are keyed by pk."""
+
+    gastos_por_hora: decimal.Decimal
+    costo_por_hora: dict
+    costo_km: dict
+    costo_jornada: dict
+
+    @classmethod
+    def calcular(cls, empresa, parametros):
+        """Prices every rate of ``empresa`` (with its gastos, profesionales, vehiculos and instrumentos prefetched)."""
+        from .costs import compute_costos_km
+        from .preferences import parametros_globales
+
+        with parametros_globales(parametros):
+            vehiculos = list(empresa.vehiculos.all())
+            compute_costos_km(vehiculos, parametros)
+            return cls(
+                gastos_por_hora=empresa.gastos_por_hora,
+                costo_por_hora={p.pk: p.costo_por_hora for p in empresa.profesionales.all()},
+                costo_km={v.pk: v.costo_km for v in vehiculos},
+                costo_jornada={i.pk: i.costo_jornada for i in empresa.instrumentos.all()},
+            )
+
+    def as_dict(self, parametros, version):
+        return {
+            "parametros": _parametros(parametros),
+            "version": _version(version),
+            "gastos_por_hora": _dump(self.gastos_por_hora),
+            "costo_por_hora": {str(pk): _dump(v) for pk, v in self.costo_por_hora.items()},
+            "costo_km": {str(pk): _dump(v) for pk, v in self.costo_km.items()},
+            "costo_jornada": {str(pk): _dump(v) for pk, v in self.costo_jornada.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, tarifas):
+        return cls(
+            gastos_por_hora=_load(tarifas["gastos_por_hora"]),
+            costo_por_hora={int(pk): _load(v) for pk, v in tarifas["costo_por_hora"].items()},
+            costo_km={int(pk): _load(v) for pk, v in tarifas["costo_km"].items()},
+            costo_jornada={int(pk): _load(v) for pk, v in tarifas["costo_jornada"].items()},
+        )
+
+
+def cargar(empresa_ids, parametros, reconstruir=False, guardar=True, empresas=None):
+    """
+    Rate cards of the given Empresas, as a dict of ``Tarifas`` by Empresa id.
+    Missing cards, cards priced with other parameters and (if
+    ``reconstruir``) every card are computed, and saved unless ``guardar``
+    is False (for hypothetical parameters). ``empresas`` ({id: Empresa})
+    keeps the Empresas read to compute cards, with their rows, so pricing
+    them again with other parameters needs no further queries.
+    """
+    empresa_ids = set(empresa_ids)
+    valores = _parametros(parametros)
+    empresas = {} if empresas is None else empresas
+    tarifas = {}
+    if reconstruir:
+        for pk in empresa_ids:
+            empresas.pop(pk, None)
+    else:
+        tarifarios = models.Tarifario.objects.filter(empresa__in=empresa_ids).annotate(
+            version=F("empresa__actualizado")
+        )
+        for tarifario in tarifarios:
+            vigente = tarifario.tarifas.get("version") == _version(tarifario.version)
+            if vigente and tarifario.tarifas["parametros"] == valores:
+                tarifas[tarifario.empresa_id] = Tarifas.from_dict(tarifario.tarifas)
+    faltantes = empresa_ids - set(tarifas)
+    if faltantes - set(empresas):
+        empresas.update(
+            (empresa.pk, empresa)
+            for empresa in models.Empresa.objects.filter(pk__in=faltantes - set(empresas)).prefetch_related(
+                "gastos",
+                Prefetch("profesionales", models.Profesional.objects.prefetch_related("gastos")),
+                "vehiculos",
+                "instrumentos",
+            )
+        )
+    nuevos = []
+    for pk in faltantes & set(empresas):
+        tarifas[pk] = Tarifas.calcular(empresas[pk], parametros)
+        tarifario = tarifas[pk].as_dict(parametros, empresas[pk].actualizado)
+        nuevos.append(models.Tarifario(empresa=empresas[pk], tarifas=tarifario))
+    if nuevos and guardar:
+        with transaction.atomic():
+            models.Tarifario.objects.filter(empresa__in=[t.empresa_id for t in nuevos]).delete()
+            models.Tarifario.objects.bulk_create(nuevos, ignore_conflicts=True)
+    return tarifas
+
+
+def invalidar(empresa_id):
+    """Discards the rate card of an Empresa; it is rebuilt on next use."""
+    if empresa_id is not None:
+        models.Tarifario.objects.filter(empresa=empresa_id).delete()
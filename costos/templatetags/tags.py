@@ -1,4 +1,9 @@
 from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from ..metrics import fragment_metrics
 
 register = template.Library()
 
@@ -9,4 +14,38 @@ def url_replace(request, field, value):
     dict_[field] = value
     if field == "paginate_by" and "page" in dict_:
         del dict_["page"]
+    if value == "":
+        del dict_[field]
     return dict_.urlencode()
+
+
+class FragmentoNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = make_template_fragment_key(self.name, [var.resolve(context) for var in self.vary_on])
+        content = cache.get(key)
+        fragment_metrics.record(self.name, hit=content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 24 * 3600))
+        return content
+
+
+@register.tag
+def fragmento(parser, token):
+    """
+    Like ``{% cache %}``, but without a timeout argument (keys are versions,
+    so entries never go stale) and counting hits and misses::
+
+        {% fragmento name version [more versions...] %} ... {% endfragmento %}
+    """
+    nodelist = parser.parse(("endfragmento",))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a name and at least one version.")
+    return FragmentoNode(nodelist, bits[1], [parser.compile_filter(bit) for bit in bits[2:]])
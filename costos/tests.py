@@ -1,3 +1,1469 @@
-from django.test import TestCase
+import csv
+import dataclasses
+import datetime
+import decimal
+import io
+import random
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.forms import PasswordResetForm
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from dynamic_preferences.registries import global_preferences_registry
+
+from . import benchmark, escenarios, importacion, money, outbox, resumenes, search, tarifas, versiones, vigencias
+from .costs import (
+    Tarificador,
+    attach_costs,
+    compute_costos_km,
+    compute_costs,
+    compute_costs_bulk,
+    costos_prefetch,
+    update_snapshots,
+)
+from .metrics import fragment_metrics, request_metrics
+from .models import (
+    Actuantes,
+    Correo,
+    CostoTrabajo,
+    Empresa,
+    GastoEmpresa,
+    GastoPersonal,
+    Instrumento,
+    Periodo,
+    Profesional,
+    ResumenMensual,
+    Tarifario,
+    TipoGasto,
+    Trabajo,
+    Vehiculo,
+    Vigencia,
+)
+from .pagination import KeysetPaginator
+from .pendientes import Pendientes
+from .preferences import (
+    ParametrosGlobales,
+    get_cotizacion_dolar,
+    get_parametros,
+    get_valor_litro,
+    parametros_globales,
+)
+from .views import TRABAJO_CSV_HEADER, trabajo_csv_row
+
+# Property-based parity tests: the money kernel must give exactly the same
+# amounts (value and number of decimals) as the Decimal formulas it replaced,
+# which are kept below as the reference. Inputs are drawn from a seeded
+# generator, so failures are reproducible.
+
+CASOS = 2000
+DECIMAL_PLACES = 2
+
+
+def monto(rng, max_digits=10):
+    """Random DecimalField value, biased towards zero and small amounts."""
+    if rng.random() < 0.05:
+        return decimal.Decimal("0.00")
+    digitos = rng.randint(1, max_digits)
+    return decimal.Decimal(rng.randrange(10 ** digitos)).scaleb(-DECIMAL_PLACES)
+
+
+def cotizacion(rng):
+    return decimal.Decimal(rng.randrange(1, 10 ** 7)).scaleb(-rng.randint(0, 4))
+
+
+def parametros(rng):
+    return ParametrosGlobales(
+        cotizacion_dolar=cotizacion(rng),
+        modulo_tributario=decimal.Decimal("0.75"),
+        aporte_copa=decimal.Decimal(0),
+        aporte_caja=decimal.Decimal(0),
+        nafta=monto(rng, 6),
+        nafta_premium=monto(rng, 6),
+        diesel=monto(rng, 6),
+        diesel_premium=monto(rng, 6),
+        gnc=monto(rng, 6),
+    )
+
+
+# Reference (Decimal) formulas
+# ----------------------------
+def gasto_legacy(monto, periodo, dias):
+    return round(monto / periodo * dias, 2)
+
+
+def por_hora_legacy(semanales, horas):
+    return round(decimal.Decimal(sum(semanales)) / horas, 2)
+
+
+def valor_ars_legacy(valor_usd, dolar):
+    return round(valor_usd * dolar, 2)
+
+
+def costo_jornada_legacy(valor_ars, vida_util):
+    return round(valor_ars / vida_util, 2)
+
+
+def costo_km_legacy(v, valor_litro):
+    combustible = round(valor_litro / v.rendimiento, 2)
+    valor_residual = round(v.valor / 2, 2) if v.valor else 0
+    amortizacion_valor = round((v.valor - valor_residual) / (5 * v.kilometraje_anual), 2) if v.valor else 0
+    km_mensual = round(v.kilometraje_anual / decimal.Decimal(12), 2) if v.kilometraje_anual else 1
+    seguro = round(v.costo_seguro / km_mensual, 2) if v.costo_seguro else 0
+    patente = round(v.costo_patente / 2 / km_mensual, 2) if v.costo_patente else 0
+    cochera = round(v.costo_cochera / km_mensual, 2) if v.costo_cochera else 0
+    lavado = round(v.costo_lavado / km_mensual, 2) if v.costo_lavado else 0
+    neumaticos = round(v.costo_neumatico * 4 / 40000, 2) if v.costo_neumatico else 0
+    reparaciones = round(v.costo_anual_reparaciones / v.kilometraje_anual, 2) if v.costo_anual_reparaciones else 0
+    repuestos = round(v.valor * decimal.Decimal(0.02), 2) if v.valor else 0
+    repuestos_por_km = round(repuestos / v.kilometraje_anual, 2) if v.valor else 0
+    service = round(v.costo_service / 10000, 2) if v.costo_service else 0
+    lubricacion = round(v.costo_lubricante * 2 / v.kilometraje_anual, 2) if v.costo_lubricante else 0
+    rto = round(v.costo_rto / (2 * v.kilometraje_anual), 2) if v.costo_rto else 0
+    return round(
+        amortizacion_valor
+        + seguro
+        + patente
+        + cochera
+        + combustible
+        + lubricacion
+        + lavado
+        + reparaciones
+        + repuestos_por_km
+        + neumaticos
+        + service
+        + rto,
+        2,
+    )
+
+
+def costos_trabajo_legacy(trabajo, p):
+    """The property cascade Trabajo had before costos.costs, reading its rows again for each figure."""
+
+    def costo_por_hora(profesional):
+        if not profesional.empresa:
+            return 0
+        semanales = [gasto_legacy(g.monto, g.periodo, Periodo.SEMANA.value) for g in profesional.gastos.all()]
+        return por_hora_legacy(semanales, profesional.empresa.horas_semanales)
+
+    def gastos_por_hora(empresa):
+        semanales = [gasto_legacy(g.monto, g.periodo, Periodo.SEMANA.value) for g in empresa.gastos.all()]
+        return por_hora_legacy(semanales, empresa.horas_semanales)
+
+    def costo_km(vehiculo):
+        return costo_km_legacy(vehiculo, p.valor_litro(vehiculo.get_tipo_combustible_display()))
+
+    def costo_jornada(instrumento):
+        return costo_jornada_legacy(valor_ars_legacy(instrumento.valor_USD, p.cotizacion_dolar), instrumento.vida_util)
+
+    MT = p.modulo_tributario
+    primero = trabajo.profesionales.order_by("matricula").first()
+    empresa = primero.empresa if primero else None
+    horas_total = sum([a.horas for a in trabajo.actuantes.all()])
+    if trabajo.partidas and trabajo.lotes_finales:
+        sellado = 6 * 2 * MT + 300 * MT + 300 * MT * trabajo.partidas + 300 * MT * trabajo.lotes_finales + 500 * MT
+    else:
+        sellado = 0
+    informe = 400 * MT * trabajo.partidas
+    aportes = trabajo.aporte_copa + trabajo.aporte_caja
+    t = trabajo
+    gastos_especificos = (
+        t.escrituras
+        + t.visados
+        + t.ccu
+        + t.estudio_titulos
+        + t.georreferenciacion
+        + t.citaciones
+        + t.viaticos
+        + t.ayudante
+        + t.dibujante
+        + t.impresiones
+        + t.mojones
+        + t.gestor
+        + t.seguros_especiales
+        + t.alquiler_instrumentos
+        + t.otros_gastos
+        + sellado
+        + informe
+    )
+    gastos_de_empresa = horas_total * gastos_por_hora(empresa) if empresa else 0
+    costo_actuantes = round(
+        decimal.Decimal(sum([a.horas * costo_por_hora(a.profesional) for a in trabajo.actuantes.all()])), 2
+    )
+    costo_movilidad = round(decimal.Decimal(sum([m.km * costo_km(m.vehiculo) for m in trabajo.movilidad.all()])), 2)
+    costo_instrumental = round(
+        decimal.Decimal(sum([i.jornadas * costo_jornada(i.instrumento) for i in trabajo.instrumental.all()])), 2
+    )
+    return {
+        "empresa": empresa,
+        "cantidad_de_profesionales": trabajo.profesionales.count(),
+        "cantidad_de_vehiculos": trabajo.movilidad.count(),
+        "cantidad_de_instrumentos": trabajo.instrumental.count(),
+        "horas_total": horas_total,
+        "cantidad_de_km": sum([m.km for m in trabajo.movilidad.all()]),
+        "cantidad_de_jornadas": sum([i.jornadas for i in trabajo.instrumental.all()]),
+        "aportes": aportes,
+        "sellado_fiscal": sellado,
+        "informe_catastral": informe,
+        "gastos_especificos": gastos_especificos,
+        "gastos_de_empresa": gastos_de_empresa,
+        "costo_actuantes": costo_actuantes,
+        "costo_movilidad": costo_movilidad,
+        "costo_instrumental": costo_instrumental,
+        "costo_total": (
+            aportes + gastos_especificos + gastos_de_empresa + costo_actuantes + costo_movilidad + costo_instrumental
+        ),
+    }
+
+
+class MoneyKernelTests(SimpleTestCase):
+    def assertSameAmount(self, actual, expected, msg=None):
+        # Same value and same representation ("1.50" is not "1.5")
+        self.assertEqual((actual, str(actual)), (expected, str(expected)), msg)
+
+    def test_redondear(self):
+        rng = random.Random(1)
+        for _ in range(CASOS):
+            num, den = rng.randrange(-(10 ** 12), 10 ** 12), rng.randrange(1, 10 ** 6)
+            expected = round(decimal.Decimal(num) / decimal.Decimal(den), 2)
+            self.assertSameAmount(money.a_decimal(money.redondear(num, den)), expected, (num, den))
+
+    def test_como_decimal(self):
+        rng = random.Random(6)
+        for _ in range(CASOS):
+            num = rng.randrange(-(10 ** rng.randint(1, 40)), 10 ** rng.randint(1, 40))
+            den = rng.randrange(1, 10 ** rng.randint(1, 20))
+            n, d = money.como_decimal(num, den)
+            self.assertEqual(decimal.Decimal(n) / d, decimal.Decimal(num) / decimal.Decimal(den), (num, den))
+
+    def test_half_to_even(self):
+        self.assertEqual(money.redondear(1, 200), 0)  # 0.005
+        self.assertEqual(money.redondear(3, 200), 2)  # 0.015
+        self.assertEqual(money.redondear(-3, 200), -2)
+        self.assertEqual(money.centavos(decimal.Decimal("12.345")), 1234)
+        self.assertEqual(money.centavos(decimal.Decimal("12.355")), 1236)
+
+    def test_gasto(self):
+        # 0.02 / 120 * 30 is exactly 0.005, but Decimal rounds the division first
+        gasto = GastoEmpresa(monto=decimal.Decimal("0.02"), periodo=120)
+        self.assertSameAmount(gasto.mensual, decimal.Decimal("0.01"))
+        rng = random.Random(2)
+        for _ in range(CASOS):
+            gasto = GastoEmpresa(monto=monto(rng), periodo=rng.choice(GastoEmpresa.PERIODO)[0])
+            for propiedad, periodo in (("semanal", Periodo.SEMANA), ("mensual", Periodo.MES), ("anual", Periodo.AÑO)):
+                expected = gasto_legacy(gasto.monto, gasto.periodo, periodo.value)
+                self.assertSameAmount(getattr(gasto, propiedad), expected, (gasto.monto, gasto.periodo))
+
+    def test_instrumento(self):
+        rng = random.Random(3)
+        for _ in range(CASOS):
+            instrumento = Instrumento(pk=1, valor_USD=monto(rng), vida_util=rng.randint(1, 5000))
+            with parametros_globales(parametros(rng)) as p:
+                valor_ars = valor_ars_legacy(instrumento.valor_USD, p.cotizacion_dolar)
+                self.assertSameAmount(instrumento.valor_ARS, valor_ars)
+                costo_jornada = costo_jornada_legacy(valor_ars, instrumento.vida_util)
+                self.assertSameAmount(instrumento.costo_jornada, costo_jornada)
+
+    def test_vehiculo(self):
+        rng = random.Random(4)
+        for _ in range(CASOS // 10):
+            p = parametros(rng)
+            vehiculos = [
+                Vehiculo(
+                    valor=monto(rng),
+                    kilometraje_anual=rng.randint(1, 200000),
+                    tipo_combustible=rng.choice(Vehiculo.TIPO_COMBUSTIBLE)[0],
+                    rendimiento=rng.randint(1, 30),
+                    costo_patente=monto(rng, 7),
+                    costo_seguro=monto(rng, 7),
+                    costo_cochera=monto(rng, 7),
+                    costo_lubricante=monto(rng, 7),
+                    costo_lavado=monto(rng, 7),
+                    costo_neumatico=monto(rng, 7),
+                    costo_service=monto(rng, 7),
+                    costo_anual_reparaciones=monto(rng, 8),
+                    costo_rto=monto(rng, 7),
+                )
+                for _ in range(10)
+            ]
+            for v, costos in zip(vehiculos, compute_costos_km(vehiculos, p)):
+                expected = costo_km_legacy(v, p.valor_litro(v.get_tipo_combustible_display()))
+                self.assertSameAmount(costos.costo_km, expected, v.__dict__)
+
+    def test_flota(self):
+        # Fuel prices with the four decimals of a Vigencia, prime consumptions and odd mileages,
+        # so quotients run past the Decimal precision
+        rng = random.Random(7)
+        primos = [3, 7, 11, 13, 17, 19, 23, 29, 31, 37]
+        for _ in range(CASOS // 20):
+            p = dataclasses.replace(
+                parametros(rng),
+                **{c: decimal.Decimal(rng.randrange(1, 10 ** 7)).scaleb(-4) for c in ("nafta", "diesel", "gnc")},
+            )
+            filas = [
+                dict(
+                    valor=monto(rng),
+                    kilometraje_anual=rng.choice([7, 13, 99991, rng.randint(1, 200000)]),
+                    tipo_combustible=rng.choice(Vehiculo.TIPO_COMBUSTIBLE)[0],
+                    rendimiento=rng.choice(primos),
+                    costo_patente=monto(rng, 7),
+                    costo_seguro=monto(rng, 7),
+                    costo_cochera=monto(rng, 7),
+                    costo_lubricante=monto(rng, 7),
+                    costo_lavado=monto(rng, 7),
+                    costo_neumatico=monto(rng, 7),
+                    costo_service=monto(rng, 7),
+                    costo_anual_reparaciones=monto(rng, 8),
+                    costo_rto=monto(rng, 7),
+                )
+                for _ in range(20)
+            ]
+            flota = compute_costos_km([Vehiculo(**fila) for fila in filas], p)
+            with parametros_globales(p):
+                for fila, costos in zip(filas, flota):
+                    v = Vehiculo(**fila)
+                    self.assertEqual(costos, v.costos_km, fila)
+                    expected = costo_km_legacy(v, p.valor_litro(v.get_tipo_combustible_display()))
+                    self.assertSameAmount(v.costo_km, expected, fila)
+
+
+class TarifasParityTests(TestCase):
+    def test_gastos_por_hora(self):
+        rng = random.Random(5)
+        tipo = TipoGasto.objects.create(detalle="Prueba")
+        for i in range(50):
+            empresa = Empresa.objects.create(nombre=f"Empresa {i}", horas_semanales=rng.randint(1, 168))
+            profesional = Profesional.objects.create(username=f"profesional{i}", empresa=empresa)
+            for model, owner in ((GastoEmpresa, {"empresa": empresa}), (GastoPersonal, {"profesional": profesional})):
+                model.objects.bulk_create(
+                    model(tipo=tipo, monto=monto(rng), periodo=rng.choice(model.PERIODO)[0], **owner)
+                    for _ in range(rng.randint(0, 8))
+                )
+            semanales = [gasto.semanal for gasto in empresa.gastos.all()]
+            self.assertEqual(str(empresa.gastos_por_hora), str(por_hora_legacy(semanales, empresa.horas_semanales)))
+            self.assertEqual(str(empresa.gastos_semanales), str(round(decimal.Decimal(sum(semanales)), 2)))
+            semanales = [gasto.semanal for gasto in profesional.gastos.all()]
+            self.assertEqual(
+                str(profesional.costo_por_hora), str(por_hora_legacy(semanales, empresa.horas_semanales))
+            )
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class CostEngineTests(TestCase):
+    def setUp(self):
+        benchmark.generate(empresas=2, profesionales=3, vehiculos=3, instrumentos=3, trabajos=15, seed=19)
+        self.empresa = Empresa.objects.order_by("pk").first()
+
+    def trabajo(self, filas):
+        trabajo = Trabajo.objects.create(comitente=f"{filas} filas")
+        for profesional in self.empresa.profesionales.all()[:filas]:
+            trabajo.actuantes.create(profesional=profesional, horas=10)
+        for vehiculo in self.empresa.vehiculos.all()[:filas]:
+            trabajo.movilidad.create(vehiculo=vehiculo, km=100)
+        for instrumento in self.empresa.instrumentos.all()[:filas]:
+            trabajo.instrumental.create(instrumento=instrumento, jornadas=1)
+        return trabajo
+
+    def detalle(self, trabajo):
+        # Without the cached fragments, so the costs are computed
+        cache.clear()
+        self.assertEqual(self.client.get(f"/trabajo/detail/{trabajo.pk}/").status_code, 200)
+
+    def test_parity(self):
+        p = get_parametros()
+        for trabajo in Trabajo.objects.order_by("pk"):
+            costos = compute_costs(trabajo, p)
+            for campo, expected in costos_trabajo_legacy(Trabajo.objects.get(pk=trabajo.pk), p).items():
+                actual = getattr(costos, campo)
+                self.assertEqual((actual, str(actual)), (expected, str(expected)), (trabajo.pk, campo))
+
+    def test_fields_without_queries(self):
+        trabajo = Trabajo.objects.order_by("pk").first()
+        campos = [*costos_trabajo_legacy(trabajo, get_parametros()), "proporcion_actuantes", "proporcion_movilidad"]
+        # Once computed, no field of the breakdown reads the database again
+        trabajo.costos
+        with self.assertNumQueries(0):
+            for campo in campos:
+                getattr(trabajo, campo)
+
+    def test_detail_queries(self):
+        self.client.force_login(self.empresa.profesionales.first())
+        uno, tres = self.trabajo(1), self.trabajo(3)
+        # The first one builds the rate card of the Empresa
+        self.detalle(uno)
+        with CaptureQueriesContext(connection) as queries:
+            self.detalle(uno)
+        with self.assertNumQueries(len(queries)):
+            self.detalle(tres)
+
+
+class WithCostsTests(TestCase):
+    def setUp(self):
+        benchmark.generate(empresas=2, profesionales=3, vehiculos=3, instrumentos=3, trabajos=25, seed=23)
+        self.trabajos = Trabajo.objects.with_costs().order_by("pk")
+
+    def queries(self, n):
+        with CaptureQueriesContext(connection) as queries:
+            for trabajo in self.trabajos[:n]:
+                trabajo.costo_total
+        return len(queries)
+
+    def assertSameCosts(self, trabajos):
+        for trabajo in trabajos:
+            esperado = compute_costs(Trabajo.objects.get(pk=trabajo.pk))
+            self.assertEqual(trabajo.costos.empresa, esperado.empresa, trabajo.pk)
+            self.assertEqual(trabajo.costos.as_dict(), esperado.as_dict(), trabajo.pk)
+
+    def test_constant_queries(self):
+        # Computed; the first time also builds the rate cards of both Empresas
+        self.queries(50)
+        self.assertEqual(self.queries(1), self.queries(50))
+        # Read from their snapshots
+        update_snapshots(self.trabajos.values_list("pk", flat=True))
+        self.assertEqual(self.queries(1), self.queries(50))
+
+    def test_parity(self):
+        self.assertSameCosts(self.trabajos)
+        ids = list(self.trabajos.values_list("pk", flat=True))
+        update_snapshots(ids[:30])
+        # Stale snapshots are not read: theirs say nothing costs
+        stale = list(CostoTrabajo.objects.filter(pk__in=ids[20:30]))
+        for costo in stale:
+            costo.detalle["costo_total"] = "0"
+            costo.desactualizado = timezone.now()
+        CostoTrabajo.objects.bulk_update(stale, ["detalle", "desactualizado"])
+        self.assertSameCosts(self.trabajos)
+
+
+class TarifarioTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.vehiculo = Vehiculo.objects.create(nombre="Hilux", empresa=self.empresa, valor=1000000, rendimiento=10)
+        self.parametros = get_parametros()
+
+    def costo_km(self):
+        return tarifas.cargar([self.empresa.pk], self.parametros)[self.empresa.pk].costo_km[self.vehiculo.pk]
+
+    def test_invalidar(self):
+        antes = self.costo_km()
+        self.assertTrue(Tarifario.objects.filter(empresa=self.empresa).exists())
+        self.vehiculo.valor *= 2
+        self.vehiculo.save()
+        self.assertFalse(Tarifario.objects.filter(empresa=self.empresa).exists())
+        self.assertGreater(self.costo_km(), antes)
+
+    def test_reconstruir_desactualizada(self):
+        # A card built from rows that changed later (e.g. read before the
+        # change committed) is stamped with the old version of its Empresa
+        antes = self.costo_km()
+        Vehiculo.objects.filter(pk=self.vehiculo.pk).update(valor=self.vehiculo.valor * 2)
+        self.assertEqual(self.costo_km(), antes)
+        versiones.actualizar(Empresa.objects.filter(pk=self.empresa.pk))
+        self.assertGreater(self.costo_km(), antes)
+        tarifario = Tarifario.objects.get(empresa=self.empresa)
+        self.assertEqual(tarifario.tarifas["version"], Empresa.objects.get(pk=self.empresa.pk).actualizado.isoformat())
+
+
+class SnapshotTests(TransactionTestCase):
+    # Snapshots are updated on commit, which runs right away in autocommit
+    def setUp(self):
+        benchmark.generate(empresas=2, profesionales=2, vehiculos=2, instrumentos=2, trabajos=10, seed=11)
+        update_snapshots(Trabajo.objects.values_list("pk", flat=True))
+
+    def tearDown(self):
+        cache.clear()
+
+    def snapshots(self, trabajos=None):
+        trabajos = Trabajo.objects.all() if trabajos is None else trabajos
+        return dict(CostoTrabajo.objects.filter(trabajo__in=trabajos).values_list("trabajo", "costo_total"))
+
+    def assertPriced(self, trabajos):
+        actuales = {t.pk: round(t.costos.costo_total, 2) for t in compute_costs_bulk(trabajos)}
+        self.assertEqual(self.snapshots(trabajos), actuales)
+
+    def test_gasto_empresa(self):
+        empresa = Empresa.objects.order_by("pk").first()
+        otras = Trabajo.objects.exclude(pk__in=Trabajo.objects.de_empresa(empresa))
+        antes = self.snapshots(otras)
+        GastoEmpresa.objects.create(
+            empresa=empresa, tipo=TipoGasto.objects.create(detalle="Alquiler"), monto=5000000, periodo=Periodo.MES.value
+        )
+        # Marked stale, priced by the worker
+        stale = CostoTrabajo.objects.filter(desactualizado__isnull=False)
+        propios = self.snapshots(Trabajo.objects.de_empresa(empresa))
+        self.assertEqual(set(stale.values_list("trabajo", flat=True)), set(propios))
+        call_command("rebuild_costos", "--stale", stdout=io.StringIO())
+        self.assertFalse(stale.exists())
+        self.assertPriced(Trabajo.objects.de_empresa(empresa))
+        self.assertEqual(self.snapshots(otras), antes)
+
+    def test_vehiculo(self):
+        vehiculo = Vehiculo.objects.filter(trabajos__isnull=False).order_by("pk").first()
+        trabajos = Trabajo.objects.filter(movilidad__vehiculo=vehiculo).distinct()
+        antes = self.snapshots(trabajos)
+        vehiculo.valor *= 3
+        vehiculo.save()
+        self.assertEqual(self.snapshots(trabajos), antes)
+        call_command("rebuild_costos", "--stale", stdout=io.StringIO())
+        self.assertPriced(trabajos)
+        self.assertNotEqual(self.snapshots(trabajos), antes)
+
+    def test_preference(self):
+        trabajos = Trabajo.objects.filter(movilidad__vehiculo__tipo_combustible__in=["n", "d", "g"]).distinct()
+        antes = self.snapshots(trabajos)
+        preferencias = global_preferences_registry.manager()
+        for combustible in ("nafta", "diesel", "gnc"):
+            preferencias[f"combustible__{combustible}"] = decimal.Decimal("999.99")
+        # Marked stale, not priced in the request; costs are computed on read meanwhile
+        self.assertEqual(self.snapshots(trabajos), antes)
+        stale = CostoTrabajo.objects.filter(desactualizado__isnull=False)
+        self.assertEqual(set(stale.values_list("trabajo", flat=True)), {t.pk for t in trabajos})
+        leidos = {t.pk: round(t.costos.costo_total, 2) for t in attach_costs(list(trabajos.select_related("costo")))}
+        self.assertNotEqual(leidos, antes)
+
+        call_command("rebuild_costos", "--stale", stdout=io.StringIO())
+        self.assertFalse(stale.exists())
+        self.assertPriced(trabajos)
+        self.assertEqual(self.snapshots(trabajos), leidos)
+
+    def test_vigencia(self):
+        trabajos = Trabajo.objects.filter(instrumental__isnull=False).distinct()
+        fechas = trabajos.aggregate(desde=Min("fecha"), hasta=Max("fecha"))
+        antes = self.snapshots(trabajos)
+        stale = CostoTrabajo.objects.filter(desactualizado__isnull=False)
+        vigencia = Vigencia.objects.create(parametro="cotizacion_dolar", valor=999, **fechas)
+        self.assertEqual(self.snapshots(trabajos), antes)
+        self.assertEqual(set(stale.values_list("trabajo", flat=True)), {t.pk for t in trabajos})
+        call_command("rebuild_costos", "--stale", stdout=io.StringIO())
+        self.assertFalse(stale.exists())
+        self.assertPriced(trabajos)
+        self.assertNotEqual(self.snapshots(trabajos), antes)
+
+        # Moving the period marks the Trabajos it no longer covers too
+        vigencia.desde = vigencia.hasta = fechas["desde"]
+        vigencia.save()
+        self.assertEqual(set(stale.values_list("trabajo", flat=True)), {t.pk for t in trabajos})
+        call_command("rebuild_costos", "--stale", stdout=io.StringIO())
+        self.assertPriced(trabajos)
+
+    def test_cerrado(self):
+        trabajo = Trabajo.objects.filter(movilidad__isnull=False).order_by("pk").first()
+        trabajo.cerrado = True
+        trabajo.save()
+        cerrado = self.snapshots([trabajo])
+
+        # Neither the rates it was priced with nor saving it again change it
+        vehiculo = trabajo.movilidad.first().vehiculo
+        vehiculo.valor *= 3
+        vehiculo.save()
+        trabajo.comitente = "Otro"
+        trabajo.save()
+        movilidad = trabajo.movilidad.first()
+        movilidad.km += 1
+        movilidad.save()
+        self.assertEqual(self.snapshots([trabajo]), cerrado)
+
+        # Unless it has no snapshot
+        CostoTrabajo.objects.filter(trabajo=trabajo).delete()
+        trabajo.save()
+        self.assertPriced([trabajo])
+
+        # Reopening it prices it again
+        vehiculo.valor *= 2
+        vehiculo.save()
+        congelado = self.snapshots([trabajo])
+        trabajo.cerrado = False
+        trabajo.save()
+        self.assertPriced([trabajo])
+        self.assertNotEqual(self.snapshots([trabajo]), congelado)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ParametrosGlobalesTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.client.force_login(Profesional.objects.create(username="perez", empresa=self.empresa))
+        # Preferences are created with their default on first read (not on one served from the cache)
+        cache.clear()
+        get_parametros()
+
+    def test_one_read_per_request(self):
+        for i in range(20):
+            Instrumento.objects.create(empresa=self.empresa, nombre=f"GPS {i}", valor_USD=1000 + i)
+        # Values cached by dynamic_preferences would hide the reads
+        cache.clear()
+        with mock.patch.object(ParametrosGlobales, "load", side_effect=ParametrosGlobales.load) as load:
+            with self.assertNumQueries(1), parametros_globales():
+                for _ in range(100):
+                    get_valor_litro("Nafta")
+                    get_cotizacion_dolar()
+            self.assertEqual(load.call_count, 1)
+            cache.clear()
+            # Each row reads the dollar quotation twice (valor ARS and costo por jornada)
+            with self.assertNumQueries(5):  # session, user, empresa, preferences, instrumentos
+                response = self.client.get("/instrumentos/")
+            self.assertEqual(load.call_count, 2)
+        self.assertContains(response, "GPS 19")
+
+    def test_save_resets_snapshot(self):
+        preferencias = global_preferences_registry.manager()
+        with parametros_globales():
+            antes = get_parametros().cotizacion_dolar
+            preferencias["cotizacion_dolar"] = antes + 1
+            self.assertEqual(get_parametros().cotizacion_dolar, antes + 1)
+            self.assertEqual(get_cotizacion_dolar(), antes + 1)
+
+
+class PendientesTests(TransactionTestCase):
+    def setUp(self):
+        self.flushed = []
+        self.pendientes = Pendientes(self.flushed.append)
+
+    def test_commit(self):
+        with transaction.atomic():
+            self.pendientes.add([1])
+            self.pendientes.add([2, 3])
+            self.assertEqual(self.flushed, [])
+        self.assertEqual(self.flushed, [[1, 2, 3]])
+        # Right away in autocommit
+        self.pendientes.add([4])
+        self.assertEqual(self.flushed, [[1, 2, 3], [4]])
+
+    def test_rollback(self):
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            self.pendientes.add([1])
+            1 / 0
+        with transaction.atomic():
+            with self.assertRaises(ZeroDivisionError), transaction.atomic():
+                self.pendientes.add([2])
+                1 / 0
+            self.pendientes.add([3])
+        self.assertEqual(self.flushed, [[3]])
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class AdminChangelistTests(TestCase):
+    changelists = {
+        Trabajo: ["cantidad_de_profesionales", "cantidad_de_vehiculos", "cantidad_de_instrumentos", "costo_total"],
+        Empresa: ["cantidad_de_profesionales", "cantidad_de_vehiculos", "cantidad_de_instrumentos", "gastos_por_hora"],
+        Profesional: ["costo_por_hora"],
+        Vehiculo: ["costo_km"],
+        Instrumento: ["valor_ARS", "costo_jornada"],
+    }
+
+    def setUp(self):
+        benchmark.generate(empresas=3, profesionales=3, vehiculos=3, instrumentos=3, trabajos=8, seed=29)
+        # Empresas of different sizes, to sort them by their counts
+        for i, empresa in enumerate(Empresa.objects.order_by("pk")):
+            for j in range(i):
+                Vehiculo.objects.create(empresa=empresa, nombre=f"Auto {j}", valor=1000 * (j + 1), rendimiento=10)
+                Instrumento.objects.create(empresa=empresa, nombre=f"GPS {j}", valor_USD=100 * (j + 1))
+        admin = Profesional.objects.create_superuser("admin", password=None, empresa=Empresa.objects.first())
+        self.client.force_login(admin)
+
+    def changelist(self, model, **params):
+        response = self.client.get(f"/admin/costos/{model._meta.model_name}/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def queries(self, model, pks):
+        with CaptureQueriesContext(connection) as queries:
+            cl = self.changelist(model, id__in=",".join(map(str, pks)))
+        self.assertEqual(len(cl.result_list), len(pks))
+        return len(queries)
+
+    def test_constant_queries(self):
+        for model in self.changelists:
+            with self.subTest(model=model.__name__):
+                pks = list(model.objects.values_list("pk", flat=True))
+                # Builds the rate cards the first time
+                self.queries(model, pks)
+                with self.assertNumQueries(self.queries(model, pks[:1])):
+                    self.queries(model, pks)
+
+    def test_sort_computed_columns(self):
+        # Trabajos are sorted by their snapshot
+        update_snapshots(Trabajo.objects.values_list("pk", flat=True))
+        for model, columnas in self.changelists.items():
+            for columna in columnas:
+                with self.subTest(model=model.__name__, columna=columna):
+                    cl = self.changelist(model)
+                    o = cl.list_display.index(columna)
+                    for signo, invertir in (("", False), ("-", True)):
+                        cl = self.changelist(model, o=f"{signo}{o}")
+                        valores = [getattr(cl.model_admin, columna)(obj) for obj in cl.result_list]
+                        self.assertEqual(len(valores), model.objects.count())
+                        self.assertEqual(valores, sorted(valores, reverse=invertir))
+                        self.assertGreater(len(set(valores)), 1)
+
+
+class ImportacionTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        Profesional.objects.create(username="perez", matricula="1-0001", empresa=self.empresa)
+        Profesional.objects.create(username="gomez", empresa=self.empresa)
+        Profesional.objects.create(username="ajeno", empresa=Empresa.objects.create(nombre="Otra"))
+        self.vehiculos = [
+            Vehiculo.objects.create(nombre=nombre, empresa=self.empresa, valor=1000000, rendimiento=10)
+            for nombre in ("Hilux", "Hilux", "Gol")
+        ]
+        Instrumento.objects.create(nombre="GPS", empresa=self.empresa, valor_USD=5000, vida_util=1000)
+
+    def leer(self, texto):
+        return importacion.leer(io.StringIO(texto))
+
+    def test_importar(self):
+        filas = self.leer(
+            "fecha,expediente,comitente,viaticos,actuantes,movilidad,instrumental\n"
+            f'2020-03-01,123,Pérez,100.50,"1-0001:8; GOMEZ","gol:40;#{self.vehiculos[0].pk}:10",gps:0.5\n'
+            ",,,,perez,,\n"
+        )
+        simulacion = importacion.importar(self.empresa, filas, simular=True)
+        self.assertEqual((simulacion.trabajos, simulacion.actuantes, simulacion.errores), (2, 3, []))
+        self.assertFalse(Trabajo.objects.exists())
+
+        resultado = importacion.importar(self.empresa, filas, chunk_size=1)
+        self.assertEqual((resultado.trabajos, resultado.movilidad, resultado.instrumental), (2, 2, 1))
+        trabajo = Trabajo.objects.get(expediente=123)
+        self.assertEqual(trabajo.viaticos, decimal.Decimal("100.50"))
+        actuantes = sorted(trabajo.actuantes.values_list("profesional__username", "horas"))
+        self.assertEqual(actuantes, [("gomez", 10), ("perez", 8)])
+        self.assertEqual(trabajo.costo.costo_total, trabajo.costos.costo_total)
+        self.assertIn("perez", trabajo.busqueda)
+        self.assertEqual(Trabajo.objects.de_empresa(self.empresa).count(), 2)
+
+    def test_errores(self):
+        filas = self.leer(
+            "fecha,expediente,actuantes,movilidad\n"
+            "2020-02-30,1,perez:8,\n"
+            '2020-01-01,-2,"ajeno:8; perez:x",hilux:10\n'
+            '2020-01-01,3,"perez;1-0001",\n'
+            "2020-01-01,4,perez,\n"
+        )
+        resultado = importacion.importar(self.empresa, filas)
+        self.assertEqual(
+            [(numero, error.split(":")[0]) for numero, error in resultado.errores],
+            [(1, "fecha"), (2, "expediente"), (2, "actuantes"), (2, "actuantes"), (2, "movilidad"), (3, "actuantes")],
+        )
+        self.assertFalse(Trabajo.objects.exists())
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.profesional = Profesional.objects.create(username="perez", matricula="1-0001", empresa=self.empresa)
+        otra = Profesional.objects.create(username="ajeno", empresa=Empresa.objects.create(nombre="Otra"))
+        self.trabajos = []
+        for i, profesional in enumerate([self.profesional] * 3 + [otra]):
+            trabajo = Trabajo.objects.create(expediente=i, comitente=f"Comitente {i}")
+            trabajo.actuantes.create(profesional=profesional, horas=10)
+            self.trabajos.append(trabajo)
+        self.client.force_login(self.profesional)
+
+    def get(self, url, **params):
+        response = self.client.get(url, {"format": "json", **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/trabajos/", {"format": "json"}).status_code, 403)
+
+    def test_empresa(self):
+        self.assertEqual([e["id"] for e in self.get("/api/empresas/")["results"]], [self.empresa.pk])
+        self.assertEqual([p["username"] for p in self.get("/api/profesionales/")["results"]], ["perez"])
+        self.assertEqual(len(self.get("/api/trabajos/")["results"]), 3)
+        self.assertEqual(self.client.get(f"/api/trabajos/{self.trabajos[3].pk}/").status_code, 404)
+
+    def test_trabajo(self):
+        trabajo = self.get(f"/api/trabajos/{self.trabajos[0].pk}/")
+        self.assertEqual(trabajo["actuantes"], [{"profesional": self.profesional.pk, "horas": 10}])
+        costos = Trabajo.objects.get(pk=trabajo["id"]).costos
+        self.assertEqual(trabajo["costo_total"], str(round(costos.costo_total, 2)))
+        self.assertEqual(trabajo["empresa"], self.empresa.pk)
+
+    def test_fields(self):
+        results = self.get("/api/trabajos/", fields="id,costo_total,desconocido")["results"]
+        self.assertEqual({tuple(t) for t in results}, {("id", "costo_total")})
+        with self.assertNumQueries(4):  # session, user, empresa, trabajos
+            self.get("/api/trabajos/", fields="id,comitente")
+
+    def test_nested_order(self):
+        trabajo = self.trabajos[0]
+        trabajo.actuantes.create(
+            profesional=Profesional.objects.create(username="gomez", empresa=self.empresa), horas=20
+        )
+        url = f"/api/trabajos/{trabajo.pk}/"
+        prefetched = Trabajo.objects.prefetch_related(*costos_prefetch()).get(pk=trabajo.pk)
+        esperados = [actuante.profesional_id for actuante in prefetched.actuantes.all()]
+        self.assertEqual(esperados[0], Profesional.objects.get(username="gomez").pk)
+        for fields in ("id,actuantes", "id,actuantes,costo_total"):
+            actuantes = self.get(url, fields=fields)["actuantes"]
+            self.assertEqual([a["profesional"] for a in actuantes], esperados)
+
+    def test_cursor(self):
+        page = self.get("/api/trabajos/", page_size=2, order="expediente", fields="expediente")
+        self.assertEqual([t["expediente"] for t in page["results"]], [0, 1])
+        page = self.client.get(page["next"]).json()
+        self.assertEqual(([t["expediente"] for t in page["results"]], page["next"]), ([2], None))
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.profesional = Profesional.objects.create(username="perez", empresa=self.empresa)
+        self.trabajo = Trabajo.objects.create(expediente=1, comitente="Comitente")
+        self.trabajo.actuantes.create(profesional=self.profesional, horas=10)
+        self.client.force_login(self.profesional)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_not_modified(self):
+        for url in (f"/trabajo/detail/{self.trabajo.pk}/", f"/trabajo/csv/{self.trabajo.pk}/"):
+            etag = self.etag(url)
+            with self.assertNumQueries(3):  # session, user, version
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_changes(self):
+        url = f"/trabajo/detail/{self.trabajo.pk}/"
+        etag = self.etag(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.trabajo.actuantes.get().save()
+        self.assertNotEqual(self.etag(url), etag)
+        etag = self.etag(url)
+        Vehiculo.objects.create(empresa=self.empresa, nombre="Auto", valor=1000)
+        self.assertNotEqual(self.etag(url), etag)
+        tipo = TipoGasto.objects.create(detalle="Luz")
+        etag = self.etag(f"/empresa/detail/{self.empresa.pk}/")
+        GastoEmpresa.objects.create(empresa=self.empresa, tipo=tipo, monto=10)
+        self.assertNotEqual(self.etag(f"/empresa/detail/{self.empresa.pk}/"), etag)
+
+    def test_deleted_month(self):
+        enero = Trabajo.objects.create(expediente=2, comitente="Comitente", fecha=datetime.date(2020, 1, 15))
+        enero.actuantes.create(profesional=self.profesional, horas=10)
+        update_snapshots([self.trabajo.pk, enero.pk])
+        url = f"/empresa/detail/{self.empresa.pk}/"
+        etag = self.etag(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        costo = enero.costo
+        enero.delete()
+        # What the post_delete of CostoTrabajo schedules on commit
+        resumenes.actualizar([(costo.empresa_id, costo.fecha)])
+        self.assertFalse(ResumenMensual.objects.filter(mes=datetime.date(2020, 1, 1)).exists())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_per_user(self):
+        url = f"/empresa/detail/{self.empresa.pk}/"
+        etag = self.etag(url)
+        self.client.force_login(Profesional.objects.create(username="gomez", empresa=self.empresa))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_other_empresa(self):
+        otra = Empresa.objects.create(nombre="Otra")
+        self.client.force_login(Profesional.objects.create(username="ajeno", empresa=otra))
+        response = self.client.get(f"/trabajo/detail/{self.trabajo.pk}/")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_metrics.reset()
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.profesional = Profesional.objects.create(username="perez", empresa=self.empresa)
+        self.trabajo = Trabajo.objects.create(expediente=1, comitente="Comitente")
+        self.actuante = self.trabajo.actuantes.create(profesional=self.profesional, horas=10)
+        self.url = f"/trabajo/detail/{self.trabajo.pk}/"
+        self.client.force_login(self.profesional)
+
+    def hits(self):
+        return fragment_metrics.report()["trabajo_detalle"]["hits"]
+
+    def test_hit(self):
+        first = self.client.get(self.url).content
+        with self.assertNumQueries(5):  # session, user, version, trabajo, preferences
+            second = self.client.get(self.url).content
+        self.assertEqual(first, second)
+        self.assertEqual(fragment_metrics.report()["trabajo_kpis"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_invalidation(self):
+        self.client.get(self.url)
+        self.actuante.horas = 20
+        self.actuante.save()
+        self.assertContains(self.client.get(self.url), "20 hs")
+        GastoEmpresa.objects.create(empresa=self.empresa, tipo=TipoGasto.objects.create(detalle="Luz"), monto=10)
+        self.client.get(self.url)
+        global_preferences_registry.manager()["cotizacion_dolar"] = decimal.Decimal(123)
+        self.client.get(self.url)
+        self.assertEqual(self.hits(), 0)
+        self.client.get(self.url)
+        self.assertEqual(self.hits(), 1)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class TrabajoFormsetTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.profesionales = [
+            Profesional.objects.create(username=f"profesional{i}", empresa=self.empresa) for i in range(5)
+        ]
+        self.client.force_login(self.profesionales[0])
+
+    def trabajo(self, filas):
+        trabajo = Trabajo.objects.create(expediente=filas, comitente="Comitente")
+        for i in range(filas):
+            vehiculo = Vehiculo.objects.create(empresa=self.empresa, nombre=f"Auto {i}", valor=1000)
+            instrumento = Instrumento.objects.create(empresa=self.empresa, nombre=f"GPS {i}", valor_USD=1000)
+            trabajo.actuantes.create(profesional=self.profesionales[i], horas=10)
+            trabajo.movilidad.create(vehiculo=vehiculo, km=100)
+            trabajo.instrumental.create(instrumento=instrumento, jornadas=1)
+        return trabajo
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_constant_queries(self):
+        uno, cinco = self.trabajo(1), self.trabajo(5)
+        self.assertEqual(self.queries(f"/trabajo/update/{uno.pk}/"), self.queries(f"/trabajo/update/{cinco.pk}/"))
+
+    def test_choices_of_empresa(self):
+        trabajo = self.trabajo(1)
+        ajeno = Profesional.objects.create(username="ajeno", empresa=Empresa.objects.create(nombre="Otra"))
+        actuante = trabajo.actuantes.get()
+        data = {
+            **{campo: 0 for campo in importacion.CAMPOS if campo != "cerrado"},
+            "fecha": "2020-01-01",
+            "comitente": "Comitente",
+            "actuantes-TOTAL_FORMS": 1,
+            "actuantes-INITIAL_FORMS": 1,
+            "actuantes-0-id": actuante.pk,
+            "actuantes-0-trabajo": trabajo.pk,
+            "actuantes-0-profesional": ajeno.pk,
+            "actuantes-0-horas": 20,
+            "movilidad-TOTAL_FORMS": 0,
+            "movilidad-INITIAL_FORMS": 0,
+            "instrumental-TOTAL_FORMS": 0,
+            "instrumental-INITIAL_FORMS": 0,
+        }
+        response = self.client.post(f"/trabajo/update/{trabajo.pk}/", data)
+        self.assertEqual(response.context["actuantes"].errors[0].keys(), {"profesional"})
+        data["actuantes-0-profesional"] = self.profesionales[1].pk
+        response = self.client.post(f"/trabajo/update/{trabajo.pk}/", data)
+        self.assertEqual(response.status_code, 302)
+        actuante.refresh_from_db()
+        self.assertEqual((actuante.profesional, actuante.horas), (self.profesionales[1], 20))
+
+
+class EscenarioTests(TestCase):
+    cambios = {"cotizacion_dolar": 250, "nafta": "180.5", "diesel": 170, "modulo_tributario": "1.2"}
+
+    def setUp(self):
+        benchmark.generate(empresas=2, profesionales=3, vehiculos=3, instrumentos=2, trabajos=15, seed=3)
+        trabajos = Trabajo.objects.order_by("pk")
+        # Some with a snapshot, some without
+        update_snapshots(trabajos.values_list("pk", flat=True)[:20])
+        trabajos.filter(pk__in=trabajos.values_list("pk", flat=True)[:5]).update(cerrado=True)
+
+    def test_parity(self):
+        resultado = escenarios.simular(self.cambios, cerrados=True)
+        nuevos = list(Trabajo.objects.order_by("pk"))
+        compute_costs_bulk(nuevos, resultado.escenario, Tarificador(resultado.escenario, guardar=False))
+        actuales = compute_costs_bulk(list(Trabajo.objects.order_by("pk")))
+        self.assertEqual(
+            [(i.trabajo, i.costo_actual, i.costo_nuevo) for i in resultado.impactos],
+            [(a.pk, round(a.costos.costo_total, 2), round(n.costos.costo_total, 2)) for a, n in zip(actuales, nuevos)],
+        )
+        self.assertEqual(resultado.resumen()["trabajos"], 30)
+        self.assertGreater(resultado.resumen()["diferencia"], 0)
+
+    def test_cerrados(self):
+        # The snapshot of a closed Trabajo predates a change to its Vehiculo
+        trabajo = Trabajo.objects.filter(cerrado=True, costo__isnull=False, movilidad__isnull=False).first()
+        congelado = trabajo.costo.costo_total
+        vehiculo = trabajo.movilidad.first().vehiculo
+        vehiculo.valor *= 3
+        vehiculo.save()
+        resultado = escenarios.simular(self.cambios, cerrados=True)
+        impacto = next(i for i in resultado.impactos if i.trabajo == trabajo.pk)
+        [actual] = compute_costs_bulk([Trabajo.objects.get(pk=trabajo.pk)])
+        [nuevo] = compute_costs_bulk(
+            [Trabajo.objects.get(pk=trabajo.pk)], resultado.escenario, Tarificador(resultado.escenario, guardar=False)
+        )
+        self.assertNotEqual(impacto.costo_actual, congelado)
+        self.assertEqual(impacto.costo_actual, round(actual.costos.costo_total, 2))
+        self.assertEqual(impacto.costo_nuevo, round(nuevo.costos.costo_total, 2))
+
+    def test_nothing_saved(self):
+        def estado():
+            return list(Tarifario.objects.values_list("tarifas", flat=True)), CostoTrabajo.objects.count()
+
+        antes = estado()
+        with CaptureQueriesContext(connection) as queries:
+            escenarios.simular(self.cambios)
+        self.assertEqual([q["sql"] for q in queries if not q["sql"].startswith("SELECT")], [])
+        self.assertEqual(estado(), antes)
+
+    def test_scope(self):
+        empresa = Empresa.objects.order_by("pk").first()
+        resultado = escenarios.simular(self.cambios, empresa=empresa)
+        self.assertEqual(
+            {i.trabajo for i in resultado.impactos},
+            set(Trabajo.objects.de_empresa(empresa).filter(cerrado=False).values_list("pk", flat=True)),
+        )
+        # Aportes are only defaults of new Trabajos
+        self.assertEqual(escenarios.simular({"aporte_copa": 1}).resumen()["modificados"], 0)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            escenarios.escenario({"dolar": 1})
+        with self.assertRaises(ValueError):
+            escenarios.escenario({"nafta": "mucho"})
+
+
+class VigenciaTests(TestCase):
+    def setUp(self):
+        benchmark.generate(empresas=1, profesionales=2, vehiculos=3, instrumentos=2, trabajos=30, seed=5)
+        dia = datetime.date
+        Vigencia.objects.bulk_create(
+            [
+                Vigencia(parametro="cotizacion_dolar", valor=95, desde=dia(2021, 1, 1), hasta=dia(2021, 12, 31)),
+                Vigencia(parametro="cotizacion_dolar", valor=180, desde=dia(2022, 1, 1), hasta=dia(2022, 12, 31)),
+                Vigencia(parametro="nafta", valor=120, desde=dia(2022, 6, 1), hasta=dia(2023, 5, 31)),
+            ]
+        )
+
+    def test_lookup(self):
+        indice = vigencias.cargar()
+        self.assertEqual(indice.valor("cotizacion_dolar", datetime.date(2021, 1, 1)), 95)
+        self.assertEqual(indice.valor("cotizacion_dolar", datetime.date(2021, 12, 31)), 95)
+        self.assertEqual(indice.valor("cotizacion_dolar", datetime.date(2022, 7, 1)), 180)
+        self.assertIsNone(indice.valor("cotizacion_dolar", datetime.date(2020, 12, 31)))
+        self.assertIsNone(indice.valor("cotizacion_dolar", datetime.date(2023, 1, 1)))
+        self.assertIsNone(indice.valor("gnc", datetime.date(2022, 7, 1)))
+        self.assertEqual(indice.periodo(datetime.date(2021, 3, 1)), indice.periodo(datetime.date(2021, 9, 1)))
+        self.assertNotEqual(indice.periodo(datetime.date(2022, 3, 1)), indice.periodo(datetime.date(2022, 9, 1)))
+        self.assertEqual(indice.periodo(datetime.datetime(2022, 9, 1, 12)), indice.periodo(datetime.date(2022, 9, 1)))
+        self.assertEqual(get_cotizacion_dolar(datetime.date(2021, 5, 1)), 95)
+        self.assertEqual(get_cotizacion_dolar(), get_parametros().cotizacion_dolar)
+
+    def test_pricing(self):
+        parametros = get_parametros()
+
+        def vigentes(dia):
+            dolar = 95 if dia.year == 2021 else 180 if dia.year == 2022 else parametros.cotizacion_dolar
+            nafta = 120 if datetime.date(2022, 6, 1) <= dia <= datetime.date(2023, 5, 31) else parametros.nafta
+            return dataclasses.replace(parametros, cotizacion_dolar=dolar, nafta=nafta)
+
+        for trabajo in compute_costs_bulk(Trabajo.objects.all()):
+            with parametros_globales(vigentes(trabajo.fecha)) as p:
+                for i in trabajo.costos.instrumental:
+                    self.assertEqual(i.costo, Instrumento.objects.get(pk=i.instrumento.pk).costo_jornada * i.jornadas)
+                for m in trabajo.costos.movilidad:
+                    self.assertEqual(m.costo, compute_costos_km([m.vehiculo], p)[0].costo_km * m.km)
+
+    def test_queries_per_period(self):
+        indice = vigencias.cargar()
+        trabajos = list(Trabajo.objects.order_by("pk"))
+        uno_por_periodo = list({indice.periodo(t.fecha): t for t in trabajos}.values())
+        self.assertGreater(len(uno_por_periodo), 2)
+        compute_costs_bulk(trabajos)
+        queries = []
+        for lote in (uno_por_periodo, trabajos):
+            with CaptureQueriesContext(connection) as capturadas:
+                compute_costs_bulk(Trabajo.objects.filter(pk__in=[t.pk for t in lote]))
+            queries.append(len(capturadas))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_overlap(self):
+        vigencia = Vigencia(
+            parametro="cotizacion_dolar", valor=100, desde=datetime.date(2021, 12, 1), hasta=datetime.date(2022, 1, 1)
+        )
+        with self.assertRaises(ValidationError):
+            vigencia.full_clean()
+        vigencia.parametro = "gnc"
+        vigencia.full_clean()
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ResumenMensualTests(TestCase):
+    def setUp(self):
+        benchmark.generate(empresas=2, profesionales=2, vehiculos=2, instrumentos=2, trabajos=25, seed=7)
+        update_snapshots(Trabajo.objects.values_list("pk", flat=True))
+
+    def filas(self):
+        campos = ["empresa", "mes", *resumenes.CAMPOS]
+        return sorted(ResumenMensual.objects.values_list(*campos))
+
+    def test_sums(self):
+        esperadas = {}
+        for costo in CostoTrabajo.objects.select_related("trabajo"):
+            clave = (costo.empresa_id, costo.trabajo.fecha.replace(day=1))
+            fila = esperadas.setdefault(clave, [0] * 11)
+            valores = [1, costo.horas_total, costo.cantidad_de_km, costo.cantidad_de_jornadas, costo.aportes]
+            valores += [costo.gastos_especificos, costo.gastos_de_empresa, costo.costo_actuantes]
+            valores += [costo.costo_movilidad, costo.costo_instrumental, costo.costo_total]
+            esperadas[clave] = [a + b for a, b in zip(fila, valores)]
+        self.assertEqual(self.filas(), sorted((*clave, *fila) for clave, fila in esperadas.items()))
+
+    def test_incremental(self):
+        trabajo = Trabajo.objects.order_by("pk").first()
+        trabajo.fecha = datetime.date(2019, 6, 15)
+        Trabajo.objects.filter(pk=trabajo.pk).update(fecha=trabajo.fecha)
+        trabajo.actuantes.update(horas=500)
+        update_snapshots([trabajo.pk])
+        incrementales = self.filas()
+        self.assertIn(datetime.date(2019, 6, 1), [mes for _, mes, *_ in incrementales])
+        resumenes.reconstruir()
+        self.assertEqual(incrementales, self.filas())
+
+        # Months left without snapshots are deleted
+        costo = CostoTrabajo.objects.get(pk=trabajo.pk)
+        costo.delete()
+        resumenes.actualizar([(costo.empresa_id, costo.fecha)])
+        self.assertNotIn(datetime.date(2019, 6, 1), [mes for _, mes, *_ in self.filas()])
+
+    def test_dashboard(self):
+        empresa = Empresa.objects.order_by("pk").first()
+        with self.assertNumQueries(1):
+            ultimos = resumenes.ultimos(empresa.pk)
+        self.assertEqual(ultimos, list(ResumenMensual.objects.filter(empresa=empresa).order_by("-mes")[:12]))
+        self.client.force_login(empresa.profesionales.first())
+        for url in ("/", f"/empresa/detail/{empresa.pk}/"):
+            response = self.client.get(url)
+            self.assertContains(response, "Costos por mes")
+            self.assertEqual(response.context["resumenes"], ultimos)
+
+
+class FallaBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("Proveedor caído")
+
+
+@override_settings(
+    EMAIL_BACKEND="costos.outbox.OutboxBackend",
+    OUTBOX_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    OUTBOX_RETRY_DELAY=60,
+    OUTBOX_MAX_ATTEMPTS=3,
+)
+class OutboxTests(TestCase):
+    def encolar(self):
+        mail.send_mail("Asunto", "Cuerpo", "costos@example.com", ["perez@example.com"])
+        return Correo.objects.get()
+
+    def test_password_reset(self):
+        usuario = Profesional.objects.create(username="perez", email="perez@example.com")
+        usuario.set_password("secreta")
+        usuario.save()
+        form = PasswordResetForm({"email": "perez@example.com"})
+        self.assertTrue(form.is_valid())
+        form.save(domain_override="costos.example.com")
+        self.assertEqual(mail.outbox, [])
+        correo = Correo.objects.get()
+        self.assertEqual((correo.estado, correo.destinatarios), (Correo.PENDIENTE, "perez@example.com"))
+
+        self.assertEqual(outbox.entregar(), (1, 0))
+        self.assertEqual([m.to for m in mail.outbox], [["perez@example.com"]])
+        self.assertIn("costos.example.com", mail.outbox[0].body)
+        self.assertEqual(Correo.objects.get().estado, Correo.ENVIADO)
+
+    @override_settings(OUTBOX_EMAIL_BACKEND="costos.tests.FallaBackend")
+    def test_retry(self):
+        correo = self.encolar()
+        for intentos, delay in ((1, 60), (2, 120)):
+            antes = timezone.now()
+            self.assertEqual(outbox.entregar(), (0, 1))
+            correo.refresh_from_db()
+            self.assertEqual((correo.estado, correo.intentos), (Correo.PENDIENTE, intentos))
+            self.assertIn("Proveedor caído", correo.error)
+            self.assertGreaterEqual(correo.proximo_intento, antes + datetime.timedelta(seconds=delay))
+            self.assertLess(correo.proximo_intento, timezone.now() + datetime.timedelta(seconds=delay))
+            # Not due yet
+            self.assertEqual(outbox.entregar(), (0, 0))
+            Correo.objects.update(proximo_intento=timezone.now())
+
+        self.assertEqual(outbox.entregar(), (0, 1))
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), (Correo.FALLIDO, 3))
+        self.assertEqual(outbox.entregar(), (0, 0))
+
+        # A retried message is sent once the provider is back
+        Correo.objects.update(estado=Correo.PENDIENTE, intentos=1, proximo_intento=timezone.now())
+        with self.settings(OUTBOX_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            self.assertEqual(outbox.entregar(), (1, 0))
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos, correo.error), (Correo.ENVIADO, 2, ""))
+
+    def test_lease(self):
+        correo = self.encolar()
+        self.assertEqual(outbox.reservar(10, 600), [correo])
+        # Claimed messages are skipped until the lease expires, e.g. after a crash
+        self.assertEqual(outbox.entregar(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+        Correo.objects.update(proximo_intento=timezone.now())
+        self.assertEqual(outbox.entregar(), (1, 0))
+        correo.refresh_from_db()
+        self.assertEqual(correo.intentos, 2)
+
+
+class SearchTests(TransactionTestCase):
+    # busqueda is updated on commit, which runs right away in autocommit
+    def setUp(self):
+        empresa = Empresa.objects.create(nombre="Empresa")
+        self.perez = Profesional.objects.create(
+            username="perez", first_name="José", last_name="Pérez", matricula="1-0042", empresa=empresa
+        )
+        self.gomez = Profesional.objects.create(username="gomez", first_name="Ana", last_name="Gómez", empresa=empresa)
+        self.mensura = Trabajo.objects.create(expediente=100, comitente="Municipalidad de Santa Fé")
+        Actuantes.objects.create(trabajo=self.mensura, profesional=self.perez)
+        self.loteo = Trabajo.objects.create(expediente=7200, comitente="Loteo Núñez")
+        Actuantes.objects.create(trabajo=self.loteo, profesional=self.gomez)
+
+    def buscar(self, texto):
+        return set(Trabajo.objects.buscar(texto))
+
+    def test_normalizar(self):
+        self.assertEqual(search.normalizar("Santa FÉ Ñandú"), "santa fe nandu")
+        self.assertEqual(self.buscar("SANTA FE"), {self.mensura})
+        self.assertEqual(self.buscar("nuñez"), {self.loteo})
+        self.assertEqual(self.buscar("7200"), {self.loteo})
+        self.assertEqual(self.buscar("  "), {self.mensura, self.loteo})
+
+    def test_actuantes(self):
+        self.assertEqual(self.buscar("1-0042"), {self.mensura})
+        self.assertEqual(self.buscar("perez"), {self.mensura})
+        self.assertEqual(self.buscar("Gomez Ana"), {self.loteo})
+
+    def test_todas_las_palabras(self):
+        self.assertEqual(self.buscar("municipalidad perez"), {self.mensura})
+        self.assertEqual(self.buscar("municipalidad gomez"), set())
+        self.assertEqual(self.buscar("00"), {self.mensura, self.loteo})
+
+    def test_actualizacion(self):
+        Actuantes.objects.create(trabajo=self.mensura, profesional=self.gomez)
+        self.assertEqual(self.buscar("gomez"), {self.mensura, self.loteo})
+        self.loteo.actuantes.get().delete()
+        self.assertEqual(self.buscar("gomez"), {self.mensura})
+
+        self.perez.last_name = "Pereyra"
+        self.perez.matricula = "1-0043"
+        self.perez.save()
+        self.assertEqual(self.buscar("perez"), set())
+        self.assertEqual(self.buscar("pereyra 1-0043"), {self.mensura})
+
+        self.mensura.comitente = "Comuna de Recreo"
+        self.mensura.save()
+        self.assertEqual(self.buscar("municipalidad"), set())
+        self.assertEqual(self.buscar("recreo"), {self.mensura})
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.profesional = Profesional.objects.create(username="perez", empresa=self.empresa)
+        # Repeated and missing expedientes
+        for i in range(23):
+            trabajo = Trabajo.objects.create(expediente=None if i % 5 == 0 else i % 7, comitente=f"Comitente {i}")
+            trabajo.actuantes.create(profesional=self.profesional)
+
+    def esperados(self, descendente=False):
+        trabajos = list(Trabajo.objects.all())
+        if descendente:
+            # NULLs last
+            return sorted(trabajos, key=lambda t: (t.expediente is None, -(t.expediente or 0), t.pk))
+        return sorted(trabajos, key=lambda t: (t.expediente is not None, t.expediente or 0, t.pk))
+
+    def adelante(self, paginator, cursor=None):
+        filas = []
+        while True:
+            page = paginator.page(cursor)
+            filas += page
+            cursor = page.next_cursor
+            if cursor is None:
+                return filas
+
+    def atras(self, paginator):
+        page = paginator.page(paginator.page().last_cursor)
+        self.assertFalse(page.has_next())
+        self.assertEqual(len(page), 5)
+        filas = list(page)
+        while page.previous_cursor:
+            page = paginator.page(page.previous_cursor)
+            filas = list(page) + filas
+        return filas
+
+    def test_nullable(self):
+        for orden, descendente in (("expediente", False), ("-expediente", True)):
+            with self.subTest(orden=orden):
+                paginator = KeysetPaginator(Trabajo.objects.order_by(orden), 5)
+                self.assertEqual(self.adelante(paginator), self.esperados(descendente))
+                self.assertEqual(self.atras(paginator), self.esperados(descendente))
+
+    def test_pages(self):
+        paginator = KeysetPaginator(Trabajo.objects.order_by("expediente"), 5)
+        esperados = self.esperados()
+        first = paginator.page()
+        self.assertEqual((list(first), first.has_previous(), first.has_next()), (esperados[:5], False, True))
+        second = paginator.page(first.next_cursor)
+        self.assertEqual((list(second), second.has_previous()), (esperados[5:10], True))
+        self.assertEqual(list(paginator.page(second.previous_cursor)), esperados[:5])
+        last = paginator.page(first.last_cursor)
+        self.assertEqual((list(last), last.has_next(), last.has_previous()), (esperados[-5:], False, True))
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPaginator(Trabajo.objects.order_by("expediente"), 5)
+        first = list(paginator.page())
+        cursor = paginator.page().next_cursor
+        otro = KeysetPaginator(Trabajo.objects.order_by("comitente"), 5)
+        for invalido in ("basura", cursor[:-3], cursor + "x", otro.page().next_cursor):
+            with self.subTest(cursor=invalido):
+                self.assertEqual(list(paginator.page(invalido)), first)
+
+    def test_paginate_by(self):
+        self.client.force_login(self.profesional)
+        for pedido, esperado in (("1000", 100), ("0", 1), ("muchos", 10), ("7", 7)):
+            with self.subTest(paginate_by=pedido):
+                response = self.client.get("/trabajos/", {"paginate_by": pedido})
+                self.assertEqual(response.context["paginator"].per_page, esperado)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class SortTests(TestCase):
+    def setUp(self):
+        benchmark.generate(empresas=1, profesionales=2, vehiculos=2, instrumentos=2, trabajos=12, seed=13)
+        update_snapshots(Trabajo.objects.values_list("pk", flat=True))
+        self.client.force_login(Profesional.objects.order_by("pk").first())
+
+    def listar(self, **params):
+        filas = []
+        params = {"paginate_by": 5, **params}
+        while True:
+            page = self.client.get("/trabajos/", params).context["page_obj"]
+            filas += [t.pk for t in page]
+            if page.next_cursor is None:
+                return filas
+            params["cursor"] = page.next_cursor
+
+    def test_default(self):
+        por_defecto = list(Trabajo.objects.order_by("-fecha", "pk").values_list("pk", flat=True))
+        self.assertEqual(self.listar(), por_defecto)
+        for orden in ("desconocido", "-actuantes__profesional__password", "costo__costo_total", "pk"):
+            with self.subTest(order=orden):
+                self.assertEqual(self.listar(order=orden), por_defecto)
+
+    def test_costo_total(self):
+        costos = CostoTrabajo.objects.values_list("trabajo", "costo_total")
+        for orden, signo in (("costo_total", 1), ("-costo_total", -1)):
+            with self.subTest(order=orden):
+                # Ties are broken by pk
+                esperados = [pk for pk, _ in sorted(costos, key=lambda c: (signo * c[1], c[0]))]
+                self.assertEqual(self.listar(order=orden), esperados)
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class EmpresaIsolationTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nombre="Empresa")
+        self.otra = Empresa.objects.create(nombre="Otra")
+        self.perez = Profesional.objects.create(username="perez", empresa=self.empresa)
+        gomez = Profesional.objects.create(username="gomez", empresa=self.empresa)
+        ajeno = Profesional.objects.create(username="ajeno", empresa=self.otra)
+        self.trabajos = {}
+        for nombre, profesionales in (
+            ("propio", [self.perez]),
+            ("compartido", [self.perez, gomez]),
+            ("mixto", [gomez, ajeno]),
+            ("ajeno", [ajeno]),
+        ):
+            trabajo = Trabajo.objects.create(comitente=nombre)
+            for profesional in profesionales:
+                trabajo.actuantes.create(profesional=profesional)
+            self.trabajos[nombre] = trabajo
+
+    def ids(self, *nombres):
+        return sorted(self.trabajos[nombre].pk for nombre in nombres)
+
+    def test_de_empresa(self):
+        # Trabajos with several actuantes of the Empresa are not repeated
+        for empresa, nombres in ((self.empresa, ("propio", "compartido", "mixto")), (self.otra, ("mixto", "ajeno"))):
+            trabajos = Trabajo.objects.de_empresa(empresa)
+            self.assertEqual(sorted(t.pk for t in trabajos), self.ids(*nombres))
+            self.assertEqual(trabajos.count(), len(nombres))
+        self.assertEqual(Trabajo.objects.de_empresa(self.empresa.pk).count(), 3)
+
+    def test_list(self):
+        self.client.force_login(self.perez)
+        page = self.client.get("/trabajos/").context["page_obj"]
+        self.assertEqual(sorted(t.pk for t in page), self.ids("propio", "compartido", "mixto"))
+
+    def test_trabajo_csv(self):
+        self.client.force_login(self.perez)
+        self.assertEqual(self.client.get(f"/trabajo/csv/{self.trabajos['mixto'].pk}/").status_code, 200)
+        self.assertEqual(self.client.get(f"/trabajo/csv/{self.trabajos['ajeno'].pk}/").status_code, 404)
+        # Without an Empresa nothing is found
+        sin_empresa = Profesional.objects.create(username="nuevo")
+        self.client.force_login(sin_empresa)
+        self.assertEqual(self.client.get(f"/trabajo/csv/{self.trabajos['propio'].pk}/").status_code, 404)
+
+
+class TrabajoExportTests(TestCase):
+    def setUp(self):
+        benchmark.generate(empresas=2, profesionales=2, vehiculos=2, instrumentos=2, trabajos=8, seed=17)
+        # Costs are sorted by their snapshot
+        update_snapshots(Trabajo.objects.values_list("pk", flat=True))
+        self.empresa = Empresa.objects.order_by("pk").first()
+        self.trabajos = Trabajo.objects.de_empresa(self.empresa)
+        self.client.force_login(self.empresa.profesionales.first())
+
+    def exportar(self, **params):
+        response = self.client.get("/trabajos/csv/", params)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def filas(self, trabajos):
+        return sorted(["" if v is None else str(v) for v in trabajo_csv_row(t)] for t in trabajos)
+
+    def test_export(self):
+        header, *rows = self.exportar()
+        self.assertEqual(header, TRABAJO_CSV_HEADER)
+        # Only the Trabajos of the user's Empresa
+        self.assertEqual(sorted(rows), self.filas(self.trabajos))
+        self.assertLess(len(rows), Trabajo.objects.count())
+        self.assertEqual([row[0] for row in rows], sorted((row[0] for row in rows), reverse=True))
+
+    def test_metrics(self):
+        # The export reads its rows while streaming, and is measured until it ends
+        request_metrics.reset()
+        response = self.client.get("/trabajos/csv/")
+        self.assertNotIn("trabajo_export", request_metrics.report())
+        with CaptureQueriesContext(connection) as queries:
+            b"".join(response.streaming_content)
+        self.assertTrue(queries)
+        metricas = request_metrics.report()["trabajo_export"]
+        self.assertEqual(metricas["count"], 1)
+        self.assertGreater(metricas["queries"]["max"], len(queries))
+
+    def test_search_and_order(self):
+        comitente = self.trabajos.first().comitente
+        _, *rows = self.exportar(search=comitente.upper(), order="-comitente")
+        self.assertTrue(rows)
+        self.assertEqual(sorted(rows), self.filas(self.trabajos.buscar(comitente)))
+        _, *rows = self.exportar(order="-costo_total")
+        costos = [decimal.Decimal(row[-1]) for row in rows]
+        self.assertEqual(costos, sorted(costos, reverse=True))
+        self.assertEqual(len(rows), self.trabajos.count())
@@ -1,10 +1,15 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from . import views
+from . import api, views
 
 # REST Framework
 router = routers.DefaultRouter()
+router.register("empresas", api.EmpresaViewSet, basename="api-empresa")
+router.register("profesionales", api.ProfesionalViewSet, basename="api-profesional")
+router.register("vehiculos", api.VehiculoViewSet, basename="api-vehiculo")
+router.register("instrumentos", api.InstrumentoViewSet, basename="api-instrumento")
+router.register("trabajos", api.TrabajoViewSet, basename="api-trabajo")
 
 urlpatterns = (
     # Inicio
@@ -36,11 +41,16 @@ urlpatterns = (
     path("vehiculo/delete/<int:pk>/", views.VehiculoDeleteView.as_view(), name="vehiculo_delete"),
     # Trabajos
     path("trabajos/", views.TrabajoListView.as_view(), name="trabajo_list"),
+    path("trabajos/csv/", views.TrabajoExportView.as_view(), name="trabajo_export"),
+    path("trabajos/importar/", views.trabajo_import, name="trabajo_import"),
     path("trabajo/create/", views.TrabajoCreateView.as_view(), name="trabajo_create"),
     path("trabajo/detail/<int:pk>/", views.TrabajoDetailView.as_view(), name="trabajo_detail"),
     path("trabajo/update/<int:pk>/", views.TrabajoUpdateView.as_view(), name="trabajo_update"),
     path("trabajo/delete/<int:pk>/", views.TrabajoDeleteView.as_view(), name="trabajo_delete"),
     path("trabajo/csv/<int:pk>/", views.trabajo_csv, name="trabajo_csv"),
+    # Métricas
+    path("metricas/", views.metricas, name="metricas"),
+    path("metricas/cache/", views.metricas_cache, name="metricas_cache"),
     # Contacto
     path("contacto/", views.contact_view, name="contact"),
     path("contacto/<str:asunto>/<str:mensaje>", views.contact_view, name="contact_prefilled"),
@@ -0,0 +1,110 @@
+"""
+Conditional GET.
+
+Trabajo and Empresa keep the time they last changed (``actualizado``). It
+also moves when the rows their pages show and their costs depend on change
+(see the Versions signals): actuantes, movilidad and instrumental for a
+Trabajo; gastos, profesionales, vehículos and instrumentos for an Empresa,
+whose page also shows its monthly rollups (see costos.resumenes).
+Global preferences have no timestamps of their own, so a change to them
+moves every Empresa.
+
+A page's Last-Modified and ETag are read with one small query. An unchanged
+page is answered with 304 Not Modified before any cost is computed. The same
+versions key the cached fragments of the Trabajo page (see ``clave_trabajo()``).
+"""
+from functools import wraps
+
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import models
+
+
+def actualizar(queryset):
+    """Marks the rows of ``queryset`` (Trabajos or Empresas) as changed now."""
+    queryset.update(actualizado=timezone.now())
+
+
+def actualizado_empresa():
+    """Annotation: when the Empresa that prices each Trabajo (that of its actuantes) last changed."""
+    return Subquery(
+        models.Empresa.objects.filter(profesionales__actuante__trabajo=OuterRef("pk"))
+        .order_by("-actualizado")
+        .values("actualizado")[:1]
+    )
+
+
+def clave_trabajo(trabajo):
+    """
+    Version of everything the cost breakdown of ``trabajo`` depends on: the
+    Trabajo and its relations, its snapshot (rewritten after the commit that
+    changed them) and its Empresa, moved by global preferences too. Needs the
+    ``actualizado_empresa`` annotation and the ``costo`` relation selected.
+    """
+    try:
+        snapshot = trabajo.costo.actualizado
+    except models.CostoTrabajo.DoesNotExist:
+        snapshot = None
+    fechas = [trabajo.actualizado, snapshot, trabajo.actualizado_empresa]
+    return "-".join([str(trabajo.pk)] + [f"{fecha.timestamp():.6f}" if fecha else "" for fecha in fechas])
+
+
+def trabajo(request, pk):
+    """When the page of Trabajo ``pk`` last changed, or None if the user cannot see it."""
+    if not request.user.empresa_id:
+        return None
+    fila = (
+        models.Trabajo.objects.de_empresa(request.user.empresa_id)
+        .filter(pk=pk)
+        .annotate(empresa=actualizado_empresa())
+        .values_list("actualizado", "costo__actualizado", "empresa")
+        .first()
+    )
+    return max(v for v in fila if v is not None) if fila else None
+
+
+def empresa(request, pk):
+    """When the page of Empresa ``pk`` last changed, or None if the user cannot see it."""
+    if request.user.empresa_id != pk:
+        return None
+    fila = (
+        models.Empresa.objects.filter(pk=pk)
+        .annotate(resumen=Max("resumenes__actualizado"))
+        .values_list("actualizado", "resumen")
+        .first()
+    )
+    return max(v for v in fila if v is not None) if fila else None
+
+
+def condicional(ultima_modificacion):
+    """
+    Decorator that answers a GET with 304 Not Modified when the page has not
+    changed since the client's copy, according to ``ultima_modificacion(request,
+    **kwargs)``. The ETag also depends on the user, as pages show who is
+    logged in. Responses are private and always revalidated.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            last_modified = ultima_modificacion(request, **kwargs)
+            if last_modified is None:
+                return view(request, *args, **kwargs)
+            etag = quote_etag(f"{request.user.pk}-{last_modified.timestamp():.6f}")
+            response = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(last_modified.timestamp())
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return inner
+
+    return decorator
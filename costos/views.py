@@ -1,18 +1,27 @@
 import csv
+import itertools
 
 from copasfn.settings import DEFAULT_FROM_EMAIL
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import mixins  # LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.mail import BadHeaderError, send_mail
 from django.db import transaction
-from django.http import HttpResponse
-from django.shortcuts import redirect, render
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject, cached_property
 from django.views import generic  # ListView
 
-from . import forms, models
+from . import forms, models, resumenes, versiones
+from .costs import attach_costs
+from .importacion import ErrorImportacion, importar, leer
+from .metrics import fragment_metrics, request_metrics
+from .pagination import KeysetPaginator
+from .preferences import get_parametros
 
 
 class CounterMixin:
@@ -23,17 +32,57 @@ class CounterMixin:
 
 
 class PaginateByMixin:
+    max_paginate_by = 100
+
     def get_paginate_by(self, queryset):
         """
-        Paginate by specified value in querystring, or use default class
-        property value.
+        Paginate by specified value in querystring (up to max_paginate_by),
+        or use default class property value.
         """
-        return self.request.GET.get("paginate_by", self.paginate_by)
+        try:
+            paginate_by = int(self.request.GET.get("paginate_by", self.paginate_by))
+        except ValueError:
+            return self.paginate_by
+        return min(max(paginate_by, 1), self.max_paginate_by)
+
+
+class KeysetPaginationMixin:
+    """
+    Paginates with a cursor (``cursor`` parameter) instead of page numbers,
+    see costos.pagination. With estimate_count the total shown is the
+    planner's estimate on PostgreSQL, instead of a COUNT(*).
+    """
+
+    estimate_count = False
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, estimate_count=self.estimate_count)
+        page = paginator.page(self.request.GET.get("cursor"))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+# Sortable columns of the Trabajo list and export. Costs are sorted by their
+# saved snapshot (CostoTrabajo), joined in the same query, so the database
+# sorts them instead of costing every Trabajo in Python.
+TRABAJO_SORT_FIELDS = {
+    "expediente": "expediente",
+    "comitente": "comitente",
+    "fecha": "fecha",
+    "costo_total": "costo__costo_total",
+    "horas_total": "costo__horas_total",
+    "cantidad_de_km": "costo__cantidad_de_km",
+}
 
 
 class Home(generic.TemplateView):
     template_name = "index.html"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.user.is_authenticated and self.request.user.empresa_id:
+            context["resumenes"] = resumenes.ultimos(self.request.user.empresa_id)
+        return context
+
 
 class CurrentUserMixin:
     def get_form_kwargs(self):
@@ -51,25 +100,28 @@ class SuccessDeleteMessageMixin:
 
 class SearchMixin:
     def get_queryset(self):
-        qs = super().get_queryset()
-        q = self.request.GET.get("search", "").split()
-        for word in q:
-            # Filter by many fields example
-            # qs = qs.filter(
-            #     Q(fecha__contains=word)
-            #     | Q(expediente__contains=word)
-            #     | Q(comitente__contains=word)
-            # ).distinct()
-            qs = qs.filter(comitente__icontains=word)
-        return qs
+        """
+        Filters by every word of the ``search`` parameter, in expediente,
+        comitente and actuantes' matrícula and name (see costos.search).
+        """
+        return super().get_queryset().buscar(self.request.GET.get("search", ""))
 
 
 class SortMixin:
+    """
+    Sorts by the ``order`` parameter: a key of ``sort_fields`` (mapped to the
+    field it sorts by), optionally prefixed with "-". Unknown keys are ignored
+    and the default order is kept.
+    """
+
+    sort_fields = {}
+
     def get_queryset(self):
         qset = super().get_queryset()
-        q = self.request.GET.get("order")
-        if q:
-            qset = qset.order_by(q)
+        q = self.request.GET.get("order", "")
+        field = self.sort_fields.get(q.lstrip("-"))
+        if field:
+            qset = qset.order_by(f"-{field}" if q.startswith("-") else field)
         return qset
 
 
@@ -84,8 +136,7 @@ class EmpresaFilterMixin:
                 qs = self.model.objects.filter(id=self.request.user.empresa.pk)
             elif self.model == models.Trabajo:
                 # Special case for models.Trabajo
-                socios = models.Profesional.objects.filter(empresa=self.request.user.empresa)
-                qs = self.model.objects.filter(profesionales__in=socios).distinct()
+                qs = self.model.objects.de_empresa(self.request.user.empresa)
             else:
                 qs = self.model.objects.filter(empresa=self.request.user.empresa)
         elif self.model == models.Profesional:
@@ -131,30 +182,36 @@ class ChildrenContextMixin:
 
 
 class TrabajoChildrenContextMixin:
+    @cached_property
+    def formsets(self):
+        """The inline formsets, built once per request. All their rows share the choices of the user's Empresa."""
+        data = self.request.POST or None
+        empresa = self.request.user.empresa_id
+        return {
+            "actuantes": forms.ActuantesInlineFormSet(
+                data,
+                instance=self.object,
+                choices={"profesional": forms.SharedChoices(models.Profesional.objects.filter(empresa=empresa))},
+            ),
+            "movilidad": forms.MovilidadInlineFormSet(
+                data,
+                instance=self.object,
+                choices={"vehiculo": forms.SharedChoices(models.Vehiculo.objects.filter(empresa=empresa))},
+            ),
+            "instrumental": forms.InstrumentalInlineFormSet(
+                data,
+                instance=self.object,
+                choices={"instrumento": forms.SharedChoices(models.Instrumento.objects.filter(empresa=empresa))},
+            ),
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.POST:
-            context["actuantes"] = forms.ActuantesInlineFormSet(self.request.POST, instance=self.object)
-            context["movilidad"] = forms.MovilidadInlineFormSet(self.request.POST, instance=self.object)
-            context["instrumental"] = forms.InstrumentalInlineFormSet(self.request.POST, instance=self.object)
-        else:
-            context["actuantes"] = forms.ActuantesInlineFormSet(instance=self.object)
-            context["movilidad"] = forms.MovilidadInlineFormSet(instance=self.object)
-            context["instrumental"] = forms.InstrumentalInlineFormSet(instance=self.object)
-        # Set choices
-        profesionales_qs = models.Profesional.objects.filter(empresa=self.request.user.empresa)
-        vehiculos_qs = models.Vehiculo.objects.filter(empresa=self.request.user.empresa)
-        instrumentos_qs = models.Instrumento.objects.filter(empresa=self.request.user.empresa)
-        for form in context["actuantes"]:
-            form.fields["profesional"].queryset = profesionales_qs
-        for form in context["movilidad"]:
-            form.fields["vehiculo"].queryset = vehiculos_qs
-        for form in context["instrumental"]:
-            form.fields["instrumento"].queryset = instrumentos_qs
+        context.update(self.formsets)
         return context
 
     def form_valid(self, form):
-        context = self.get_context_data()
+        context = self.get_context_data(form=form)
         formset_actuantes = context["actuantes"]
         formset_movilidad = context["movilidad"]
         formset_instrumental = context["instrumental"]
@@ -179,10 +236,16 @@ class TrabajoChildrenContextMixin:
         return super().form_valid(form)
 
 
+@method_decorator(versiones.condicional(versiones.empresa), name="dispatch")
 class EmpresaDetailView(EmpresaFilterMixin, mixins.LoginRequiredMixin, generic.DetailView):
     model = models.Empresa
     form_class = forms.EmpresaForm
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["resumenes"] = resumenes.ultimos(self.object.pk)
+        return context
+
 
 class EmpresaCreateView(SuccessMessageMixin, ChildrenContextMixin, mixins.LoginRequiredMixin, generic.CreateView):
     model = models.Empresa
@@ -280,6 +343,9 @@ class InstrumentoDeleteView(
 class VehiculoListView(EmpresaFilterMixin, mixins.LoginRequiredMixin, generic.ListView):
     model = models.Vehiculo
 
+    def get_queryset(self):
+        return super().get_queryset().with_costs()
+
 
 class VehiculoDetailView(EmpresaFilterMixin, mixins.LoginRequiredMixin, generic.DetailView):
     model = models.Vehiculo
@@ -307,6 +373,7 @@ class VehiculoDeleteView(SuccessDeleteMessageMixin, EmpresaFilterMixin, mixins.L
 class TrabajoListView(
     mixins.LoginRequiredMixin,
     PaginateByMixin,
+    KeysetPaginationMixin,
     SearchMixin,
     SortMixin,
     EmpresaFilterMixin,
@@ -314,12 +381,29 @@ class TrabajoListView(
 ):
     model = models.Trabajo
     paginate_by = 10
+    sort_fields = TRABAJO_SORT_FIELDS
+
+    def get_queryset(self):
+        return super().get_queryset().with_costs()
 
 
+@method_decorator(versiones.condicional(versiones.trabajo), name="dispatch")
 class TrabajoDetailView(EmpresaFilterMixin, mixins.LoginRequiredMixin, generic.DetailView):
     model = models.Trabajo
     form_class = forms.TrabajoForm
 
+    def get_queryset(self):
+        return super().get_queryset().select_related("costo__empresa").annotate(
+            actualizado_empresa=versiones.actualizado_empresa()
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Only computed if the cached fragments of this version are missing
+        context["costos"] = SimpleLazyObject(lambda: self.object.costos)
+        context["version"] = versiones.clave_trabajo(self.object)
+        return context
+
 
 class TrabajoCreateView(
     SuccessMessageMixin,
@@ -348,49 +432,133 @@ class TrabajoDeleteView(SuccessDeleteMessageMixin, EmpresaFilterMixin, mixins.Lo
     success_message = "Trabajo eliminado con éxito."
 
 
+TRABAJO_CSV_HEADER = [
+    "Fecha",
+    "Expediente",
+    "Comitente",
+    "Horas",
+    "Gastos de Empresa",
+    "Costo de actuantes",
+    "Costo de movilidad",
+    "Costo de instrumental",
+    "Aportes",
+    "Demás gastos específicos",
+    "Costo total",
+]
+
+
+def trabajo_csv_row(trabajo):
+    costos = trabajo.costos
+    return [
+        trabajo.fecha,
+        trabajo.expediente,
+        trabajo.comitente,
+        costos.horas_total,
+        costos.gastos_de_empresa,
+        costos.costo_actuantes,
+        costos.costo_movilidad,
+        costos.costo_instrumental,
+        costos.aportes,
+        costos.gastos_especificos,
+        costos.costo_total,
+    ]
+
+
 @login_required
+@versiones.condicional(versiones.trabajo)
 def trabajo_csv(request, pk):
-    # Get the object
-    trabajo = models.Trabajo.objects.get(pk=pk)
+    # Get the object, only among the Trabajos of the User's Empresa
+    empresa = request.user.empresa_id
+    trabajos = models.Trabajo.objects.de_empresa(empresa) if empresa else models.Trabajo.objects.none()
+    trabajo = get_object_or_404(trabajos, pk=pk)
     # Create the HttpResponse object with the appropriate CSV header.
     response = HttpResponse(content_type="text/csv")
     response["Content-Disposition"] = f'attachment; filename="{trabajo}.csv"'
 
     writer = csv.writer(response)
-    writer.writerow(
-        [
-            "Fecha",
-            "Expediente",
-            "Comitente",
-            "Horas",
-            "Gastos de Empresa",
-            "Costo de actuantes",
-            "Costo de movilidad",
-            "Costo de instrumental",
-            "Aportes",
-            "Demás gastos específicos",
-            "Costo total",
-        ]
-    )
-    writer.writerow(
-        [
-            trabajo.fecha,
-            trabajo.expediente,
-            trabajo.comitente,
-            trabajo.horas_total,
-            trabajo.gastos_de_empresa,
-            trabajo.costo_actuantes,
-            trabajo.costo_movilidad,
-            trabajo.costo_instrumental,
-            trabajo.aportes,
-            trabajo.gastos_especificos,
-            trabajo.costo_total,
-        ]
-    )
+    writer.writerow(TRABAJO_CSV_HEADER)
+    writer.writerow(trabajo_csv_row(trabajo))
 
     return response
 
 
+class Echo:
+    """An object that implements just the write method of the file-like interface."""
+
+    def write(self, value):
+        return value
+
+
+class TrabajoExportView(mixins.LoginRequiredMixin, SearchMixin, SortMixin, EmpresaFilterMixin, generic.View):
+    """
+    Streams the Trabajos of the list (same search and order parameters) as CSV.
+    Rows are read from a server-side cursor and costed in chunks, so memory
+    does not grow with the number of Trabajos.
+    """
+
+    model = models.Trabajo
+    chunk_size = 500
+    sort_fields = TRABAJO_SORT_FIELDS
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset().select_related("costo__empresa")
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in self.rows(queryset, get_parametros())), content_type="text/csv"
+        )
+        response["Content-Disposition"] = 'attachment; filename="trabajos.csv"'
+        return response
+
+    def rows(self, queryset, parametros):
+        yield TRABAJO_CSV_HEADER
+        for chunk in self.chunks(queryset.iterator(chunk_size=self.chunk_size)):
+            attach_costs(chunk, parametros)
+            for trabajo in chunk:
+                yield trabajo_csv_row(trabajo)
+
+    def chunks(self, iterator):
+        chunk = list(itertools.islice(iterator, self.chunk_size))
+        while chunk:
+            yield chunk
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+
+
+@staff_member_required
+def metricas(request):
+    """Latency and query percentiles per view of this process, slowest first (see InstrumentationMiddleware)."""
+    return JsonResponse(request_metrics.report())
+
+
+@staff_member_required
+def metricas_cache(request):
+    """Hits, misses and hit ratio of every cached fragment in this process (see the ``fragmento`` tag)."""
+    return JsonResponse(fragment_metrics.report())
+
+
+@login_required
+def trabajo_import(request):
+    """Bulk import of Trabajos of the user's Empresa from CSV or JSON (see costos.importacion)."""
+    if not request.user.empresa:
+        messages.error(request, "Debe pertenecer a una Empresa para importar trabajos.")
+        return redirect("trabajo_list")
+    resultado = None
+    if request.method == "POST":
+        form = forms.TrabajoImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                filas = leer(form.cleaned_data["archivo"])
+            except (ErrorImportacion, UnicodeDecodeError) as e:
+                form.add_error("archivo", f"No se pudo leer el archivo: {e}")
+            else:
+                resultado = importar(request.user.empresa, filas, simular=form.cleaned_data["simular"])
+                if not resultado.errores and not resultado.simulacion:
+                    messages.success(request, str(resultado))
+                    return redirect("trabajo_list")
+    else:
+        form = forms.TrabajoImportForm()
+    return render(request, "costos/trabajo_import.html", {"form": form, "resultado": resultado})
+
+
 @login_required
 def user_preferences(request, section=None):
     form_class = forms.user_preferences_form(request.user, section)
@@ -0,0 +1,101 @@
+"""
+Date-effective global parameters.
+
+The dollar rate, fuel prices and módulo tributario a Trabajo is priced with
+are those in force at its ``fecha``: the value of the ``Vigencia`` period
+that contains it, or the global preference outside every recorded period
+(so preferences keep being the current values, and without periods
+everything is priced as before).
+
+Periods are few and rarely change, so each process keeps them in an index
+of sorted start dates per parameter, and finds the period of a date by
+bisection. The index is rebuilt when the table changes, which is checked
+with one small query per parameters snapshot (see
+``preferences.get_vigencias()``), never per Trabajo.
+"""
+import datetime
+from bisect import bisect_right
+from dataclasses import fields
+
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import models
+from .preferences import ParametrosGlobales
+
+
+def _fecha(fecha):
+    # Unsaved Trabajos still have the datetime of their default
+    if isinstance(fecha, datetime.datetime):
+        return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+    return fecha
+
+
+class Vigencias:
+    """Index of the periods of each parameter, built from (parametro, desde, hasta, valor) rows."""
+
+    def __init__(self, filas):
+        periodos = {}
+        for parametro, desde, hasta, valor in sorted(filas):
+            periodos.setdefault(parametro, []).append((desde, hasta, valor))
+        self.parametros = tuple(sorted(periodos))
+        self._desde = {p: [desde for desde, _, _ in periodos[p]] for p in self.parametros}
+        self._periodos = periodos
+
+    def __bool__(self):
+        return bool(self.parametros)
+
+    def _posicion(self, parametro, fecha):
+        # Last period starting on or before fecha, if fecha is within it
+        i = bisect_right(self._desde[parametro], fecha) - 1
+        return i if i >= 0 and fecha <= self._periodos[parametro][i][1] else None
+
+    def periodo(self, fecha):
+        """
+        Hashable key of the periods in force at ``fecha``: dates with the same
+        key are priced with the same values.
+        """
+        if not self or fecha is None:
+            return ()
+        fecha = _fecha(fecha)
+        return tuple(self._posicion(parametro, fecha) for parametro in self.parametros)
+
+    def valor(self, parametro, fecha):
+        """Value of ``parametro`` in force at ``fecha``, or None outside its periods."""
+        if parametro not in self._desde or fecha is None:
+            return None
+        i = self._posicion(parametro, _fecha(fecha))
+        return self._periodos[parametro][i][2] if i is not None else None
+
+    def aplicar(self, parametros, periodo):
+        """``parametros`` (a ParametrosGlobales) with the values of the periods of key ``periodo``."""
+        cambios = {
+            parametro: self._periodos[parametro][i][2]
+            for parametro, i in zip(self.parametros, periodo)
+            if i is not None
+        }
+        if not cambios:
+            return parametros
+        valores = {f.name: getattr(parametros, f.name) for f in fields(ParametrosGlobales)}
+        return ParametrosGlobales(**{**valores, **cambios})
+
+    def en(self, parametros, fecha):
+        """``parametros`` with the values in force at ``fecha``."""
+        return self.aplicar(parametros, self.periodo(fecha))
+
+
+_indice = (None, Vigencias([]))
+
+
+def version():
+    return tuple(models.Vigencia.objects.aggregate(n=Count("pk"), actualizado=Max("actualizado")).values())
+
+
+def cargar():
+    """The ``Vigencias`` index of this process, rebuilt if the table changed since it was built."""
+    global _indice
+    actual = version()
+    if _indice[0] != actual:
+        filas = models.Vigencia.objects.values_list("parametro", "desde", "hasta", "valor")
+        _indice = (actual, Vigencias(filas))
+    return _indice[1]